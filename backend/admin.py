@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+CURSOR_VAR = 'after'
+
+
+def estimated_row_count(model, using):
+    """
+    Число строк из статистики InnoDB (information_schema.TABLES.TABLE_ROWS) — без прохода
+    по таблице, с погрешностью в десятки процентов. None для других СУБД.
+    """
+    connection = connections[using]
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    COUNT(*) в InnoDB — полный проход индекса. Без фильтров и поиска берётся оценка из
+    статистики таблицы, если она больше ADMIN_EXACT_COUNT_LIMIT; иначе счёт обрывается
+    на этом пределе (COUNT по подзапросу с LIMIT). estimated — число приблизительное.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                self.estimated = True
+                return estimate
+        count = queryset.order_by()[:limit + 1].count()
+        self.estimated = count > limit
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Страницы по первичному ключу (?after=<id последней строки>) вместо OFFSET: дальняя
+    страница стоит столько же, сколько первая. Только при сортировке по pk (ordering
+    админки по умолчанию); при сортировке по колонке — обычные номера страниц.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.cursor = int(request.GET.get(CURSOR_VAR, ''))
+        except ValueError:
+            self.cursor = None
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Смена фильтра, поиска или сортировки начинает список с начала
+        return super().get_query_string(new_params, [*(remove or []), CURSOR_VAR])
+
+    def keyset_direction(self):
+        # ChangeList дописывает к ordering '-pk' для однозначности: ['-pk', '-pk'] — тоже по ключу
+        ordering = self.queryset.query.order_by
+        keys = ('pk', self.lookup_opts.pk.name)
+        if not ordering or not all(isinstance(part, str) and part.lstrip('-') in keys for part in ordering):
+            return None
+        return 'desc' if ordering[0].startswith('-') else 'asc'
+
+    def get_results(self, request):
+        direction = self.keyset_direction()
+        self.keyset = direction is not None and not self.show_all
+        if not self.keyset:
+            super().get_results(request)
+            self.count_estimated = getattr(self.paginator, 'estimated', False)
+            return
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        queryset = self.queryset
+        if self.cursor is not None:
+            queryset = queryset.filter(**{'pk__lt' if direction == 'desc' else 'pk__gt': self.cursor})
+        rows = list(queryset[:self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            rows = rows[:self.list_per_page]
+            self.next_cursor = rows[-1].pk
+
+        self.result_count = paginator.count
+        self.count_estimated = paginator.estimated
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = self.cursor is not None or self.next_cursor is not None
+        self.paginator = paginator
+        self.first_page_url = self.get_query_string()
+        self.next_page_url = self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Основа админок больших таблиц: оценка числа строк вместо COUNT(*), без второго COUNT
+    по всей таблице, постраничный переход по ключу и поиск, который может идти по индексу:
+    в search_fields только '^поле' (LIKE 'x%') и '=поле', число в поиске — ещё и по id.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/keyset_change_list.html'
+    ordering = ('-pk',)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term.strip().isdecimal():
+            results |= queryset.filter(pk=int(search_term))
+        return results, may_have_duplicates
@@ -12,5 +12,38 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Под ASGI синхронные вьюхи идут в потоках из пула, и у каждого потока своё постоянное
+# соединение с БД, которое никто не закрывает: по умолчанию соединение на запрос
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402  после настройки Django
+
+from backend.events import event_socket, event_stream  # noqa: E402
+from backend.startup import warm_up  # noqa: E402
+
+warm_up()
+
+
+async def application(scope, receive, send):
+    """
+    Push-канал изменений объявлений (SSE и WebSocket на EVENTS_PATH) обслуживается
+    корутинами прямо в event loop; всё остальное — обычный Django.
+    """
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['path'] == settings.EVENTS_PATH:
+        if scope['type'] == 'websocket':
+            return await event_socket(scope, receive, send)
+        return await event_stream(scope, receive, send)
+    if scope['type'] == 'websocket':
+        await send({'type': 'websocket.close', 'code': 1000})
+        return
+    return await django_application(scope, receive, send)
@@ -0,0 +1,28 @@
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def conditional_response(request, last_modified, build):
+    """
+    ETag/Last-Modified по времени последнего изменения: если клиент прислал совпадающие
+    If-None-Match / If-Modified-Since — 304 без построения тела (build не вызывается).
+    """
+    last_modified = last_modified or EPOCH
+    digest = hashlib.md5(f'{request.get_full_path()}|{last_modified.isoformat()}'.encode()).hexdigest()
+    etag = f'"{digest}"'
+    timestamp = int(last_modified.timestamp())
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is not None:
+        return not_modified
+
+    response = build()
+    if response.status_code == 200:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(timestamp)
+    return response
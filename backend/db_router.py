@@ -0,0 +1,92 @@
+import random
+from contextvars import ContextVar
+
+import jwt
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+# Чтение с реплик разрешено только внутри безопасного (GET/HEAD/OPTIONS) запроса без "прилипания";
+# фоновые потоки, команды и запись всегда идут на primary.
+_replica_allowed = ContextVar('replica_allowed', default=False)
+# Клиент недавно писал и читает с primary (read-your-writes)
+_pinned = ContextVar('pinned', default=False)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def reads_from_replica():
+    return bool(settings.DATABASE_REPLICAS) and _replica_allowed.get()
+
+
+def client_pinned():
+    return _pinned.get()
+
+
+def pin_cache():
+    return caches[settings.REPLICA_PIN_CACHE_ALIAS]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if replicas and _replica_allowed.get():
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # на репликах те же данные, что и на primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def client_key(request):
+    """
+    Ключ клиента для read-your-writes: user_id из JWT, иначе IP (с учётом NUM_PROXIES,
+    как в backend.throttling — иначе за прокси все анонимы делили бы один ключ).
+    Подпись не проверяется — ключ влияет только на выбор БД, подделка лишь уводит чтение на primary.
+    """
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        try:
+            payload = jwt.decode(header[7:], options={'verify_signature': False})
+            return f'db-pin:user:{payload.get("user_id")}'
+        except jwt.InvalidTokenError:
+            pass
+    return f'db-pin:ip:{BaseThrottle().get_ident(request)}'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    GET-запросы читают с реплик; после успешной записи клиент на REPLICA_STICKY_SECONDS
+    "прилипает" к primary, чтобы сразу видеть свои изменения несмотря на лаг репликации.
+    Отметка хранится в REPLICA_PIN_CACHE_ALIAS — общем для воркеров кэше (с MySQL-репликами
+    settings не запустятся на locmem); кэш ответов (backend.response_cache) для такого
+    клиента не используется.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        key = client_key(request)
+        safe = request.method in SAFE_METHODS
+        pinned = bool(pin_cache().get(key))
+        replica_token = _replica_allowed.set(safe and not pinned)
+        pinned_token = _pinned.set(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_allowed.reset(replica_token)
+            _pinned.reset(pinned_token)
+
+        if not safe and response.status_code < 400:
+            pin_cache().set(key, True, timeout=settings.REPLICA_STICKY_SECONDS)
+        return response
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.utils import encoders
+
+logger = logging.getLogger(__name__)
+
+
+def encode(event):
+    return json.dumps(event, cls=encoders.JSONEncoder, ensure_ascii=False)
+
+
+class Subscription:
+    """
+    Очередь событий одного клиента. Живёт в event loop ASGI-сервера; публикация
+    из потоков Django переносится в loop через call_soon_threadsafe.
+    """
+
+    def __init__(self, broker, loop, maxsize):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def _put(self, message):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Медленный клиент: отключаем, после переподключения он догонит через /items/changes/
+            self.overflowed = True
+            self.broker.unsubscribe(self)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:  # loop уже закрыт
+            self.broker.unsubscribe(self)
+
+    async def get(self, timeout=None):
+        """
+        Следующее сообщение (JSON-строка); None — подписка закрыта из-за переполнения.
+        По таймауту бросает asyncio.TimeoutError.
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBackend:
+    """
+    Доставка только внутри процесса: подходит для одного воркера.
+    """
+
+    def __init__(self, fanout):
+        self.fanout = fanout
+
+    def publish(self, message):
+        self.fanout(message)
+
+    def start(self):
+        pass
+
+
+class RedisBackend:
+    """
+    Общий канал Redis для нескольких воркеров: каждое событие публикуется в канал,
+    а фоновый поток в каждом процессе раздаёт его своим подписчикам.
+    """
+
+    def __init__(self, fanout, url, channel):
+        import redis  # Нужен пакет redis, как и для CACHE_BACKEND=redis
+
+        self.fanout = fanout
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        self.client.publish(self.channel, message)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='events-redis', daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        backoff = 0.5
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                backoff = 0.5
+                for item in pubsub.listen():
+                    if item['type'] == 'message':
+                        self.fanout(item['data'].decode())
+            except Exception:
+                logger.exception('Events Redis listener failed, reconnecting')
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+class EventBroker:
+    """
+    Pub/sub для push-канала (backend.asgi): publish() вызывается из синхронного кода,
+    подписчики — корутины ASGI-соединений, по одной очереди на клиента, без потока на клиента.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if settings.EVENTS_BACKEND == 'redis':
+                self._backend = RedisBackend(self._fanout, settings.EVENTS_REDIS_URL, settings.EVENTS_REDIS_CHANNEL)
+            else:
+                self._backend = LocalBackend(self._fanout)
+        return self._backend
+
+    def subscribe(self, loop=None):
+        self.backend.start()
+        subscription = Subscription(self, loop or asyncio.get_running_loop(), settings.EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def has_subscribers(self):
+        """
+        Для local-бэкенда без подписчиков события можно не строить; для redis подписчики в других процессах.
+        """
+        return settings.EVENTS_BACKEND == 'redis' or self.subscriber_count() > 0
+
+    def publish(self, event):
+        try:
+            self.backend.publish(encode(event))
+        except Exception:  # Push-канал не должен ломать запись объявления
+            logger.exception('Failed to publish event %s', event.get('type'))
+
+    def _fanout(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+
+broker = EventBroker()
+
+
+async def _wait_disconnect(receive, disconnect_type):
+    while True:
+        message = await receive()
+        if message['type'] == disconnect_type:
+            return
+
+
+async def _pump(subscription, send_message, send_heartbeat, receive, disconnect_type):
+    """
+    Пересылает события клиенту, пока он не отключится; в простое шлёт heartbeat,
+    чтобы прокси не закрывали соединение.
+    """
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive, disconnect_type))
+    try:
+        while not disconnected.done():
+            getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected}, timeout=settings.EVENTS_HEARTBEAT, return_when=asyncio.FIRST_COMPLETED,
+            )
+            if getter not in done:
+                getter.cancel()
+                if not done:
+                    await send_heartbeat()
+                continue
+            message = getter.result()
+            if message is None:  # Переполнение очереди — закрываем, клиент переподключится
+                return
+            await send_message(message)
+    finally:
+        disconnected.cancel()
+        subscription.close()
+
+
+async def event_stream(scope, receive, send):
+    """
+    Server-Sent Events: event: laptop.created|laptop.updated|laptop.deleted, data: JSON.
+    """
+    if scope['method'] != 'GET':
+        await send({'type': 'http.response.start', 'status': 405, 'headers': [(b'allow', b'GET')]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    subscription = broker.subscribe()
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),  # nginx не должен буферизовать поток
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+
+    async def send_message(message):
+        event_type = json.loads(message)['type']
+        chunk = f'event: {event_type}\ndata: {message}\n\n'.encode()
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    async def send_heartbeat():
+        await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+
+    try:
+        await _pump(subscription, send_message, send_heartbeat, receive, 'http.disconnect')
+    finally:
+        try:
+            await send({'type': 'http.response.body', 'body': b''})
+        except Exception:  # Клиент уже ушёл
+            pass
+
+
+async def event_socket(scope, receive, send):
+    """
+    Тот же поток через WebSocket: каждое событие — текстовый кадр с JSON.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    subscription = broker.subscribe()
+    await send({'type': 'websocket.accept'})
+
+    async def send_message(message):
+        await send({'type': 'websocket.send', 'text': message})
+
+    async def send_heartbeat():
+        await send({'type': 'websocket.send', 'text': '{"type": "ping"}'})
+
+    await _pump(subscription, send_message, send_heartbeat, receive, 'websocket.disconnect')
+    try:
+        await send({'type': 'websocket.close', 'code': 1013})  # Try again later
+    except Exception:
+        pass
@@ -0,0 +1,71 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Максимальная сторона варианта в пикселях; все варианты — WebP
+VARIANT_SIZES = {
+    'thumb': 160,
+    'small': 320,
+    'medium': 640,
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def render_variants(content, sizes):
+    """
+    Чистая CPU-функция (выполняется в пуле процессов): байты картинки -> {имя: байты WebP}.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        rendered = {}
+        for name, size in sizes.items():
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            variant.save(buffer, 'WEBP', quality=80, method=4)
+            rendered[name] = buffer.getvalue()
+    return rendered
+
+
+def get_executor():
+    global _executor, _executor_pid
+    if settings.IMAGE_PROCESS_WORKERS <= 0:
+        return None
+    if _executor_pid == os.getpid():
+        return _executor
+    # Первые загрузки приходят из нескольких потоков сразу: без блокировки каждый создал бы свой пул
+    with _executor_lock:
+        if _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+            _executor_pid = os.getpid()
+    return _executor
+
+
+def build_variants(content, save):
+    """
+    Рендерит варианты и сохраняет их через save(bytes, filename) -> url/путь.
+    Не картинка или битый файл — пустой словарь, оригинал остаётся как есть.
+    """
+    executor = get_executor()
+    try:
+        if executor is None:
+            rendered = render_variants(content, VARIANT_SIZES)
+        else:
+            rendered = executor.submit(render_variants, content, VARIANT_SIZES).result()
+    except Exception as e:
+        logger.warning('Could not render image variants: %s', e)
+        return {}
+    return {name: save(data, f'{name}.webp') for name, data in rendered.items()}
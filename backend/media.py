@@ -0,0 +1,153 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from backend.streaming import for_server
+
+# Имя содержит хэш содержимого (items.storage, аватары) — файл по этому URL никогда не меняется
+HASHED_NAME_RE = re.compile(r'[0-9a-f]{16,}')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+class RangeFile:
+    """
+    Отрезок файла для FileResponse. fileno() оставлен, чтобы gunicorn отдавал его
+    через sendfile() (позиция — текущая позиция дескриптора, длина — Content-Length).
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Один диапазон bytes=a-b -> (start, end) включительно; None — отдать файл целиком;
+    ValueError — диапазон невыполним (416).
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None  # нет заголовка, несколько диапазонов или мусор — целиком
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # bytes=-N: последние N байт
+        length = int(last)
+        if length == 0:
+            raise ValueError
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+def serve_media(request, path):
+    """
+    Раздача MEDIA_ROOT в продакшене: кэш-заголовки, ETag/Last-Modified, Range, предсжатые копии.
+    MEDIA_OFFLOAD='x-accel-redirect' (nginx) или 'x-sendfile' (Apache/lighttpd) отдаёт файл прокси.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (ValueError, OSError):
+        raise Http404('File not found.')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('File not found.')
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    # Предсжатая копия рядом с файлом (name.br / name.gz), если клиент её принимает
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    has_variants = False
+    if not encoding:
+        for coding, suffix in PRECOMPRESSED:
+            try:
+                compressed_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            has_variants = True
+            if coding in accept_encoding:
+                full_path, stat_result, encoding = full_path + suffix, compressed_stat, coding
+                path += suffix
+                break
+
+    size = stat_result.st_size
+    etag = quote_etag(f'{int(stat_result.st_mtime_ns):x}-{size:x}' + (f'-{encoding}' if encoding else ''))
+    last_modified = int(stat_result.st_mtime)
+    cache_control = IMMUTABLE_CACHE_CONTROL if HASHED_NAME_RE.search(os.path.basename(path)) else DEFAULT_CACHE_CONTROL
+
+    def with_headers(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = cache_control
+        response['Accept-Ranges'] = 'bytes'
+        if has_variants:
+            response['Vary'] = 'Accept-Encoding'
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return with_headers(not_modified)
+
+    offload = settings.MEDIA_OFFLOAD
+    if offload:
+        # Range, sendfile и keep-alive делает прокси; Python только проверяет путь и ставит заголовки
+        response = HttpResponse(content_type=content_type)
+        if offload == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + path.lstrip('/')
+        else:
+            response['X-Sendfile'] = full_path
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return with_headers(response)
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return with_headers(response)
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return with_headers(for_server(request, response))
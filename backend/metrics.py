@@ -0,0 +1,212 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger('backend.performance')
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('phases', 'queries')
+
+    def __init__(self):
+        self.phases = {}  # фаза -> секунды
+        self.queries = 0
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def track(phase):
+    """
+    Засекает время фазы (db, serialize, render, http, password_hash) для текущего запроса.
+    Вне запроса (фоновые потоки, команды) ничего не делает.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(phase, time.perf_counter() - started)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Агрегаты в памяти процесса: у каждого воркера gunicorn свои значения.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}  # (метрика, view, method) -> Histogram
+        self.counters = {}  # (метрика, view, method[, status]) -> число
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name, labels, value=1):
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    @staticmethod
+    def _labels(labels):
+        return ','.join(f'{key}="{value}"' for key, value in labels)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for name in sorted({name for (name, _), _ in histograms}):
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, labels), histogram in histograms:
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{self._labels(labels + (("le", bound),))}}} {cumulative}')
+                lines.append(f'{name}_sum{{{self._labels(labels)}}} {histogram.total:.6f}')
+                lines.append(f'{name}_count{{{self._labels(labels)}}} {histogram.count}')
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f'# TYPE {name} counter')
+            for (metric, labels), value in counters:
+                if metric == name:
+                    lines.append(f'{name}{{{self._labels(labels)}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class PerformanceMiddleware:
+    """
+    Считает SQL-запросы и их время, фазы из track() и общее время запроса.
+    Отдаёт их в Server-Timing, пишет строку JSON в лог backend.performance
+    и копит гистограммы по имени URL для /metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+
+        def count_queries(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                metrics.queries += 1
+                metrics.add('db', time.perf_counter() - started)
+
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(count_queries))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        self.report(request, response, metrics, total)
+        return response
+
+    def report(self, request, response, metrics, total):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        labels = (('view', view), ('method', request.method))
+
+        entries = [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in sorted(metrics.phases.items())]
+        entries.append(f'db-queries;desc="{metrics.queries}"')
+        entries.append(f'total;dur={total * 1000:.2f}')
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = ', '.join(([existing] if existing else []) + entries)
+
+        registry.observe('http_request_duration_seconds', labels, total)
+        registry.observe('http_request_db_seconds', labels, metrics.phases.get('db', 0.0))
+        for phase, seconds in metrics.phases.items():
+            if phase != 'db':
+                registry.increment('http_request_phase_seconds_total', labels + (('phase', phase),), seconds)
+        registry.increment('http_request_db_queries_total', labels, metrics.queries)
+        registry.increment('http_requests_total', labels + (('status', response.status_code),))
+
+        if settings.PERFORMANCE_LOG:
+            logger.info(json.dumps({
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 2),
+                'db_queries': metrics.queries,
+                **{f'{phase}_ms': round(seconds * 1000, 2) for phase, seconds in metrics.phases.items()},
+            }))
+
+
+def metrics_view(request):
+    # Без токена — только сотрудникам: пути, объёмы и задержки не для посторонних
+    token = settings.METRICS_TOKEN
+    authorized = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    # Локальный импорт: response_cache тянет DRF, а DRF при загрузке импортирует наш рендерер
+    from backend.response_cache import cache_stats
+    from users.revocation import revocation_list
+
+    lines = [registry.render()]
+    stats = cache_stats()
+    lines.append('# TYPE response_cache_requests_total counter\n')
+    lines.append(f'response_cache_requests_total{{result="hit"}} {stats["hits"]}\n')
+    lines.append(f'response_cache_requests_total{{result="miss"}} {stats["misses"]}\n')
+
+    revocation = revocation_list.stats()
+    lines.append('# TYPE token_revocation_checks_total counter\n')
+    lines.append(f'token_revocation_checks_total{{result="not_revoked"}} {revocation["checks"] - revocation["filter_hits"]}\n')
+    lines.append(f'token_revocation_checks_total{{result="revoked"}} {revocation["revoked"]}\n')
+    lines.append(f'token_revocation_checks_total{{result="false_positive"}} {revocation["false_positives"]}\n')
+    lines.append('# TYPE token_revocation_false_positive_rate gauge\n')
+    lines.append(f'token_revocation_false_positive_rate{{kind="observed"}} {revocation["false_positive_rate"]}\n')
+    lines.append(f'token_revocation_false_positive_rate{{kind="estimated"}} {revocation["estimated_false_positive_rate"]}\n')
+    lines.append('# TYPE token_revocation_bloom_entries gauge\n')
+    lines.append(f'token_revocation_bloom_entries {revocation["entries"]}\n')
+    return HttpResponse(''.join(lines), content_type='text/plain; version=0.0.4; charset=utf-8')
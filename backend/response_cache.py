@@ -0,0 +1,105 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from backend.db_router import client_pinned, reads_from_replica
+
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(model):
+    return f'version:{model._meta.label_lower}'
+
+
+def get_version(model):
+    cache = get_cache()
+    key = _version_key(model)
+    cache.add(key, 1, timeout=None)
+    return cache.get(key, 1)
+
+
+def bump_version(model):
+    """
+    Инвалидация: все ключи со старой версией модели больше не читаются и просто истекают.
+    """
+    cache = get_cache()
+    key = _version_key(model)
+    cache.add(key, 1, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:  # Ключ вытеснили между add и incr
+        cache.set(key, 2, timeout=None)
+
+
+def _record(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+    return stats
+
+
+def cached_response(request, models, build):
+    """
+    Отдаёт данные ответа из кэша, ключ — версии моделей + URL запроса.
+    build() вызывается только при промахе; кэшируются лишь ответы 200 вместе с ETag/Last-Modified,
+    так что условный запрос на попадании получает 304 без обращения к БД.
+
+    С репликами: клиент, недавно писавший (backend.db_router), кэш не использует — иначе
+    получил бы ответ без своих изменений; ответ, прочитанный с реплики, хранится не дольше
+    REPLICA_STICKY_SECONDS, чтобы отставание реплики не закрепилось в кэше под новой версией.
+    """
+    if client_pinned():
+        return build()
+    versions = '.'.join(f'{model._meta.label_lower}={get_version(model)}' for model in models)
+    key = f'response:{versions}:{request.get_host()}{request.get_full_path()}'
+    cache = get_cache()
+
+    entry = cache.get(key)
+    if entry is not None:
+        _record('hits')
+        data, headers = entry
+        response = get_conditional_response(
+            request,
+            etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(headers.get('Last-Modified')),
+        ) or Response(data)
+        for name, value in headers.items():
+            response[name] = value
+        response['X-Cache'] = 'HIT'
+        return response
+
+    _record('misses')
+    response = build()
+    if response.status_code == 200:
+        headers = {name: response[name] for name in CACHED_HEADERS if name in response}
+        timeout = settings.RESPONSE_CACHE_TIMEOUT
+        if reads_from_replica():
+            timeout = min(timeout, settings.REPLICA_STICKY_SECONDS)
+        cache.set(key, (response.data, headers), timeout=timeout)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats_view(request):
+    return Response(cache_stats())
@@ -1,15 +1,20 @@
 from pathlib import Path
 import os
-from dotenv import load_dotenv
-import pymysql
+import sys
 
-pymysql.install_as_MySQLdb()
-load_dotenv()
+from django.core.exceptions import ImproperlyConfigured
 
-SERVICE_URL = os.getenv('SERVICE_URL', 'https://default-url.com')
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# .env есть только при локальной разработке; в контейнере переменные задаёт платформа,
+# и python-dotenv на старте каждого воркера не импортируется
+if (BASE_DIR / '.env').exists():
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / '.env')
+
+SERVICE_URL = os.getenv('SERVICE_URL', 'https://default-url.com')
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -43,19 +48,49 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'backend.renderers.FastJSONRenderer',  # orjson, если установлен; иначе стандартный JSON
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
+    # Лимиты backend.throttling: '<throttle_scope вьюхи>_ip' / '<throttle_scope>_user'
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.getenv('THROTTLE_LOGIN_IP', '20/min'),
+        'login_username': os.getenv('THROTTLE_LOGIN_USERNAME', '10/min'),
+        'register_ip': os.getenv('THROTTLE_REGISTER_IP', '10/hour'),
+        'listing_write_user': os.getenv('THROTTLE_LISTING_WRITE_USER', '30/min'),
+        'listing_write_ip': os.getenv('THROTTLE_LISTING_WRITE_IP', '120/min'),
+    },
+    # Сколько прокси перед приложением: IP клиента берётся из X-Forwarded-For только с этой поправкой
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
 
 
 # Settings for Media and Static files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Отдача медиа через прокси (backend.media): None, 'x-accel-redirect' (nginx) или 'x-sendfile'
+MEDIA_OFFLOAD = os.getenv('MEDIA_OFFLOAD') or None
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')  # internal location в nginx
+
+# Фоновая загрузка картинок объявлений (items.tasks)
+IMAGE_UPLOAD_URL = os.getenv('IMAGE_UPLOAD_URL')  # None — Imgur; для локального стаба хостинга
+IMAGE_UPLOAD_ASYNC = os.getenv('IMAGE_UPLOAD_ASYNC', '1') == '1'
+IMAGE_UPLOAD_WORKERS = int(os.getenv('IMAGE_UPLOAD_WORKERS', '4'))
+IMAGE_UPLOAD_QUEUE_SIZE = int(os.getenv('IMAGE_UPLOAD_QUEUE_SIZE', '100'))
+IMAGE_UPLOAD_TIMEOUT = (3.05, 30)  # (connect, read), секунды
+IMAGE_UPLOAD_RETRIES = 3
+IMAGE_UPLOAD_BACKOFF = 0.5
+# items.storage.ImgurStorage или items.storage.LocalMediaStorage (MEDIA_ROOT/images/)
+IMAGE_STORAGE_BACKEND = os.getenv('IMAGE_STORAGE_BACKEND', 'items.storage.ImgurStorage')
+# Процессы для ресайза картинок (backend.images); 0 — в текущем процессе
+IMAGE_PROCESS_WORKERS = int(os.getenv('IMAGE_PROCESS_WORKERS', '2'))
 
 CSRF_TRUSTED_ORIGINS = ['https://backend-production-a524.up.railway.app']
 CORS_ALLOW_ALL_ORIGINS = True
@@ -67,6 +102,9 @@ CORS_ALLOWED_ORIGINS = [
 
 # Middleware
 MIDDLEWARE = [
+    'backend.metrics.PerformanceMiddleware',  # первым: меряет всё, что ниже
+    'backend.throttling.LoadSheddingMiddleware',  # после метрик: отказы 503 тоже видны в /metrics
+    'backend.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,14 +113,34 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',  # ETag по содержимому для ответов без своего ETag
+    'users.middleware.AuthTimingMiddleware',
 ]
 
+# Метрики запросов (backend.metrics): строка JSON на запрос и /metrics в формате Prometheus.
+# Лог по умолчанию только в рабочем режиме: в тестах и под DEBUG он засоряет вывод
+TESTING = sys.argv[1:2] == ['test']
+PERFORMANCE_LOG = os.getenv('PERFORMANCE_LOG', '0' if DEBUG or TESTING else '1') == '1'
+# /metrics отдаётся только с Authorization: Bearer <METRICS_TOKEN> или сотруднику (is_staff) из сессии админки
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'backend.performance': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'backend' / 'templates'],  # общие шаблоны админки (backend.admin)
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -108,9 +166,137 @@ DATABASES = {
         'PASSWORD': os.getenv('MYSQLPASSWORD'),
         'HOST': os.getenv('MYSQLHOST'),
         'PORT': os.getenv('MYSQLPORT', '3306'),
+        # Постоянные соединения: без них каждый запрос заново открывает соединение с MySQL
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Локальный запуск и тесты без MySQL: DB_ENGINE=sqlite
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# Драйвер PyMySQL под именем MySQLdb — только когда база действительно MySQL
+if DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
+    import pymysql
+    pymysql.install_as_MySQLdb()
+
+# Реплики для чтения (backend.db_router): MYSQL_REPLICA_HOSTS=host1,host2
+# или для локальной проверки с SQLite DB_REPLICAS=<число> (копии той же базы)
+DATABASE_REPLICAS = []
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    replica_hosts = [None] * int(os.getenv('DB_REPLICAS', '0'))
+else:
+    replica_hosts = [host.strip() for host in os.getenv('MYSQL_REPLICA_HOSTS', '').split(',') if host.strip()]
+for index, host in enumerate(replica_hosts, start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if host:
+        DATABASES[alias]['HOST'] = host
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 10  # после записи клиент столько секунд читает с primary
+# Отметки "прилипания" живут в кэше лимитов: общий для воркеров только с CACHE_BACKEND=redis/file
+# (проверка ниже, после CACHES)
+REPLICA_PIN_CACHE_ALIAS = 'throttle'
+
+# Кэш пользователей для users.authentication.CachedJWTAuthentication
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TTL = 60  # секунды
+
+# Отзыв JWT (users.revocation): Bloom-фильтр в памяти, дочитывается/пересобирается из БД
+REVOCATION_REFRESH_SECONDS = 30  # столько отзыв в другом воркере может быть не виден
+REVOCATION_REBUILD_SECONDS = 3600
+REVOCATION_BLOOM_CAPACITY = 10000
+REVOCATION_BLOOM_ERROR_RATE = 0.001
+
+# Cache
+# locmem — отдельный кэш на процесс; при нескольких воркерах версии моделей должны
+# жить в общем хранилище: CACHE_BACKEND=redis (REDIS_URL) или file.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',  # нужен пакет redis
+            'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/backend-cache'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Счётчики лимитов запросов (backend.throttling): с redis общие для всех воркеров,
+# с locmem — локальная замена на процесс в отдельном кэше
+if CACHE_BACKEND == 'locmem':
+    CACHES['throttle'] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle'}
+else:
+    CACHES['throttle'] = CACHES['default']
+THROTTLE_CACHE_ALIAS = 'throttle'
+# С locmem отметку видит только записавший воркер, а соседний читает с отстающей реплики.
+# SQLite-"реплики" — та же база без лага, им это не мешает
+if CACHE_BACKEND == 'locmem' and DATABASE_REPLICAS and replica_hosts[0] is not None:
+    raise ImproperlyConfigured('MYSQL_REPLICA_HOSTS requires a shared cache: set CACHE_BACKEND=redis or file.')
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', '1') == '1'
+# Сброс нагрузки (backend.throttling.LoadSheddingMiddleware): одновременных запросов на процесс,
+# 0 — без предела. Под gthread выше числа потоков не поднимается; имеет смысл под ASGI
+MAX_IN_FLIGHT_REQUESTS = int(os.getenv('MAX_IN_FLIGHT_REQUESTS', '100'))
+LOAD_SHEDDING_EXEMPT_PATHS = ('/metrics',)
+
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Push-канал изменений объявлений (backend.events, только под ASGI: backend.asgi)
+# local — события видны только в своём процессе; при нескольких воркерах нужен redis
+EVENTS_PATH = '/items/events/'
+EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'redis' if CACHE_BACKEND == 'redis' else 'local')
+EVENTS_REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')
+EVENTS_REDIS_CHANNEL = 'laptop-events'
+EVENTS_QUEUE_SIZE = 256  # событий на клиента, дальше медленный клиент отключается
+EVENTS_HEARTBEAT = 20  # секунды
+
+# Лента изменений /items/changes/ (items.changes): записи об удалениях старше срока удаляет
+# команда prune_tombstones, токены старше него получают 410 — клиент синхронизируется заново
+CHANGES_RETENTION_DAYS = int(os.getenv('CHANGES_RETENTION_DAYS', '30'))
+# Лента отдаёт только события старше стольких секунд: запас на транзакции, закоммиченные позже своего updated_at
+CHANGES_COMMIT_LAG_SECONDS = 10
+
+# "Похожие объявления" (items.similar): файл индекса от команды rebuild_similar;
+# воркеры проверяют его не чаще раза в SIMILAR_RELOAD_SECONDS и заодно дочитывают из БД правки
+# других процессов. Без файла индекс строится из БД и дальше только дочитывается
+SIMILAR_INDEX_PATH = os.getenv('SIMILAR_INDEX_PATH', '')
+SIMILAR_RELOAD_SECONDS = 60
+
+# Админка больших таблиц (backend.admin): точный COUNT(*) не дальше этого числа строк,
+# без фильтров на MySQL сверх него — оценка из статистики таблицы
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Повторные объявления (items.dedup): flag — создать с duplicate_of, reject — 409,
+# merge — обновить своё похожее объявление вместо нового (чужое — как flag), off — не проверять
+DUPLICATE_POLICY = os.getenv('DUPLICATE_POLICY', 'flag')
+DUPLICATE_SCOPE = os.getenv('DUPLICATE_SCOPE', 'any')  # any — объявления всех продавцов, owner — только свои
+DUPLICATE_THRESHOLD = 0.8  # оценка сходства Жаккара по MinHash
+DUPLICATE_INDEX_REFRESH_SECONDS = 30
+
+# Ширина ценового интервала для гистограммы /items/facets/ (items.facets)
+FACET_PRICE_BUCKET = int(os.getenv('FACET_PRICE_BUCKET', '100'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,24 @@
+import gc
+
+from django.db import connections
+from django.urls import get_resolver
+
+
+def warm_up():
+    """
+    Загружает то, что иначе каждый воркер грузил бы на первом запросе (urls -> вьюхи ->
+    сериализаторы, индексы и их зависимости). Под gunicorn --preload это делается один раз
+    в мастере, и воркеры получают готовые модули через fork.
+
+    Чтобы общие страницы памяти не копировались в каждый воркер:
+    - соединения с БД закрываются — сокет нельзя делить между процессами;
+    - gc.freeze() выводит загруженные объекты из обхода сборщика мусора, который иначе
+      переписывал бы их заголовки и тем самым копировал страницы.
+    Потоки и пулы (items.tasks, backend.images, backend.events) стартуют лениво, уже в воркере.
+    """
+    get_resolver().url_patterns  # noqa: B018  импорт ROOT_URLCONF и всех вьюх
+    # Соединение внутри транзакции (только в тестах) закрывать нельзя
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
+    gc.freeze()
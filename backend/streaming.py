@@ -0,0 +1,36 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+BATCH_SIZE = 16  # частей за один переход в поток
+
+
+def _next_batch(iterator):
+    batch = []
+    for part in iterator:
+        batch.append(part)
+        if len(batch) >= BATCH_SIZE:
+            break
+    return batch
+
+
+async def _iterate(iterator):
+    # thread_sensitive: тот же поток, что и у вьюхи, — курсор БД экспорта остаётся на своём соединении
+    next_batch = sync_to_async(_next_batch, thread_sensitive=True)
+    while True:
+        batch = await next_batch(iterator)
+        if not batch:
+            return
+        for part in batch:
+            yield part
+
+
+def for_server(request, response):
+    """
+    Под ASGI Django 4.2 собирает синхронный streaming_content в список целиком
+    (StreamingHttpResponse.__aiter__). Для ASGI-запроса итератор ответа заменяется
+    асинхронным, который читает его пачками в потоке; под WSGI ответ не меняется
+    (FileResponse по-прежнему уходит через sendfile).
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest) and not response.is_async:
+        response.streaming_content = _iterate(iter(response.streaming_content))
+    return response
@@ -0,0 +1,151 @@
+import hashlib
+import math
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Лимит по скользящему окну: текущий и предыдущий счётчики фиксированных окон,
+    предыдущий берётся с весом оставшейся доли окна. Всего add + incr + get в кэше,
+    incr атомарен и в Redis, и в locmem, поэтому лимит общий для всех воркеров.
+
+    Настройка во вьюхе: throttle_scope = 'login', throttle_classes = [IPRateThrottle, ...],
+    необязательно throttle_methods = ('POST',); лимиты — REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+    с ключами '<scope>_ip' / '<scope>_user', например 'login_ip': '20/min'.
+    """
+    kind = None
+
+    def __init__(self):
+        # Лимиты читаются при проверке: scope известен только из вьюхи
+        pass
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_ident_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        methods = getattr(view, 'throttle_methods', None)
+        if not settings.THROTTLE_ENABLED or (methods and request.method not in methods):
+            return True
+
+        self.scope = f"{getattr(view, 'throttle_scope', None)}_{self.kind}"
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+        self.key = self.cache_format % {'scope': self.scope, 'ident': ident}
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.elapsed = self.now - window * self.duration
+
+        current_key = f'{self.key}:{window}'
+        self.cache.add(current_key, 0, timeout=self.duration * 2)
+        try:
+            self.current = self.cache.incr(current_key)
+        except ValueError:  # Ключ вытеснили между add и incr
+            self.cache.set(current_key, 1, timeout=self.duration * 2)
+            self.current = 1
+        self.previous = self.cache.get(f'{self.key}:{window - 1}', 0)
+
+        weight = 1 - self.elapsed / self.duration
+        return self.previous * weight + self.current <= self.num_requests
+
+    def wait(self):
+        """
+        Секунды до момента, когда оценка окна опустится до лимита (для Retry-After).
+        """
+        remaining = self.duration - self.elapsed
+        if self.current > self.num_requests or not self.previous:
+            return max(1, math.ceil(remaining))
+        # previous * (1 - (elapsed + t) / duration) + current <= num_requests
+        seconds = self.duration * (1 - (self.num_requests - self.current) / self.previous) - self.elapsed
+        return max(1, math.ceil(min(seconds, remaining)))
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    """
+    Лимит на IP клиента (X-Forwarded-For учитывается по NUM_PROXIES, как в DRF).
+    """
+    kind = 'ip'
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+class UserRateThrottle(SlidingWindowThrottle):
+    """
+    Лимит на пользователя; для анонимов — на IP.
+    """
+    kind = 'user'
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'u{request.user.pk}'
+        return self.get_ident(request)
+
+
+class UsernameRateThrottle(SlidingWindowThrottle):
+    """
+    Лимит на имя пользователя из тела запроса (вход): перебор пароля одного аккаунта
+    с множества IP не упирается в лимит на IP. Без имени не ограничивает.
+    """
+    kind = 'username'
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def get_ident_key(self, request):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not isinstance(username, str) or not username:
+            return None
+        # Хэш: имя произвольной длины и с любыми символами не годится в ключ кэша как есть
+        return hashlib.sha256(username.casefold().encode()).hexdigest()[:32]
+
+
+class LoadSheddingMiddleware:
+    """
+    Общий предел нагрузки на процесс: сверх MAX_IN_FLIGHT_REQUESTS одновременных запросов
+    сразу 503 с Retry-After, до вьюх и БД. Лимиты на клиента не спасают от всплеска
+    со многих клиентов, а запрос, простоявший в очереди дольше таймаута клиента,
+    тратит воркер впустую. 0 — без предела; LOAD_SHEDDING_EXEMPT_PATHS не ограничиваются.
+    """
+    RETRY_AFTER = 1  # секунды
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def __call__(self, request):
+        limit = settings.MAX_IN_FLIGHT_REQUESTS
+        if not limit or request.path_info in settings.LOAD_SHEDDING_EXEMPT_PATHS:
+            return self.get_response(request)
+        with self._lock:
+            overloaded = self.in_flight >= limit
+            if not overloaded:
+                self.in_flight += 1
+        if overloaded:
+            response = JsonResponse({'detail': 'Server is overloaded, try again later.'}, status=503)
+            response['Retry-After'] = str(self.RETRY_AFTER)
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
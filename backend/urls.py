@@ -1,10 +1,13 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from django.views.generic import RedirectView
 from django.http import HttpResponse
 
+from backend.media import serve_media
+from backend.metrics import metrics_view
+from backend.response_cache import cache_stats_view
+
 def favicon(request):
     return HttpResponse(status=204)
 
@@ -14,5 +17,8 @@ urlpatterns = [
     path('items/', include('items.urls')),
     path('auth/', include('users.urls')),
     path('favicon.ico', favicon),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('cache-stats/', cache_stats_view, name='cache-stats'),
+    path('metrics', metrics_view, name='metrics'),
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
+]
 
@@ -1,4 +1,44 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
+
+from backend.admin import LargeTableAdmin
+from backend.response_cache import bump_version
+
 from .models import Laptop
+from .signals import bulk_delete
+
+
+class LaptopAdmin(LargeTableAdmin):
+    list_display = ('id', 'title', 'model', 'price', 'owner', 'image_status', 'duplicate_of_id', 'created_at')
+    list_select_related = ('owner',)  # Иначе запрос владельца на каждую строку
+    list_filter = ('image_status',)
+    # title и model проиндексированы; поиск по владельцу — через ?owner__id__exact=
+    search_fields = ('^title', '^model')
+    search_help_text = 'Title or model prefix, or laptop id.'
+    raw_id_fields = ('owner', 'duplicate_of')  # Не тянуть в форму select на всех пользователей
+    actions = ('delete_laptops', 'clear_duplicate_flag')
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Стандартное удаление собирает и удаляет объекты по одному
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(permissions=['delete'], description='Delete selected laptops')
+    def delete_laptops(self, request, queryset):
+        # Одна реакция laptops_deleted на всю выборку вместо post_delete на каждую строку
+        with transaction.atomic():
+            deleted = bulk_delete(queryset)
+        self.message_user(request, f'Deleted {deleted} laptops.', messages.SUCCESS)
+
+    @admin.action(permissions=['change'], description='Clear duplicate flag')
+    def clear_duplicate_flag(self, request, queryset):
+        # updated_at вручную: update() не применяет auto_now, а по нему работает лента изменений
+        updated = queryset.exclude(duplicate_of=None).update(duplicate_of=None, updated_at=timezone.now())
+        if updated:
+            bump_version(Laptop)
+        self.message_user(request, f'Cleared {updated} duplicate flags.', messages.SUCCESS)
+
 
-admin.site.register(Laptop)
+admin.site.register(Laptop, LaptopAdmin)
@@ -0,0 +1,145 @@
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .dedup import DUPLICATE_DETAIL, duplicate_actions
+from .models import Laptop
+from .serializers import LaptopSerializer
+from .signals import bulk_delete, bulk_insert, laptops_saved
+
+
+class LaptopBulkItemSerializer(LaptopSerializer):
+    # Владелец задаётся сервером: без PrimaryKeyRelatedField нет запроса на каждую строку
+    owner = serializers.PrimaryKeyRelatedField(read_only=True)
+
+
+class LaptopBulkService:
+    """
+    Пакетные create/update/delete ноутбуков одной транзакцией.
+    Невалидные или чужие элементы отклоняются по одному, остальные применяются.
+    Новые объявления проходят DUPLICATE_POLICY, как и одиночное создание.
+    """
+    MAX_ITEMS = 500
+    BATCH_SIZE = 500
+
+    def __init__(self, user):
+        self.user = user
+
+    @classmethod
+    def validate_payload(cls, payload):
+        if not isinstance(payload, dict):
+            raise serializers.ValidationError({"detail": "Expected an object with create/update/delete lists."})
+        for key in ("create", "update", "delete"):
+            items = payload.get(key, [])
+            if not isinstance(items, list):
+                raise serializers.ValidationError({key: "Expected a list."})
+            if len(items) > cls.MAX_ITEMS:
+                raise serializers.ValidationError({key: f"At most {cls.MAX_ITEMS} items per request."})
+
+    def execute(self, payload):
+        self.validate_payload(payload)
+        with transaction.atomic():
+            return {
+                "create": self.create(payload.get("create", [])),
+                "update": self.update(payload.get("update", [])),
+                "delete": self.delete(payload.get("delete", [])),
+            }
+
+    def create(self, items):
+        results, laptops = [], []
+        for index, item in enumerate(items):
+            serializer = LaptopBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                laptops.append((index, Laptop(**serializer.validated_data, owner=self.user)))
+            else:
+                results.append({"index": index, "status": 400, "errors": serializer.errors})
+
+        # Повторы ищутся среди уже сохранённых объявлений, одним запросом на пачку
+        merges, pending = [], []
+        actions = duplicate_actions([(laptop.minhash, self.user.pk) for _, laptop in laptops])
+        for (index, laptop), (action, duplicate) in zip(laptops, actions):
+            if action == "reject":
+                results.append({
+                    "index": index, "status": 409, "errors": {"detail": DUPLICATE_DETAIL, "duplicate_of": duplicate.pk},
+                })
+            elif action == "merge":
+                merges.append((index, {**items[index], "id": duplicate.pk}))
+            else:
+                laptop.duplicate_of = duplicate
+                pending.append((index, laptop))
+        laptops = pending
+        # Своё похожее объявление обновляется, как элемент update
+        for (index, _), result in zip(merges, self.update([item for _, item in merges])):
+            results.append({**result, "index": index})
+
+        bulk_insert([laptop for _, laptop in laptops], self.BATCH_SIZE)
+
+        results += [
+            {"index": index, "status": 201, "data": LaptopBulkItemSerializer(laptop).data}
+            for index, laptop in laptops
+        ]
+        return sorted(results, key=lambda result: result["index"])
+
+    @staticmethod
+    def _valid_id(pk):
+        # bool — подкласс int; словарь или список дальше не хешируется
+        return isinstance(pk, int) and not isinstance(pk, bool)
+
+    def _owned(self, ids):
+        """
+        Один запрос на всю пачку вместо LaptopService.check_owner на каждую строку.
+        """
+        laptops = Laptop.objects.in_bulk([pk for pk in ids if self._valid_id(pk)])
+        return {pk: laptop for pk, laptop in laptops.items() if laptop.owner_id == self.user.pk}, laptops
+
+    def _missing(self, index, pk, existing):
+        if not self._valid_id(pk):
+            return {"index": index, "id": pk, "status": 400, "errors": {"id": "Expected an integer id."}}
+        if pk in existing:
+            return {"index": index, "id": pk, "status": 403, "errors": {"detail": "You do not own this laptop."}}
+        return {"index": index, "id": pk, "status": 404, "errors": {"detail": "Not found."}}
+
+    def update(self, items):
+        ids = [item.get("id") if isinstance(item, dict) else None for item in items]
+        owned, existing = self._owned(ids)
+
+        results, changed, fields = [], [], {"updated_at"}
+        for index, (pk, item) in enumerate(zip(ids, items)):
+            laptop = owned.get(pk) if self._valid_id(pk) else None
+            if laptop is None:
+                results.append(self._missing(index, pk, existing))
+                continue
+            data = {key: value for key, value in item.items() if key != "id"}
+            serializer = LaptopBulkItemSerializer(laptop, data=data, partial=True)
+            if not serializer.is_valid():
+                results.append({"index": index, "id": pk, "status": 400, "errors": serializer.errors})
+                continue
+            for name, value in serializer.validated_data.items():
+                setattr(laptop, name, value)
+                fields.add(name)
+            changed.append(laptop)
+            results.append({"index": index, "id": pk, "status": 200})
+
+        if changed:
+            # bulk_update не применяет auto_now; время — перед самой записью, ближе к коммиту
+            now = timezone.now()
+            for laptop in changed:
+                laptop.updated_at = now
+            Laptop.objects.bulk_update(changed, sorted(fields), batch_size=self.BATCH_SIZE)
+            laptops_saved(changed)
+        for result in results:
+            if result["status"] == 200:
+                result["data"] = LaptopBulkItemSerializer(owned[result["id"]]).data
+        return results
+
+    def delete(self, ids):
+        owned, existing = self._owned(ids)
+        results = []
+        for index, pk in enumerate(ids):
+            if self._valid_id(pk) and pk in owned:
+                results.append({"index": index, "id": pk, "status": 204})
+            else:
+                results.append(self._missing(index, pk, existing))
+        if owned:
+            bulk_delete(Laptop.objects.filter(pk__in=list(owned)))
+        return results
@@ -0,0 +1,128 @@
+import base64
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Laptop, LaptopTombstone
+
+# Порядок событий с одинаковым временем: сначала правки (по id ноутбука), затем удаления (по id записи)
+UPSERT, DELETE = 0, 1
+# Целые микросекунды от эпохи без float: ключ сравнивается с updated_at на равенство
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class ChangeTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Change token is older than the retention period, resync from scratch.'
+    default_code = 'change_token_expired'
+
+
+def encode_token(moment, kind=None, pk=None):
+    """
+    Токен — ключ последнего отданного события (время, вид, id): следующая страница
+    начинается строго после него. Без вида и id — всё начиная с момента включительно.
+    """
+    micros = (moment - EPOCH) // timedelta(microseconds=1)
+    raw = str(micros) if kind is None else f'{micros}.{kind}.{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """
+    Возвращает (момент, вид, id); вид и id — None для токена-момента
+    (в том числе выданного до перехода на ключ из трёх частей).
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode()).decode().split('.')
+        if len(parts) not in (1, 3):
+            raise ValueError(token)
+        moment = EPOCH + timedelta(microseconds=int(parts[0]))
+        if len(parts) == 1:
+            return moment, None, None
+        kind, pk = int(parts[1]), int(parts[2])
+        if kind not in (UPSERT, DELETE):
+            raise ValueError(token)
+    except (ValueError, UnicodeDecodeError, OverflowError):
+        raise ValidationError({'since': 'Invalid change token.'})
+    return moment, kind, pk
+
+
+def retention_cutoff():
+    """
+    Записи об удалениях старше этого момента удаляет prune_tombstones, поэтому
+    токены старше него не могут дать полную ленту.
+    """
+    return timezone.now() - timedelta(days=settings.CHANGES_RETENTION_DAYS)
+
+
+def prune_tombstones():
+    deleted, _ = LaptopTombstone.objects.filter(deleted_at__lt=retention_cutoff()).delete()
+    return deleted
+
+
+def last_modified():
+    """
+    Последнее изменение каталога: max(updated_at) и max(deleted_at), оба по индексу.
+    """
+    updated = Laptop.objects.aggregate(value=Max('updated_at'))['value']
+    deleted = LaptopTombstone.objects.aggregate(value=Max('deleted_at'))['value']
+    return max(filter(None, (updated, deleted)), default=None)
+
+
+def _after(moment, kind, pk, field, own_kind):
+    """
+    Условие "событие этого потока идёт после ключа (moment, kind, pk)".
+    """
+    if kind is None:
+        return Q(**{f'{field}__gte': moment})
+    if kind < own_kind:
+        return Q(**{f'{field}__gte': moment})
+    if kind > own_kind:
+        return Q(**{f'{field}__gt': moment})
+    return Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': pk})
+
+
+def changes_since(since, limit):
+    """
+    Возвращает (обновлённые ноутбуки, id удалённых, следующий токен, есть_ли_ещё).
+    since — (момент, вид, id) из decode_token или None. Постраничный проход по ключу
+    (время, вид, id), поэтому любое число событий с одним временем (bulk_update,
+    действие админки) проходится страницами без повторов и зацикливания.
+
+    Время события ставит приложение при записи, а видна строка становится при коммите:
+    транзакция, закоммиченная позже, может принести событие раньше уже отданного токена.
+    Поэтому отдаются только события старше CHANGES_COMMIT_LAG_SECONDS — к этому моменту
+    транзакции с более ранним временем уже закоммичены, и токен их не перескочит.
+    """
+    horizon = timezone.now() - timedelta(seconds=settings.CHANGES_COMMIT_LAG_SECONDS)
+    laptops = Laptop.objects.filter(updated_at__lt=horizon).order_by('updated_at', 'id')
+    tombstones = LaptopTombstone.objects.filter(deleted_at__lt=horizon).order_by('deleted_at', 'id')
+    if since is not None:
+        if since[0] < retention_cutoff():
+            raise ChangeTokenExpired()
+        laptops = laptops.filter(_after(*since, 'updated_at', UPSERT))
+        tombstones = tombstones.filter(_after(*since, 'deleted_at', DELETE))
+
+    events = [(laptop.updated_at, UPSERT, laptop.pk, laptop) for laptop in laptops[:limit + 1]]
+    events += [
+        (tombstone.deleted_at, DELETE, tombstone.pk, tombstone.laptop_id) for tombstone in tombstones[:limit + 1]
+    ]
+    events.sort(key=lambda event: event[:3])
+
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    upserts = [payload for _, kind, _, payload in events if kind == UPSERT]
+    deleted = [payload for _, kind, _, payload in events if kind == DELETE]
+    if events:
+        token = encode_token(*events[-1][:3])
+    elif since is not None:
+        token = encode_token(*since)
+    else:
+        token = encode_token(horizon)
+    return upserts, deleted, token, has_more
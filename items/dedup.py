@@ -0,0 +1,191 @@
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from .models import Laptop
+from .search import SEARCH_FIELDS, tokenize
+
+NUM_PERM = 64
+BANDS, ROWS = 16, 4  # BANDS * ROWS == NUM_PERM; кандидаты с вероятностью >99% при сходстве 0.8
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(0x5EED)
+# a, b < 2**32 и хэши шинглов crc32 < 2**32: a * h + b помещается в uint64 без переполнения
+_A = _rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)[:, None]
+
+DUPLICATE_DETAIL = 'Listing looks like a duplicate of an existing one.'
+
+
+def shingles(fields):
+    """
+    Пары соседних слов title/model/description: правка одного слова меняет лишь пару шинглов.
+    """
+    tokens = [token for field in SEARCH_FIELDS for token in tokenize(fields.get(field))]
+    if len(tokens) < 2:
+        return set(tokens)
+    return {f'{first} {second}' for first, second in zip(tokens, tokens[1:])}
+
+
+def signature(fields):
+    """
+    MinHash-подпись (NUM_PERM x uint32) в виде bytes для Laptop.minhash; None для текста
+    без слов — сравнивать не с чем (подпись из одних 0xFFFFFFFF совпала бы с любой такой же).
+    """
+    items = shingles(fields)
+    if not items:
+        return None
+    hashes = np.fromiter((zlib.crc32(item.encode()) for item in items), dtype=np.uint64, count=len(items))
+    values = (_A * hashes[None, :] + _B) % _PRIME
+    return (values.min(axis=1) & np.uint64(0xFFFFFFFF)).astype(np.uint32).tobytes()
+
+
+def similarity(first, second):
+    """
+    Оценка коэффициента Жаккара по доле совпавших минимумов.
+    """
+    return float(np.mean(np.frombuffer(first, dtype=np.uint32) == np.frombuffer(second, dtype=np.uint32)))
+
+
+def _bands(minhash):
+    return [(band, minhash[band * ROWS * 4:(band + 1) * ROWS * 4]) for band in range(BANDS)]
+
+
+class DuplicateIndex:
+    """
+    LSH-индекс MinHash-подписей в памяти процесса: подпись режется на BANDS полос,
+    объявления с совпавшей полосой — кандидаты, их сходство проверяется по полной подписи.
+    Обновляется сигналами Laptop и раз в DUPLICATE_INDEX_REFRESH_SECONDS дочитывает
+    изменённые другими воркерами строки (по индексу updated_at).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = defaultdict(set)  # (полоса, байты полосы) -> {laptop_id}
+        self._entries = {}  # laptop_id -> (owner_id, minhash)
+        self._loaded_until = None
+        self._refreshed_at = 0.0
+
+    def _index(self, laptop_id, owner_id, minhash):
+        self._unindex(laptop_id)
+        self._entries[laptop_id] = (owner_id, minhash)
+        for key in _bands(minhash):
+            self._buckets[key].add(laptop_id)
+
+    def _unindex(self, laptop_id):
+        entry = self._entries.pop(laptop_id, None)
+        if entry is None:
+            return
+        for key in _bands(entry[1]):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(laptop_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _load(self, since=None):
+        rows = Laptop.objects.exclude(minhash=None)
+        if since is not None:
+            rows = rows.filter(updated_at__gte=since)
+        latest = since
+        for laptop_id, owner_id, minhash, updated_at in rows.values_list(
+            'id', 'owner_id', 'minhash', 'updated_at'
+        ).iterator(chunk_size=2000):
+            self._index(laptop_id, owner_id, bytes(minhash))
+            latest = max(latest, updated_at) if latest else updated_at
+        return latest
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._refreshed_at and now - self._refreshed_at < settings.DUPLICATE_INDEX_REFRESH_SECONDS:
+            return
+        with self._lock:
+            if self._refreshed_at and now - self._refreshed_at < settings.DUPLICATE_INDEX_REFRESH_SECONDS:
+                return
+            self._loaded_until = self._load(self._loaded_until) or self._loaded_until
+            self._refreshed_at = now
+
+    def add(self, laptop):
+        with self._lock:
+            # До первой загрузки индексировать нечего — строка попадёт в индекс при загрузке
+            if self._refreshed_at and laptop.minhash:
+                self._index(laptop.pk, laptop.owner_id, bytes(laptop.minhash))
+
+    def remove(self, laptop_id):
+        with self._lock:
+            self._unindex(laptop_id)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._entries.clear()
+            self._loaded_until = None
+            self._refreshed_at = 0.0
+
+    def candidates(self, minhash, owner_id=None):
+        """
+        [(laptop_id, сходство)] не ниже DUPLICATE_THRESHOLD, по убыванию; owner_id — только его объявления.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            found = set()
+            for key in _bands(minhash):
+                found |= self._buckets.get(key, set())
+            entries = [(laptop_id, self._entries[laptop_id]) for laptop_id in found]
+        matches = [
+            (laptop_id, similarity(minhash, entry_minhash))
+            for laptop_id, (entry_owner, entry_minhash) in entries
+            if owner_id is None or entry_owner == owner_id
+        ]
+        return sorted(
+            [match for match in matches if match[1] >= settings.DUPLICATE_THRESHOLD],
+            key=lambda match: (-match[1], match[0]),
+        )
+
+    def find(self, minhash, owner_id):
+        """
+        Самый похожий существующий ноутбук или None; запрос в БД — только если есть кандидаты.
+        """
+        return self.find_many([(minhash, owner_id)])[0]
+
+    def find_many(self, signatures):
+        """
+        find для пачки [(minhash, owner_id)] одним запросом в БД на всю пачку; без подписи — None.
+        """
+        by_owner = settings.DUPLICATE_SCOPE == 'owner'
+        matches = [
+            self.candidates(minhash, owner_id if by_owner else None)[:5] if minhash else []
+            for minhash, owner_id in signatures
+        ]
+        ids = {laptop_id for found in matches for laptop_id, _ in found}
+        if not ids:
+            return [None] * len(signatures)
+        laptops = Laptop.objects.in_bulk(ids)
+        for laptop_id in ids - laptops.keys():
+            self.remove(laptop_id)  # Удалён в другом воркере
+        return [next((laptops[laptop_id] for laptop_id, _ in found if laptop_id in laptops), None) for found in matches]
+
+
+duplicate_index = DuplicateIndex()
+
+
+def duplicate_actions(signatures):
+    """
+    Решения DUPLICATE_POLICY для новых объявлений [(minhash, owner_id)] -> [(действие, повтор)]:
+    'create' — создать (duplicate_of=повтор, если он найден), 'reject' — отклонить,
+    'merge' — обновить повтор вместо создания (только своё объявление).
+    """
+    if settings.DUPLICATE_POLICY == 'off':
+        return [('create', None)] * len(signatures)
+    actions = []
+    for (_, owner_id), duplicate in zip(signatures, duplicate_index.find_many(signatures)):
+        if duplicate is not None and settings.DUPLICATE_POLICY == 'reject':
+            actions.append(('reject', duplicate))
+        elif duplicate is not None and settings.DUPLICATE_POLICY == 'merge' and duplicate.owner_id == owner_id:
+            actions.append(('merge', duplicate))
+        else:
+            actions.append(('create', duplicate))
+    return actions
@@ -0,0 +1,177 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import DEFERRED, Count, F, IntegerField, Sum, Value
+from django.db.models.functions import Cast, Floor
+
+from .filters import LaptopFilter
+from .models import Laptop, LaptopFacet
+
+FACET_FIELDS = ('owner_id', 'model', 'price')
+# Фильтры, которые сводная таблица применить не может (owner и model — может): для них GROUP BY по items_laptop
+LIVE_FILTERS = ('min_price', 'max_price', 'title')
+
+
+def bucket_size():
+    return settings.FACET_PRICE_BUCKET
+
+
+def cell_of(owner_id, model, price):
+    """
+    Ячейка сводной таблицы: (owner_id, model, price_bucket, price).
+    """
+    price = Decimal(price)
+    return owner_id, model, int(price // bucket_size()), price
+
+
+def loaded_cell(laptop):
+    """
+    Ячейка, в которой ноутбук учтён сейчас: по значениям из базы (Laptop.from_db).
+    Для новых и частично загруженных (.only/.defer) объектов — None.
+    """
+    loaded = getattr(laptop, '_loaded_values', None)
+    if not loaded or any(loaded.get(field, DEFERRED) is DEFERRED for field in FACET_FIELDS):
+        return None
+    return cell_of(*(loaded[field] for field in FACET_FIELDS))
+
+
+def _apply(cell, count, price_sum):
+    owner_id, model, price_bucket = cell
+    cells = LaptopFacet.objects.filter(owner_id=owner_id, model=model, price_bucket=price_bucket)
+    if cells.update(count=F('count') + count, price_sum=F('price_sum') + price_sum):
+        if count < 0:
+            cells.filter(count__lte=0).delete()
+        return
+    try:
+        with transaction.atomic():
+            LaptopFacet.objects.create(
+                owner_id=owner_id, model=model, price_bucket=price_bucket, count=count, price_sum=price_sum
+            )
+    except IntegrityError:  # Ячейку создал параллельный запрос
+        cells.update(count=F('count') + count, price_sum=F('price_sum') + price_sum)
+
+
+def record_saved(laptops):
+    """
+    Инкрементальное обновление: -1 из старой ячейки, +1 в новую; дельты по пачке сливаются.
+    """
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for laptop in laptops:
+        old = loaded_cell(laptop)
+        new = cell_of(laptop.owner_id, laptop.model, laptop.price)
+        if old == new:
+            continue
+        if old is not None:
+            deltas[old[:3]][0] -= 1
+            deltas[old[:3]][1] -= old[3]
+        deltas[new[:3]][0] += 1
+        deltas[new[:3]][1] += new[3]
+        laptop._loaded_values = dict(zip(FACET_FIELDS, (laptop.owner_id, laptop.model, new[3])))
+    for cell, (count, price_sum) in deltas.items():
+        if count or price_sum:
+            _apply(cell, count, price_sum)
+
+
+def record_deleted(laptops):
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for laptop in laptops:
+        cell = loaded_cell(laptop) or cell_of(laptop.owner_id, laptop.model, laptop.price)
+        deltas[cell[:3]][0] -= 1
+        deltas[cell[:3]][1] -= cell[3]
+    for cell, (count, price_sum) in deltas.items():
+        _apply(cell, count, price_sum)
+
+
+def live_cells(queryset):
+    """
+    Те же ячейки, посчитанные GROUP BY по объявлениям.
+    """
+    return queryset.order_by().annotate(
+        price_bucket=Cast(Floor(F('price') / Value(bucket_size())), IntegerField()),
+    ).values('owner_id', 'model', 'price_bucket').annotate(count=Count('id'), price_sum=Sum('price'))
+
+
+def rebuild():
+    """
+    Полный пересчёт сводной таблицы (команда reconcile_facets). Возвращает число исправленных ячеек.
+    """
+    fresh = {
+        (row['owner_id'], row['model'], row['price_bucket']): (row['count'], row['price_sum'])
+        for row in live_cells(Laptop.objects.all())
+    }
+    with transaction.atomic():
+        stored = {
+            (row.owner_id, row.model, row.price_bucket): row
+            for row in LaptopFacet.objects.select_for_update()
+        }
+        stale = [row.pk for key, row in stored.items() if key not in fresh]
+        changed, created = [], []
+        for key, (count, price_sum) in fresh.items():
+            row = stored.get(key)
+            if row is None:
+                created.append(LaptopFacet(
+                    owner_id=key[0], model=key[1], price_bucket=key[2], count=count, price_sum=price_sum
+                ))
+            elif (row.count, row.price_sum) != (count, price_sum):
+                row.count, row.price_sum = count, price_sum
+                changed.append(row)
+        LaptopFacet.objects.filter(pk__in=stale).delete()
+        LaptopFacet.objects.bulk_update(changed, ['count', 'price_sum'], batch_size=1000)
+        LaptopFacet.objects.bulk_create(created, batch_size=1000)
+    return len(stale) + len(changed) + len(created)
+
+
+def summary_cells(params):
+    cells = LaptopFacet.objects.filter(count__gt=0)
+    owner = params.get('owner')
+    if owner:
+        cells = cells.filter(owner_id=int(owner))
+    model = params.get('model')
+    if model:
+        cells = cells.filter(model=model)
+    return cells.values('owner_id', 'model', 'price_bucket', 'count', 'price_sum')
+
+
+def facets(params):
+    """
+    Фасеты для боковой панели фильтров. Без фильтров по цене/названию читается только
+    сводная таблица (O(ячеек)); иначе ячейки считаются по отфильтрованным объявлениям.
+    """
+    queryset = LaptopFilter.filter_queryset(Laptop.objects.all(), params)  # Заодно валидация параметров
+    if any(params.get(name) for name in LIVE_FILTERS):
+        cells = live_cells(queryset)
+    else:
+        cells = summary_cells(params)
+
+    total = 0
+    prices = defaultdict(int)
+    models = defaultdict(int)
+    owners = defaultdict(lambda: [0, Decimal(0)])
+    for cell in cells:
+        total += cell['count']
+        prices[cell['price_bucket']] += cell['count']
+        models[cell['model']] += cell['count']
+        owners[cell['owner_id']][0] += cell['count']
+        owners[cell['owner_id']][1] += cell['price_sum']
+
+    size = bucket_size()
+    return {
+        'total': total,
+        'price': {
+            'bucket_size': size,
+            'buckets': [
+                {'min': bucket * size, 'max': (bucket + 1) * size, 'count': count}
+                for bucket, count in sorted(prices.items())
+            ],
+        },
+        'models': [
+            {'model': model, 'count': count}
+            for model, count in sorted(models.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'owners': [
+            {'owner': owner_id, 'count': count, 'total_price': f'{price_sum:.2f}'}
+            for owner_id, (count, price_sum) in sorted(owners.items(), key=lambda item: (-item[1][0], item[0]))
+        ],
+    }
@@ -0,0 +1,71 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+
+
+class LaptopFilter:
+    """
+    Фильтрация и сортировка списка ноутбуков по query-параметрам.
+    Каждый фильтр опирается на индекс из Laptop.Meta.indexes (owner — индекс FK).
+    ?title= — диапазон по префиксу, строки в нём идут в порядке title, и любая
+    сортировка поверх него — сортировка во временной таблице. Поэтому вместе с
+    ?ordering= он не принимается.
+    """
+    ORDERINGS = {
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'newest': ('-id',),
+    }
+    DEFAULT_ORDERING = ('-id',)
+
+    @staticmethod
+    def _decimal(params, name):
+        value = params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            number = Decimal(value)
+        except InvalidOperation:
+            number = None
+        # Decimal('NaN') и Decimal('Infinity') разбираются, но в запрос к БД не годятся
+        if number is None or not number.is_finite():
+            raise ValidationError({name: 'Ожидается число.'})
+        return number
+
+    @classmethod
+    def filter_queryset(cls, queryset, params):
+        owner = params.get('owner')
+        if owner:
+            if not owner.isdecimal():
+                raise ValidationError({'owner': 'Ожидается id пользователя.'})
+            queryset = queryset.filter(owner_id=int(owner))
+
+        min_price = cls._decimal(params, 'min_price')
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+
+        max_price = cls._decimal(params, 'max_price')
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+
+        model = params.get('model')
+        if model:
+            queryset = queryset.filter(model=model)
+
+        # Только префикс: LIKE 'term%' использует индекс, '%term%' — нет
+        title = params.get('title')
+        if title:
+            queryset = queryset.filter(title__istartswith=title)
+
+        return queryset
+
+    @classmethod
+    def get_ordering(cls, params):
+        ordering = params.get('ordering')
+        if not ordering:
+            return None
+        if ordering not in cls.ORDERINGS:
+            raise ValidationError({'ordering': f"Допустимые значения: {', '.join(cls.ORDERINGS)}."})
+        if params.get('title'):
+            raise ValidationError({'ordering': 'Не сочетается с фильтром title.'})
+        return cls.ORDERINGS[ordering]
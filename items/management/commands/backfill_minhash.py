@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from items.dedup import signature
+from items.models import Laptop
+from items.search import SEARCH_FIELDS
+
+
+class Command(BaseCommand):
+    help = "Заполняет MinHash-подписи (поиск повторов) для ноутбуков, у которых их ещё нет."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Пересчитать подписи у всех ноутбуков")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        laptops = Laptop.objects.all() if options["all"] else Laptop.objects.filter(minhash=None)
+        batch_size = options["batch_size"]
+
+        # Пачки по первичному ключу: обновлённые строки выпадают из filter(minhash=None), OFFSET не годится
+        last_id, updated = 0, 0
+        while True:
+            rows = list(
+                laptops.filter(id__gt=last_id).order_by("id").values_list("id", *SEARCH_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            batch = [
+                Laptop(id=laptop_id, minhash=signature(dict(zip(SEARCH_FIELDS, values))))
+                for laptop_id, *values in rows
+            ]
+            # bulk_update не шлёт сигналов и не трогает updated_at — индексы подхватят подписи при загрузке
+            Laptop.objects.bulk_update(batch, ["minhash"])
+            last_id = rows[-1][0]
+            updated += len(batch)
+
+        self.stdout.write(f"Backfilled {updated} signatures in {time.perf_counter() - started:.1f}s.")
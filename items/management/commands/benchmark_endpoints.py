@@ -0,0 +1,209 @@
+import json
+import logging
+import math
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from items.management.commands.profile_startup import measure_startup
+from items.models import Laptop
+
+BENCH_USERNAME = "benchmark-user"
+BENCH_PASSWORD = "benchmark-password"
+REGISTER_PREFIX = "benchmark-reg-"
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    # Nearest-rank: наименьшее значение, не меньше которого fraction всех замеров
+    return ordered[min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1]
+
+
+class Scenario:
+    def __init__(self, name, method, build, expected=(200,)):
+        self.name = name
+        self.method = method
+        self.build = build  # build(context, rng) -> (path, data)
+        self.expected = expected
+
+
+def scenarios():
+    """
+    Маршруты items.urls и users.urls; path строится через reverse, чтобы не разъезжаться с urls.py.
+    Пакетные и админские bulk/export/import, а также PUT/PATCH/DELETE в прогон не входят.
+    """
+    def laptop_payload(context, rng):
+        return {"title": "Benchmark laptop", "model": "Bench 1", "price": "999.99", "description": "Created by benchmark"}
+
+    return [
+        Scenario("laptop-list-create GET", "get", lambda c, r: (reverse("laptop-list-create"), {})),
+        Scenario("laptop-list-create GET page", "get", lambda c, r: (reverse("laptop-list-create"), {"page_size": 20})),
+        Scenario("laptop-list-create GET filtered", "get",
+                 lambda c, r: (reverse("laptop-list-create"), {"min_price": 300, "max_price": 900, "page_size": 20})),
+        Scenario("laptop-list-create POST", "post",
+                 lambda c, r: (reverse("laptop-list-create"), laptop_payload(c, r)), expected=(201,)),
+        Scenario("laptop-detail GET", "get",
+                 lambda c, r: (reverse("laptop-detail", args=[r.choice(c["laptop_ids"])]), {})),
+        Scenario("laptop-search GET", "get", lambda c, r: (reverse("laptop-search"), {"q": r.choice(["macbook", "thinkpad", "xps"])})),
+        Scenario("laptop-changes GET", "get", lambda c, r: (reverse("laptop-changes"), {})),
+        Scenario("register POST", "post", lambda c, r: (reverse("register"), {
+            "username": f"{REGISTER_PREFIX}{r.getrandbits(48):x}", "email": f"{r.getrandbits(48):x}@example.com",
+            "password": BENCH_PASSWORD,
+        }), expected=(201,)),
+        Scenario("login POST", "post",
+                 lambda c, r: (reverse("login"), {"username": BENCH_USERNAME, "password": BENCH_PASSWORD})),
+        Scenario("token_refresh POST", "post", lambda c, r: (reverse("token_refresh"), {"refresh": c["refresh"]})),
+        Scenario("user-detail GET", "get", lambda c, r: (reverse("user-detail"), {})),
+        Scenario("user-by-id GET", "get", lambda c, r: (reverse("user-by-id", args=[r.choice(c["user_ids"])]), {})),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный прогон всех эндпоинтов: p50/p95/p99, RPS и число SQL-запросов, результат в JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Запросов на эндпоинт")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--only", action="append", help="Подстрока имени сценария (можно несколько)")
+        parser.add_argument("--output", help="Сохранить результаты в JSON")
+        parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--startup", action="store_true", help="Замерить и холодный старт (profile_startup)")
+
+    def prepare(self):
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME, defaults={"email": f"{BENCH_USERNAME}@example.com"})
+        user.set_password(BENCH_PASSWORD)
+        user.save()
+
+        laptop_ids = list(Laptop.objects.values_list("id", flat=True)[:1000])
+        if not laptop_ids:
+            raise CommandError("No laptops found, run generate_data first.")
+
+        client = Client()
+        tokens = client.post(reverse("login"), {"username": BENCH_USERNAME, "password": BENCH_PASSWORD}).json()
+        return user, {
+            "laptop_ids": laptop_ids,
+            "user_ids": list(User.objects.values_list("id", flat=True)[:1000]),
+            "access": tokens["access"],
+            "refresh": tokens["refresh"],
+        }
+
+    def run_scenario(self, scenario, context, total, concurrency, seed):
+        local = threading.local()
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {context['access']}"}
+
+        def one(index):
+            if not hasattr(local, "client"):
+                local.client = Client()
+            rng = random.Random(seed * 100003 + index)
+            path, data = scenario.build(context, rng)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = getattr(local.client, scenario.method)(path, data, **headers)
+                elapsed = (time.perf_counter() - started) * 1000
+            return elapsed, len(queries), response.status_code in scenario.expected
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, range(total)))
+        wall = time.perf_counter() - started
+
+        latencies = [elapsed for elapsed, _, _ in results]
+        return {
+            "requests": total,
+            "errors": sum(1 for _, _, ok in results if not ok),
+            "throughput_rps": round(total / wall, 1),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "queries_per_request": round(sum(count for _, count, _ in results) / total, 2),
+        }
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def benchmark(self, options):
+        user, context = self.prepare()
+        selected = [
+            scenario for scenario in scenarios()
+            if not options["only"] or any(part in scenario.name for part in options["only"])
+        ]
+
+        report = {
+            "meta": {
+                "commit": self.git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "database": connection.vendor,
+                "requests": options["requests"],
+                "concurrency": options["concurrency"],
+            },
+            "endpoints": {},
+        }
+        if options["startup"]:
+            report["startup"] = measure_startup()
+            self.stdout.write(
+                f"{'cold start':34} total={report['startup']['total_ms']:>8}ms "
+                f"first_request={report['startup']['first_request_ms']:>8}ms"
+            )
+        try:
+            for scenario in selected:
+                stats = self.run_scenario(scenario, context, options["requests"], options["concurrency"], options["seed"])
+                report["endpoints"][scenario.name] = stats
+                self.stdout.write(
+                    f"{scenario.name:34} p50={stats['p50_ms']:>8}ms p95={stats['p95_ms']:>8}ms "
+                    f"p99={stats['p99_ms']:>8}ms rps={stats['throughput_rps']:>8} "
+                    f"sql={stats['queries_per_request']:>5} errors={stats['errors']}"
+                )
+        finally:
+            Laptop.objects.filter(owner=user).delete()
+            get_user_model().objects.filter(username__startswith=REGISTER_PREFIX).delete()
+        return report
+
+    def handle(self, *args, **options):
+        # Строка лога на каждый запрос исказила бы замеры и засорила вывод
+        logging.getLogger("backend.performance").disabled = True
+        # Иначе замеряли бы ответы 429 и 503; после прогона настройки возвращаются
+        with override_settings(THROTTLE_ENABLED=False, MAX_IN_FLIGHT_REQUESTS=0):
+            report = self.benchmark(options)
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+        if options["compare"]:
+            self.compare(options["compare"], report)
+
+    def compare(self, path, report):
+        with open(path) as previous_file:
+            previous_report = json.load(previous_file)
+        previous = previous_report["endpoints"]
+        if "startup" in report and "startup" in previous_report:
+            self.stdout.write("\nCold start vs previous run:")
+            for phase in ("app_ms", "first_request_ms", "total_ms"):
+                old, new = previous_report["startup"][phase], report["startup"][phase]
+                change = (new - old) / old * 100 if old else 0
+                self.stdout.write(f"{phase:34} {old:>8}ms -> {new:>8}ms {change:+7.1f}%")
+        self.stdout.write("\nChange vs previous run (p95, rps):")
+        for name, stats in report["endpoints"].items():
+            old = previous.get(name)
+            if not old:
+                continue
+            p95 = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0
+            rps = (stats["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100 if old["throughput_rps"] else 0
+            self.stdout.write(f"{name:34} p95 {p95:+7.1f}%  rps {rps:+7.1f}%")
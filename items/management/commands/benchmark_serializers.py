@@ -0,0 +1,76 @@
+import json
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from backend.renderers import FastJSONRenderer
+from items.models import Laptop
+from items.serializers import LaptopRowSerializer, LaptopSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Сравнивает скорость LaptopSerializer и быстрого пути .values() (строк/сек)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--json", action="store_true", help="Вывести результат в JSON")
+
+    def measure(self, func, rows, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return round(rows / best)
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        results = {}
+        try:
+            # Тестовые строки создаются в транзакции и откатываются в конце
+            with transaction.atomic():
+                owner = get_user_model().objects.create_user(
+                    username="benchmark-serializers", email="benchmark-serializers@example.com"
+                )
+                Laptop.objects.bulk_create(
+                    Laptop(
+                        title=f"Laptop {i}", model=f"Model {i % 50}", price=Decimal(100 + i % 900) + Decimal("0.99"),
+                        description="Benchmark row " * 10, owner=owner,
+                    )
+                    for i in range(rows)
+                )
+                queryset = Laptop.objects.filter(owner=owner)
+                row_serializer = LaptopRowSerializer()
+                data = row_serializer.serialize(row_serializer.values(queryset))
+
+                results = {
+                    "rows": rows,
+                    "model_serializer_rows_per_sec": self.measure(
+                        lambda: LaptopSerializer(queryset.all(), many=True).data, rows, repeat
+                    ),
+                    "values_serializer_rows_per_sec": self.measure(
+                        lambda: row_serializer.serialize(row_serializer.values(queryset.all())), rows, repeat
+                    ),
+                    "json_renderer_rows_per_sec": self.measure(lambda: JSONRenderer().render(data), rows, repeat),
+                    "fast_json_renderer_rows_per_sec": self.measure(
+                        lambda: FastJSONRenderer().render(data), rows, repeat
+                    ),
+                }
+                raise Rollback
+        except Rollback:
+            pass
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, value in results.items():
+            self.stdout.write(f"{name:36} {value}")
@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from items.transfer import FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Потоковый экспорт ноутбуков (с владельцами) в NDJSON или CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS, default="ndjson")
+        parser.add_argument("--output", help="Файл; по умолчанию stdout")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        output = open(options["output"], "w", encoding="utf-8", newline="") if options["output"] else sys.stdout
+        try:
+            for line in export_lines(options["format"], chunk_size=options["chunk_size"]):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,89 @@
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+
+from backend.response_cache import bump_version
+from items import facets
+from items.models import Laptop
+
+BRANDS = {
+    "Lenovo": ["ThinkPad T14", "ThinkPad X1 Carbon", "IdeaPad 5", "Legion 5", "Yoga Slim 7"],
+    "Apple": ["MacBook Air M1", "MacBook Air M2", "MacBook Pro 14", "MacBook Pro 16"],
+    "Dell": ["XPS 13", "XPS 15", "Latitude 7420", "Inspiron 15", "Alienware m15"],
+    "HP": ["EliteBook 840", "Pavilion 15", "Spectre x360", "Omen 16", "ProBook 450"],
+    "Asus": ["Zenbook 14", "VivoBook 15", "ROG Strix G15", "TUF Gaming F15"],
+    "Acer": ["Swift 3", "Aspire 5", "Nitro 5", "Predator Helios 300"],
+}
+CONDITIONS = ["Как новый", "Отличное состояние", "Хорошее состояние", "Есть следы использования", "Требует ремонта"]
+DETAILS = [
+    "Батарея держит {hours} часов.", "{ram} ГБ оперативной памяти.", "SSD на {ssd} ГБ.",
+    "Экран без битых пикселей.", "Полный комплект, коробка и зарядка.", "Без зарядного устройства.",
+    "Покупал в {year} году, один владелец.", "Небольшая царапина на крышке.", "Подойдёт для учёбы и работы.",
+    "Тянет современные игры на средних настройках.", "Торг уместен.", "Возможна доставка.",
+]
+
+
+class Command(BaseCommand):
+    help = "Создаёт N синтетических пользователей и M ноутбуков для нагрузочных тестов."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--laptops", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--password", default="benchmark-password")
+
+    def description(self, rng):
+        parts = [rng.choice(CONDITIONS) + "."]
+        for template in rng.sample(DETAILS, rng.randint(2, 5)):
+            parts.append(template.format(
+                hours=rng.randint(2, 12), ram=rng.choice([4, 8, 16, 32]),
+                ssd=rng.choice([128, 256, 512, 1024]), year=rng.randint(2015, 2024),
+            ))
+        return " ".join(parts)
+
+    def price(self, rng):
+        # Логнормальное распределение: медиана ~600, длинный хвост дорогих моделей
+        value = min(max(rng.lognormvariate(6.4, 0.6), 50), 10000)
+        return Decimal(f"{value:.2f}")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        User = get_user_model()
+        batch_size = options["batch_size"]
+
+        # Один хэш на всех: PBKDF2 на каждого пользователя занял бы минуты
+        password = make_password(options["password"])
+        start = User.objects.count()
+        users = [
+            User(username=f"seller{start + i}", email=f"seller{start + i}@example.com", password=password)
+            for i in range(options["users"])
+        ]
+        User.objects.bulk_create(users, batch_size=batch_size)
+        owner_ids = list(
+            User.objects.filter(username__in=[user.username for user in users]).values_list("id", flat=True)
+        ) or list(User.objects.values_list("id", flat=True)[:1000])
+        if not owner_ids:
+            self.stderr.write("No users to own laptops.")
+            return
+
+        created = 0
+        while created < options["laptops"]:
+            batch = []
+            for _ in range(min(batch_size, options["laptops"] - created)):
+                brand = rng.choice(list(BRANDS))
+                model = rng.choice(BRANDS[brand])
+                batch.append(Laptop(
+                    title=f"{brand} {model}"[:100], model=model, price=self.price(rng),
+                    description=self.description(rng), owner_id=rng.choice(owner_ids),
+                ))
+            Laptop.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+        # bulk_create не шлёт сигналов — пересчитываем фасеты и сбрасываем кэш ответов вручную
+        facets.rebuild()
+        bump_version(Laptop)
+
+        self.stdout.write(f"Created {len(users)} users and {created} laptops.")
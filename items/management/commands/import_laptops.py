@@ -0,0 +1,37 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from items.transfer import FORMATS, LaptopImporter
+
+
+class Command(BaseCommand):
+    help = "Пачечный импорт ноутбуков из NDJSON/CSV с продолжением по чекпоинту."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--checkpoint", help="Файл с номером последней импортированной строки")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.endswith(".csv") else "ndjson")
+        checkpoint = options["checkpoint"]
+
+        after = 0
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as checkpoint_file:
+                after = int(checkpoint_file.read().strip() or 0)
+            self.stdout.write(f"Resuming after line {after}")
+
+        def save_checkpoint(line):
+            if checkpoint:
+                with open(checkpoint, "w") as checkpoint_file:
+                    checkpoint_file.write(str(line))
+
+        importer = LaptopImporter(batch_size=options["batch_size"], on_batch=save_checkpoint)
+        with open(path, encoding="utf-8", newline="") as lines:
+            summary = importer.run(lines, fmt, after=after)
+        self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2))
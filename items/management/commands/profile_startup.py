@@ -0,0 +1,138 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+# Выполняется в отдельном чистом интерпретаторе: в текущем процессе всё уже импортировано
+CHILD = r'''
+import json, os, sys, time
+spawned_at = time.time()
+started = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+from django.conf import settings
+settings.INSTALLED_APPS
+settings_done = time.perf_counter()
+
+interface, path, query = sys.argv[1:4]
+if interface == "asgi":
+    import asyncio
+    from backend.asgi import application
+    app_done = time.perf_counter()
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"localhost")], "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+    }, receive, send))
+    status = messages[0]["status"]
+else:
+    import io
+    from backend.wsgi import application
+    app_done = time.perf_counter()
+    statuses = []
+    result = application({
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query, "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80", "HTTP_HOST": "localhost", "REMOTE_ADDR": "127.0.0.1", "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr,
+    }, lambda status, headers, exc_info=None: statuses.append(status))
+    b"".join(result)
+    result.close()
+    status = int(statuses[0].split()[0])
+done = time.perf_counter()
+
+print(json.dumps({
+    "spawned_at": spawned_at,
+    "settings_ms": (settings_done - started) * 1000,
+    "app_ms": (app_done - settings_done) * 1000,
+    "first_request_ms": (done - app_done) * 1000,
+    "status": status,
+}))
+'''
+
+PHASES = ("interpreter_ms", "settings_ms", "app_ms", "first_request_ms", "total_ms")
+
+
+def run_child(interface, path, query, importtime=False):
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", CHILD, interface, path, query]
+    launched = time.time()
+    result = subprocess.run(command, capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy())
+    if result.returncode:
+        raise CommandError(f"Startup probe failed:\n{result.stderr[-2000:]}")
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["interpreter_ms"] = (sample.pop("spawned_at") - launched) * 1000
+    sample["total_ms"] = sample["interpreter_ms"] + sample["settings_ms"] + sample["app_ms"] + sample["first_request_ms"]
+    return sample, result.stderr
+
+
+def import_costs(importtime_log):
+    """
+    Собственное время импорта (без вложенных модулей), просуммированное по пакетам верхнего уровня, мс.
+    """
+    costs = defaultdict(float)
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        costs[name.strip().split(".")[0]] += int(self_us) / 1000
+    return sorted(costs.items(), key=lambda item: -item[1])
+
+
+def measure_startup(interface="asgi", path=None, query="page_size=1", runs=5):
+    """
+    Медианы фаз холодного старта по runs запускам:
+    interpreter — запуск python, settings — импорт настроек, app — django.setup() и модуль
+    приложения (с backend.startup.warm_up), first_request — первый запрос.
+    Воркер gunicorn --preload платит только first_request: остальное сделано в мастере до fork.
+    """
+    path = path or reverse("laptop-list-create")
+    samples = [run_child(interface, path, query)[0] for _ in range(runs)]
+    report = {phase: round(statistics.median(sample[phase] for sample in samples), 1) for phase in PHASES}
+    report.update(interface=interface, path=path, status=samples[-1]["status"], runs=runs)
+    return report
+
+
+class Command(BaseCommand):
+    help = "Профиль холодного старта: время фаз до первого ответа и стоимость импорта по пакетам."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interface", choices=("asgi", "wsgi"), default="asgi")
+        parser.add_argument("--path", help="По умолчанию список объявлений")
+        parser.add_argument("--query", default="page_size=1")
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--top", type=int, default=15, help="Сколько пакетов показать")
+        parser.add_argument("--output", help="Сохранить результаты в JSON")
+
+    def handle(self, *args, **options):
+        report = measure_startup(options["interface"], options["path"], options["query"], options["runs"])
+        self.stdout.write(
+            f"Cold start ({report['interface']} GET {report['path']} -> {report['status']}, "
+            f"median of {report['runs']} runs):"
+        )
+        for phase in PHASES:
+            self.stdout.write(f"  {phase[:-3]:16} {report[phase]:>8.1f} ms")
+
+        # -X importtime сам замедляет импорт, поэтому отдельный прогон только для разбивки
+        _, log = run_child(report["interface"], report["path"], options["query"], importtime=True)
+        costs = import_costs(log)
+        report["imports_ms"] = {package: round(ms, 1) for package, ms in costs}
+        self.stdout.write("\nImport self time by top-level package:")
+        for package, ms in costs[:options["top"]]:
+            self.stdout.write(f"  {package:24} {ms:>8.1f} ms")
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from items.changes import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Удаление записей об удалённых объявлениях старше CHANGES_RETENTION_DAYS (запускать периодически, например из cron)."
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(f"Pruned {deleted} tombstones older than {settings.CHANGES_RETENTION_DAYS} days.")
@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from items.similar import SimilarityIndex
+
+
+class Command(BaseCommand):
+    help = "Полная пересборка индекса похожих объявлений в файл (запускать периодически, например из cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=settings.SIMILAR_INDEX_PATH, help="По умолчанию SIMILAR_INDEX_PATH")
+
+    def handle(self, *args, **options):
+        if not options["output"]:
+            raise CommandError("Set SIMILAR_INDEX_PATH or pass --output.")
+
+        started = time.perf_counter()
+        index = SimilarityIndex()
+        index.rebuild()
+        index.save(options["output"])
+        self.stdout.write(
+            f"Indexed {index.size()} laptops in {time.perf_counter() - started:.1f}s -> {options['output']}"
+        )
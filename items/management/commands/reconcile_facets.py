@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from backend.response_cache import bump_version
+from items import facets
+from items.models import Laptop
+
+
+class Command(BaseCommand):
+    help = "Полный пересчёт сводной таблицы фасетов (запускать периодически, например из cron)."
+
+    def handle(self, *args, **options):
+        fixed = facets.rebuild()
+        if fixed:
+            bump_version(Laptop)
+        self.stdout.write(f"Reconciled facets: {fixed} cells fixed.")
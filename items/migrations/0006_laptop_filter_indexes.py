@@ -0,0 +1,25 @@
+# Generated by Django 4.2.18 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0005_laptop_image_url'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='laptop',
+            index=models.Index(fields=['price', 'id'], name='laptop_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='laptop',
+            index=models.Index(fields=['model'], name='laptop_model_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='laptop',
+            index=models.Index(fields=['title'], name='laptop_title_idx'),
+        ),
+    ]
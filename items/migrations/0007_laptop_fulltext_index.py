@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX laptop_fulltext_idx ON items_laptop (title, model, description)'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX laptop_fulltext_idx ON items_laptop')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0006_laptop_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
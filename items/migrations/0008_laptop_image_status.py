@@ -0,0 +1,18 @@
+# Generated by Django 4.2.18 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0007_laptop_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='laptop',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='', max_length=10),
+        ),
+    ]
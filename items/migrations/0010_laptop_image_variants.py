@@ -0,0 +1,23 @@
+# Generated by Django 4.2.18 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0009_storedimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='laptop',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='storedimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
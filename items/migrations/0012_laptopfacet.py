@@ -0,0 +1,44 @@
+# Generated by Django 4.2.18 on 2026-10-18 19:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, IntegerField, Sum, Value
+from django.db.models.functions import Cast, Floor
+
+
+def fill_facets(apps, schema_editor):
+    Laptop = apps.get_model('items', 'Laptop')
+    LaptopFacet = apps.get_model('items', 'LaptopFacet')
+    cells = Laptop.objects.order_by().annotate(
+        price_bucket=Cast(Floor(F('price') / Value(settings.FACET_PRICE_BUCKET)), IntegerField()),
+    ).values('owner_id', 'model', 'price_bucket').annotate(count=Count('id'), price_sum=Sum('price'))
+    LaptopFacet.objects.bulk_create((LaptopFacet(**cell) for cell in cells), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0011_laptop_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LaptopFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner_id', models.BigIntegerField()),
+                ('model', models.CharField(max_length=255)),
+                ('price_bucket', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model'], name='laptop_facet_model_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='laptopfacet',
+            constraint=models.UniqueConstraint(fields=('owner_id', 'model', 'price_bucket'), name='laptop_facet_cell_uniq'),
+        ),
+        migrations.RunPython(fill_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.18 on 2026-10-18 20:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0012_laptopfacet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='laptop',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='items.laptop'),
+        ),
+        migrations.AddField(
+            model_name='laptop',
+            name='minhash',
+            field=models.BinaryField(null=True),
+        ),
+    ]
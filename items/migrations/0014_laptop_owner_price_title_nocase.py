@@ -0,0 +1,31 @@
+# Generated by Django 4.2.18 on 2026-10-18 20:37
+
+from django.db import migrations, models
+
+
+# ?title= фильтрует title__istartswith. В MySQL регистронезависимое сравнение даёт сама
+# коллация, и LIKE 'x%' идёт по laptop_title_idx; в SQLite LIKE регистронезависим
+# и использует только индекс с COLLATE NOCASE
+def create_title_nocase_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('CREATE INDEX laptop_title_nocase_idx ON items_laptop (title COLLATE NOCASE)')
+
+
+def drop_title_nocase_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP INDEX laptop_title_nocase_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0013_laptop_minhash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='laptop',
+            index=models.Index(fields=['owner', 'price', 'id'], name='laptop_owner_price_id_idx'),
+        ),
+        migrations.RunPython(create_title_nocase_index, drop_title_nocase_index),
+    ]
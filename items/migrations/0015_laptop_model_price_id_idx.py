@@ -0,0 +1,17 @@
+# Generated by Django 4.2.18 on 2026-10-18 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0014_laptop_owner_price_title_nocase'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='laptop',
+            index=models.Index(fields=['model', 'price', 'id'], name='laptop_model_price_id_idx'),
+        ),
+    ]
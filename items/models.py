@@ -2,16 +2,99 @@ from django.db import models
 from django.conf import settings
 
 class Laptop(models.Model):
+    IMAGE_PENDING = 'pending'
+    IMAGE_DONE = 'done'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_DONE, 'Done'),
+        (IMAGE_FAILED, 'Failed'),
+    ]
+
     title = models.CharField(max_length=100, default="Default Laptop")
     model = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField()
     image_url = models.URLField(blank=True, null=True)
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, blank=True, default='')
+    image_variants = models.JSONField(default=dict, blank=True)  # {'thumb': url, 'small': url, ...}
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="laptops"
     )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    minhash = models.BinaryField(null=True, editable=False)  # MinHash-подпись текста, см. items.dedup
+    duplicate_of = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.SET_NULL, related_name='duplicates'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['price', 'id'], name='laptop_price_id_idx'),
+            models.Index(fields=['model'], name='laptop_model_idx'),
+            models.Index(fields=['title'], name='laptop_title_idx'),
+            # ?owner= и ?model= с сортировкой по цене: без индекса — сортировка найденных строк во временной таблице
+            models.Index(fields=['owner', 'price', 'id'], name='laptop_owner_price_id_idx'),
+            models.Index(fields=['model', 'price', 'id'], name='laptop_model_price_id_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения на момент загрузки: по ним items.facets вычитает ноутбук из старой ячейки сводки
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def __str__(self):
         return self.title
+
+
+class StoredImage(models.Model):
+    """
+    Индекс хэш содержимого -> URL: одинаковые картинки загружаются один раз.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    url = models.URLField()
+    backend = models.CharField(max_length=20)
+    size = models.PositiveIntegerField()
+    variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.url
+
+
+class LaptopTombstone(models.Model):
+    """
+    Запись об удалённом ноутбуке для ленты изменений /items/changes/.
+    """
+    laptop_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Laptop {self.laptop_id} deleted at {self.deleted_at}"
+
+
+class LaptopFacet(models.Model):
+    """
+    Сводная таблица для /items/facets/: число объявлений и сумма цен
+    на ячейку (продавец, модель, ценовой интервал). Ведётся сигналами, см. items.facets.
+    """
+    owner_id = models.BigIntegerField()
+    model = models.CharField(max_length=255)
+    price_bucket = models.IntegerField()  # floor(price / FACET_PRICE_BUCKET)
+    count = models.IntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner_id', 'model', 'price_bucket'], name='laptop_facet_cell_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['model'], name='laptop_facet_model_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id}/{self.model}/{self.price_bucket}: {self.count}"
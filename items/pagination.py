@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class LaptopCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация списка ноутбуков: курсор кодирует последний id страницы,
+    поэтому стоимость запроса не зависит от глубины (нет OFFSET).
+    """
+    page_size = 6
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+    @staticmethod
+    def is_requested(request):
+        return 'cursor' in request.query_params or 'page_size' in request.query_params
+
+
+class LaptopSearchPagination(PageNumberPagination):
+    page_size = 6
+    page_size_query_param = 'page_size'
+    max_page_size = 100
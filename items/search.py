@@ -0,0 +1,142 @@
+import html
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Laptop
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+SEARCH_FIELDS = ('title', 'model', 'description')
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+def highlight(text, terms, width=160):
+    """
+    Возвращает фрагмент текста вокруг первого совпадения с подсвеченными (<mark>) терминами.
+    """
+    if not text:
+        return ''
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE) if terms else None
+    match = pattern.search(text) if pattern else None
+    start = max(0, match.start() - width // 3) if match else 0
+    fragment = text[start:start + width]
+
+    parts, position = [], 0
+    for found in (pattern.finditer(fragment) if pattern else ()):
+        parts.append(html.escape(fragment[position:found.start()]))
+        parts.append(f'<mark>{html.escape(found.group())}</mark>')
+        position = found.end()
+    parts.append(html.escape(fragment[position:]))
+
+    snippet = ''.join(parts)
+    if start > 0:
+        snippet = '…' + snippet
+    if start + width < len(text):
+        snippet += '…'
+    return snippet
+
+
+class InMemorySearchIndex:
+    """
+    Инвертированный индекс в памяти процесса (SQLite / тесты).
+    Строится один раз при первом запросе и дальше обновляется сигналами Laptop.
+    """
+    FIELD_WEIGHTS = {'title': 3.0, 'model': 2.0, 'description': 1.0}
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)  # токен -> {laptop_id: вес}
+        self._documents = {}  # laptop_id -> множество токенов
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            rows = Laptop.objects.values_list('id', *SEARCH_FIELDS).iterator(chunk_size=2000)
+            for laptop_id, *values in rows:
+                self._index(laptop_id, dict(zip(SEARCH_FIELDS, values)))
+            self._loaded = True
+
+    def _index(self, laptop_id, fields):
+        self._unindex(laptop_id)
+        weights = defaultdict(float)
+        for field, weight in self.FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field)):
+                weights[token] += weight
+        for token, weight in weights.items():
+            self._postings[token][laptop_id] = weight
+        self._documents[laptop_id] = set(weights)
+
+    def _unindex(self, laptop_id):
+        for token in self._documents.pop(laptop_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(laptop_id, None)
+                if not postings:
+                    del self._postings[token]
+
+    def add(self, laptop):
+        with self._lock:
+            # До первой загрузки индексировать нечего — строка попадёт в индекс при загрузке
+            if self._loaded:
+                self._index(laptop.pk, {field: getattr(laptop, field) for field in SEARCH_FIELDS})
+
+    def remove(self, laptop_id):
+        with self._lock:
+            if self._loaded:
+                self._unindex(laptop_id)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._loaded = False
+
+    def search(self, query):
+        """
+        Возвращает id ноутбуков, отсортированные по TF-IDF релевантности.
+        """
+        self._ensure_loaded()
+        scores = defaultdict(float)
+        with self._lock:
+            total = len(self._documents) or 1
+            for token in set(tokenize(query)):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + total / len(postings))
+                for laptop_id, weight in postings.items():
+                    scores[laptop_id] += weight * idf
+        return sorted(scores, key=lambda laptop_id: (-scores[laptop_id], -laptop_id)), scores
+
+
+class MySQLFullTextBackend:
+    """
+    Поиск через FULLTEXT-индекс laptop_fulltext_idx (см. миграцию 0007).
+    """
+    MATCH_SQL = 'MATCH (title, model, description) AGAINST (%s IN NATURAL LANGUAGE MODE)'
+
+    def search_queryset(self, query, queryset=None):
+        return (
+            (Laptop.objects.all() if queryset is None else queryset)
+            .extra(where=[self.MATCH_SQL], params=[query])
+            .annotate(score=RawSQL(self.MATCH_SQL, [query]))
+            .order_by('-score', '-id')
+        )
+
+
+memory_index = InMemorySearchIndex()
+
+
+def uses_fulltext():
+    return connection.vendor == 'mysql'
@@ -1,10 +1,119 @@
-from rest_framework import serializers
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from backend.metrics import track
+from users.serializers import SellerSerializer
+
+from .dedup import signature
 from .models import Laptop
+from .search import SEARCH_FIELDS
+
+EXPANDABLE = ('owner',)
+
+
+def parse_expand(params):
+    """
+    ?expand=owner: вложить продавца в объявление (один JOIN) вместо запроса /users/<id>/ на каждого.
+    """
+    expand = {name for name in params.get('expand', '').split(',') if name}
+    if expand - set(EXPANDABLE):
+        raise ValidationError({'expand': f"Allowed values: {', '.join(EXPANDABLE)}."})
+    return expand
 
 class LaptopSerializer(serializers.ModelSerializer):
     class Meta:
         model = Laptop
-        fields = '__all__'
+        exclude = ('minhash',)
         extra_kwargs = {
             'image_url': {'required': False},  # Поле необязательно
+            'image_status': {'read_only': True},
+            'image_variants': {'read_only': True},
+            'duplicate_of': {'read_only': True},
         }
+
+    def validate(self, attrs):
+        # Подпись для поиска повторов (items.dedup) пересчитывается при изменении текста
+        if self.instance is None or any(field in attrs for field in SEARCH_FIELDS):
+            fields = {field: attrs.get(field, getattr(self.instance, field, None)) for field in SEARCH_FIELDS}
+            attrs['minhash'] = signature(fields)
+        return attrs
+
+
+
+class LaptopExpandedSerializer(LaptopSerializer):
+    """
+    LaptopSerializer с продавцом вместо id; queryset должен быть с select_related('owner').
+    """
+    owner = SellerSerializer(read_only=True)
+
+
+class LaptopRowSerializer:
+    """
+    Быстрый read-only путь для списков: строки берутся из .values() без создания моделей
+    и полей DRF на каждую строку. Формат вывода совпадает с LaptopSerializer.
+    """
+
+    OWNER_COLUMNS = {'username': 'owner__username', 'avatar': 'owner__avatar', 'avatar_variants': 'owner__avatar_variants'}
+
+    def __init__(self, expand=(), context=None):
+        self.fields = LaptopSerializer().fields
+        self.names = list(self.fields)
+        self.columns = [field.source + '_id' if isinstance(field, serializers.RelatedField) else field.source
+                        for field in self.fields.values()]
+        self.expand_owner = 'owner' in expand
+        self.context = context or {}
+
+    @staticmethod
+    def _converter(field):
+        if isinstance(field, serializers.DecimalField):
+            template = '{:.%df}' % field.decimal_places
+            return lambda value: None if value is None else template.format(value)
+        if isinstance(field, serializers.DateTimeField):
+            if getattr(field, 'format', api_settings.DATETIME_FORMAT) != ISO_8601:
+                return lambda value: field.to_representation(value)
+            # То же, что DateTimeField.to_representation, но таймзона вычисляется один раз на список
+            tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+            def convert(value):
+                if value is None:
+                    return None
+                if tz is not None and timezone.is_aware(value):
+                    value = value.astimezone(tz)
+                value = value.isoformat()
+                return value[:-6] + 'Z' if value.endswith('+00:00') else value
+            return convert
+        return None
+
+    def values(self, queryset):
+        if self.expand_owner:
+            # Продавец тем же запросом через JOIN, без моделей на каждую строку
+            return queryset.values(*self.columns, *self.OWNER_COLUMNS.values())
+        return queryset.values(*self.columns)
+
+    def _seller(self, row, sellers):
+        owner_id = row['owner_id']
+        if owner_id not in sellers:
+            user = get_user_model()(id=owner_id, **{name: row[column] for name, column in self.OWNER_COLUMNS.items()})
+            sellers[owner_id] = SellerSerializer(user, context=self.context).data
+        return sellers[owner_id]
+
+    def serialize(self, rows):
+        with track('serialize'):
+            return self._serialize(rows)
+
+    def _serialize(self, rows):
+        columns = [
+            (name, column, self._converter(field))
+            for name, column, field in zip(self.names, self.columns, self.fields.values())
+        ]
+        data = [
+            {name: (converter(row[column]) if converter else row[column]) for name, column, converter in columns}
+            for row in rows
+        ]
+        if self.expand_owner:
+            sellers = {}
+            for item, row in zip(data, rows):
+                item['owner'] = self._seller(row, sellers)
+        return data
@@ -0,0 +1,120 @@
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from backend.events import broker
+from backend.response_cache import bump_version
+
+from . import facets
+from .dedup import duplicate_index
+from .models import Laptop, LaptopTombstone
+from .search import memory_index
+from .serializers import LaptopSerializer
+from .similar import similar_index
+
+# Внутри bulk_delete post_delete не реагирует на каждую строку: реакция одна на всю пачку
+_deleting_in_bulk = ContextVar('deleting_in_bulk', default=False)
+
+
+def publish_events(events):
+    # После коммита: клиенты не должны увидеть изменения откаченной транзакции
+    transaction.on_commit(lambda: [broker.publish(event) for event in events])
+
+
+def laptops_saved(laptops, created=False):
+    """
+    Общая реакция на сохранение ноутбуков; вызывается и из post_save,
+    и вручную после bulk_create/bulk_update, которые сигналов не шлют.
+    Строки без id (не прочитанные обратно после bulk_create) попадают только в сводку фасетов.
+    """
+    facets.record_saved(laptops)
+    laptops = [laptop for laptop in laptops if laptop.pk is not None]
+    for laptop in laptops:
+        memory_index.add(laptop)
+        similar_index.add(laptop)
+        duplicate_index.add(laptop)
+    bump_version(Laptop)
+
+    if broker.has_subscribers():
+        event_type = 'laptop.created' if created else 'laptop.updated'
+        publish_events([
+            {'type': event_type, 'id': laptop.pk, 'data': LaptopSerializer(laptop).data} for laptop in laptops
+        ])
+
+
+def laptops_deleted(laptops):
+    """
+    То же для удаления: из post_delete и после удаления пачкой (bulk_delete).
+    """
+    for laptop in laptops:
+        memory_index.remove(laptop.pk)
+        similar_index.remove(laptop.pk)
+        duplicate_index.remove(laptop.pk)
+    facets.record_deleted(laptops)
+    LaptopTombstone.objects.bulk_create([LaptopTombstone(laptop_id=laptop.pk) for laptop in laptops])
+    bump_version(Laptop)
+    if broker.has_subscribers():
+        publish_events([{'type': 'laptop.deleted', 'id': laptop.pk} for laptop in laptops])
+
+
+def bulk_insert(laptops, batch_size):
+    """
+    bulk_create с одной реакцией laptops_saved на пачку. MySQL не возвращает id из
+    многострочного INSERT: тогда новые строки читаются обратно одним запросом — по владельцу
+    и created_at, который bulk_create сам проставил каждой строке (до микросекунд).
+    """
+    Laptop.objects.bulk_create(laptops, batch_size=batch_size)
+    missing = [laptop for laptop in laptops if laptop.pk is None]
+    if missing:
+        found = defaultdict(deque)
+        rows = Laptop.objects.filter(
+            owner_id__in={laptop.owner_id for laptop in missing},
+            created_at__range=(min(laptop.created_at for laptop in missing), max(laptop.created_at for laptop in missing)),
+        ).order_by('id').values_list('id', 'owner_id', 'created_at', 'title')
+        for laptop_id, *key in rows:
+            found[tuple(key)].append(laptop_id)
+        for laptop in missing:
+            ids = found[(laptop.owner_id, laptop.created_at, laptop.title)]
+            if ids:
+                laptop.pk = ids.popleft()
+    laptops_saved(laptops, created=True)
+    return laptops
+
+
+def bulk_delete(queryset):
+    """
+    Удаляет ноутбуки выборки пачкой: одна реакция laptops_deleted и одна вставка записей
+    об удалении вместо post_delete на каждую строку. Вызывать внутри транзакции.
+    Возвращает число удалённых ноутбуков.
+    """
+    # Поля для сводки фасетов
+    laptops = list(
+        queryset.select_related(None).select_for_update().order_by().only('id', 'owner_id', 'model', 'price')
+    )
+    if not laptops:
+        return 0
+    ids = [laptop.pk for laptop in laptops]
+    # Сами, а не SET_NULL при удалении: update() коллектора не трогает updated_at, по нему работает лента изменений
+    Laptop.objects.filter(duplicate_of__in=ids).update(duplicate_of=None, updated_at=timezone.now())
+    token = _deleting_in_bulk.set(True)
+    try:
+        _, deleted = Laptop.objects.filter(pk__in=ids).delete()
+    finally:
+        _deleting_in_bulk.reset(token)
+    laptops_deleted(laptops)
+    return deleted.get(Laptop._meta.label, 0)
+
+
+@receiver(post_save, sender=Laptop)
+def index_laptop(sender, instance, created, **kwargs):
+    laptops_saved([instance], created=created)
+
+
+@receiver(post_delete, sender=Laptop)
+def unindex_laptop(sender, instance, **kwargs):
+    if not _deleting_in_bulk.get():
+        laptops_deleted([instance])
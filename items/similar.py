@@ -0,0 +1,369 @@
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Laptop, LaptopTombstone
+from .search import SEARCH_FIELDS, InMemorySearchIndex, tokenize
+
+EMPTY_INT = np.zeros(0, dtype=np.int32)
+EMPTY_FLOAT = np.zeros(0, dtype=np.float32)
+
+
+class SimilarityIndex:
+    """
+    "Похожие объявления": TF-IDF векторы title/model/description (веса полей как в поиске),
+    нормированные по L2, в разреженном виде на массивах NumPy — по терминам (CSC) для
+    скоринга и по документам (CSR) для вектора запроса. Косинус считается одним bincount
+    по спискам вхождений терминов запроса, к нему добавляется близость цен (по log-цене).
+
+    Изменения из сигналов копятся в небольшой дельте и сливаются в основные массивы при
+    переполнении; IDF при этом не пересчитывается — это делает полная пересборка
+    (команда rebuild_similar пишет файл SIMILAR_INDEX_PATH, воркеры его перечитывают).
+    Правки других процессов воркер раз в SIMILAR_RELOAD_SECONDS дочитывает из БД
+    по updated_at и записям об удалении — с файлом и без него.
+    """
+    PRICE_WEIGHT = 0.2
+    FOLD_SIZE = 2000  # документов в дельте до слияния
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Загрузка и догрузка — по одной за раз и без _lock: запросы и сигналы её не ждут
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._file_mtime = None
+        self._loaded_until = None  # изменения БД до этого момента уже в индексе
+        self._checked_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._vocab = {}
+        self._df = []
+        self._documents = 0
+        self._build([])
+
+    # --- построение ---
+
+    def _term_ids(self, fields):
+        counts = defaultdict(float)
+        for field, weight in InMemorySearchIndex.FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field)):
+                term_id = self._vocab.get(token)
+                if term_id is None:
+                    term_id = self._vocab[token] = len(self._df)
+                    self._df.append(0)
+                counts[term_id] += weight
+        return counts
+
+    def _weigh(self, counts):
+        term_ids = np.fromiter(counts, dtype=np.int32, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        if len(term_ids):
+            df = np.fromiter((self._df[term_id] for term_id in counts), dtype=np.float32, count=len(counts))
+            weights *= np.log1p(max(self._documents, 1) / np.maximum(df, 1))
+            norm = np.linalg.norm(weights)
+            if norm:
+                weights /= norm
+        return term_ids, weights
+
+    @staticmethod
+    def _log_price(price):
+        return math.log1p(float(price or 0))
+
+    def _build(self, documents):
+        """
+        documents: [(laptop_id, log_price, term_ids, weights)] — уже взвешенные векторы.
+        """
+        lengths = np.array([len(doc[2]) for doc in documents], dtype=np.int64)
+        self._ids = np.array([doc[0] for doc in documents], dtype=np.int64)
+        self._prices = np.array([doc[1] for doc in documents], dtype=np.float32)
+        self._doc_ptr = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        self._doc_terms = np.concatenate([doc[2] for doc in documents]) if documents else EMPTY_INT
+        self._doc_weights = np.concatenate([doc[3] for doc in documents]) if documents else EMPTY_FLOAT
+
+        doc_rows = np.repeat(np.arange(len(documents), dtype=np.int32), lengths)
+        order = np.argsort(self._doc_terms, kind='stable')
+        self._term_rows = doc_rows[order]
+        self._term_weights = self._doc_weights[order]
+        self._term_ptr = np.concatenate(([0], np.cumsum(np.bincount(self._doc_terms, minlength=len(self._df)))))
+
+        self._alive = np.ones(len(documents), dtype=bool)
+        self._row_of = {int(laptop_id): row for row, laptop_id in enumerate(self._ids)}
+        self._price_scale = (float(np.std(self._prices)) if len(self._prices) > 1 else 0.0) or 1.0
+        self._delta = {}
+        self._delta_arrays = None
+
+    def rebuild(self):
+        """
+        Полная пересборка из БД (IDF заново). Считается в отдельном экземпляре, пока
+        запросы идут по прежнему состоянию; правки за время сборки дочитает _catch_up.
+        """
+        fresh = SimilarityIndex()
+        fresh._loaded_until = timezone.now()
+        counted = []
+        rows = Laptop.objects.values_list('id', 'price', *SEARCH_FIELDS).iterator(chunk_size=2000)
+        for laptop_id, price, *values in rows:
+            counts = fresh._term_ids(dict(zip(SEARCH_FIELDS, values)))
+            for term_id in counts:
+                fresh._df[term_id] += 1
+            counted.append((laptop_id, fresh._log_price(price), counts))
+        fresh._documents = len(counted)
+        fresh._build([(laptop_id, price, *fresh._weigh(counts)) for laptop_id, price, counts in counted])
+        fresh._loaded = True
+        self._adopt(fresh)
+
+    def _adopt(self, fresh):
+        with self._lock:
+            for name, value in vars(fresh).items():
+                if name not in ('_lock', '_refresh_lock', '_checked_at'):
+                    setattr(self, name, value)
+
+    def _catch_up(self):
+        """
+        Правки и удаления после _loaded_until, сделанные другими процессами (свои приходят
+        сигналами, повтор безвреден). Оба запроса идут по индексам updated_at и deleted_at.
+        """
+        since = self._loaded_until
+        if since is None:
+            return
+        changed = list(
+            Laptop.objects.filter(updated_at__gte=since)
+            .values_list('id', 'price', 'updated_at', *SEARCH_FIELDS).iterator(chunk_size=2000)
+        )
+        deleted = list(LaptopTombstone.objects.filter(deleted_at__gte=since).values_list('laptop_id', 'deleted_at'))
+        with self._lock:
+            for laptop_id, price, updated_at, *values in changed:
+                self._put(laptop_id, price, dict(zip(SEARCH_FIELDS, values)))
+            for laptop_id, _ in deleted:
+                self._forget(laptop_id)
+            self._loaded_until = max([since, *(row[2] for row in changed), *(row[1] for row in deleted)])
+
+    def _compact(self):
+        documents = [
+            (int(self._ids[row]), float(self._prices[row]), *self._row_vector(row))
+            for row in np.flatnonzero(self._alive)
+        ]
+        documents += [(laptop_id, *entry) for laptop_id, entry in self._delta.items()]
+        self._build(documents)
+
+    # --- файл пересборки ---
+
+    def save(self, path):
+        with self._lock:
+            if self._delta or not self._alive.all():
+                self._compact()
+            vocab = np.array(sorted(self._vocab, key=self._vocab.get), dtype=str)
+            tmp_path = f'{path}.tmp.npz'
+            np.savez(
+                tmp_path, vocab=vocab, df=np.asarray(self._df, dtype=np.int32), documents=self._documents,
+                ids=self._ids, prices=self._prices, doc_ptr=self._doc_ptr,
+                doc_terms=self._doc_terms, doc_weights=self._doc_weights,
+                built_at=self._loaded_until.isoformat(),
+            )
+            os.replace(tmp_path, path)  # Воркеры не увидят недописанный файл
+
+    def _load_file(self, path, mtime):
+        with np.load(path) as data:
+            self._vocab = {term: term_id for term_id, term in enumerate(data['vocab'].tolist())}
+            self._df = data['df'].tolist()
+            self._documents = int(data['documents'])
+            self._loaded_until = datetime.fromisoformat(str(data['built_at']))
+            doc_ptr = data['doc_ptr']
+            terms, weights = data['doc_terms'], data['doc_weights']
+            self._build([
+                (int(laptop_id), float(price), terms[doc_ptr[row]:doc_ptr[row + 1]], weights[doc_ptr[row]:doc_ptr[row + 1]])
+                for row, (laptop_id, price) in enumerate(zip(data['ids'], data['prices']))
+            ])
+        self._file_mtime = mtime
+        self._loaded = True
+
+    def _file_state(self):
+        path = settings.SIMILAR_INDEX_PATH
+        if not path:
+            return None, None
+        try:
+            return path, os.stat(path).st_mtime
+        except OSError:
+            return None, None
+
+    def _is_fresh(self):
+        return self._loaded and time.monotonic() - self._checked_at < settings.SIMILAR_RELOAD_SECONDS
+
+    def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        # Первую загрузку ждут, обновление делает один поток, остальные отвечают по прежнему индексу
+        if not self._refresh_lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            if self._is_fresh():
+                return
+            path, mtime = self._file_state()
+            if path and mtime != self._file_mtime:
+                fresh = SimilarityIndex()
+                fresh._load_file(path, mtime)
+                # Файл старше правок, сделанных после его сборки, — в том числе своих
+                fresh._catch_up()
+                self._adopt(fresh)
+            elif not self._loaded:
+                self.rebuild()
+                self._catch_up()  # Сигналы во время сборки приходили в прежний, пустой индекс
+            else:
+                self._catch_up()
+            self._checked_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    # --- инкрементальные изменения ---
+
+    def _forget(self, laptop_id):
+        entry = self._delta.pop(laptop_id, None)
+        if entry is not None:
+            term_ids = entry[1]
+        else:
+            row = self._row_of.get(laptop_id)
+            if row is None or not self._alive[row]:
+                return
+            self._alive[row] = False
+            term_ids = self._row_vector(row)[0]
+        for term_id in term_ids.tolist():
+            self._df[term_id] -= 1
+        self._documents -= 1
+        self._delta_arrays = None
+
+    def add(self, laptop):
+        with self._lock:
+            # До первой загрузки индексировать нечего — строка попадёт в индекс при загрузке
+            if self._loaded:
+                self._put(laptop.pk, laptop.price, {field: getattr(laptop, field) for field in SEARCH_FIELDS})
+
+    def _put(self, laptop_id, price, fields):
+        self._forget(laptop_id)
+        counts = self._term_ids(fields)
+        for term_id in counts:
+            self._df[term_id] += 1
+        self._documents += 1
+        self._delta[laptop_id] = (self._log_price(price), *self._weigh(counts))
+        self._delta_arrays = None
+        if len(self._delta) > self.FOLD_SIZE:
+            self._compact()
+
+    def remove(self, laptop_id):
+        with self._lock:
+            if self._loaded:
+                self._forget(laptop_id)
+
+    def size(self):
+        with self._lock:
+            return int(self._alive.sum()) + len(self._delta)
+
+    def clear(self):
+        with self._lock:
+            self._loaded = False
+            self._file_mtime = None
+            self._loaded_until = None
+            self._checked_at = 0.0
+            self._reset()
+
+    # --- запросы ---
+
+    def _row_vector(self, row):
+        start, end = self._doc_ptr[row], self._doc_ptr[row + 1]
+        return self._doc_terms[start:end], self._doc_weights[start:end]
+
+    def _delta_state(self):
+        if self._delta_arrays is None:
+            ids = list(self._delta)
+            entries = [self._delta[laptop_id] for laptop_id in ids]
+            lengths = [len(entry[1]) for entry in entries]
+            self._delta_arrays = (
+                np.array(ids, dtype=np.int64),
+                np.array([entry[0] for entry in entries], dtype=np.float32),
+                np.repeat(np.arange(len(ids), dtype=np.int32), lengths),
+                np.concatenate([entry[1] for entry in entries]) if entries else EMPTY_INT,
+                np.concatenate([entry[2] for entry in entries]) if entries else EMPTY_FLOAT,
+            )
+        return self._delta_arrays
+
+    def _base_scores(self, query_terms, query_weights):
+        known = query_terms < len(self._term_ptr) - 1
+        query_terms, query_weights = query_terms[known], query_weights[known]
+        starts, ends = self._term_ptr[query_terms], self._term_ptr[query_terms + 1]
+        if not len(query_terms) or not (ends - starts).any():
+            return np.zeros(len(self._ids), dtype=np.float64)
+        positions = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        weights = self._term_weights[positions] * np.repeat(query_weights, ends - starts)
+        scores = np.bincount(self._term_rows[positions], weights=weights, minlength=len(self._ids))
+        scores[~self._alive] = 0
+        return scores
+
+    def _delta_scores(self, ids, rows, terms, weights, query_terms, query_weights):
+        order = np.argsort(query_terms)
+        sorted_terms = query_terms[order]
+        matched = np.isin(terms, sorted_terms)
+        query_positions = np.searchsorted(sorted_terms, terms[matched])
+        products = weights[matched] * query_weights[order][query_positions]
+        return np.bincount(rows[matched], weights=products, minlength=len(ids))
+
+    def _query(self, exclude_id, log_price, query_terms, query_weights, limit):
+        delta_ids, delta_prices, delta_rows, delta_terms, delta_weights = self._delta_state()
+        ids = np.concatenate((self._ids, delta_ids))
+        prices = np.concatenate((self._prices, delta_prices))
+        text = np.concatenate((
+            self._base_scores(query_terms, query_weights),
+            self._delta_scores(delta_ids, delta_rows, delta_terms, delta_weights, query_terms, query_weights),
+        ))
+        text[ids == exclude_id] = 0
+
+        # Только объявления с общими словами; цена уточняет порядок среди них
+        candidates = np.flatnonzero(text > 0)
+        if not len(candidates):
+            return []
+        closeness = 1 / (1 + np.abs(prices[candidates] - log_price) / self._price_scale)
+        scores = (1 - self.PRICE_WEIGHT) * text[candidates] + self.PRICE_WEIGHT * closeness
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.lexsort((-ids[candidates][top], -scores[top]))]
+        return [(int(ids[candidates][i]), float(scores[i])) for i in top]
+
+    def similar(self, laptop_id, limit=6):
+        """
+        [(laptop_id, score)] по убыванию сходства; None, если ноутбука нет в индексе.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if laptop_id in self._delta:
+                log_price, terms, weights = self._delta[laptop_id]
+            else:
+                row = self._row_of.get(laptop_id)
+                if row is None or not self._alive[row]:
+                    return None
+                log_price = float(self._prices[row])
+                terms, weights = self._row_vector(row)
+            return self._query(laptop_id, log_price, terms, weights, limit)
+
+    def similar_to(self, laptop, limit=6):
+        """
+        То же для ноутбука, которого ещё нет в индексе этого процесса (сохранён другим воркером).
+        """
+        self._ensure_loaded()
+        with self._lock:
+            fields = {field: getattr(laptop, field) for field in SEARCH_FIELDS}
+            known = {}
+            for field, weight in InMemorySearchIndex.FIELD_WEIGHTS.items():
+                for token in tokenize(fields.get(field)):
+                    if token in self._vocab:
+                        known[self._vocab[token]] = known.get(self._vocab[token], 0.0) + weight
+            terms, weights = self._weigh(known)
+            return self._query(laptop.pk, self._log_price(laptop.price), terms, weights, limit)
+
+
+similar_index = SimilarityIndex()
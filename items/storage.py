@@ -0,0 +1,89 @@
+import hashlib
+import os
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils.module_loading import import_string
+
+from backend.images import build_variants
+
+from .models import StoredImage
+from .utils import upload_image_to_imgur
+
+
+class ImgurStorage:
+    name = "imgur"
+
+    def save(self, content, filename, digest):
+        return upload_image_to_imgur((filename, content))
+
+
+class LocalMediaStorage:
+    """
+    Хранит файлы в MEDIA_ROOT/images/ под именем = хэш содержимого.
+    """
+    name = "local"
+
+    def save(self, content, filename, digest):
+        extension = os.path.splitext(filename or "")[1].lower()[:10]
+        path = f"images/{digest[:2]}/{digest}{extension}"
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(content))
+        return urljoin(settings.SERVICE_URL, default_storage.url(path))
+
+
+def read_content(image):
+    if isinstance(image, bytes):
+        return image
+    if hasattr(image, "chunks"):
+        return b"".join(image.chunks())
+    return image.read()
+
+
+class ContentAddressedImageStore:
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = import_string(settings.IMAGE_STORAGE_BACKEND)()
+        return self._backend
+
+    @staticmethod
+    def digest(content):
+        return hashlib.sha256(content).hexdigest()
+
+    def lookup(self, content):
+        return StoredImage.objects.filter(sha256=self.digest(content)).first()
+
+    def _save_content(self, content, filename):
+        return self.backend.save(content, filename, self.digest(content))
+
+    def save(self, image, filename=None):
+        """
+        Возвращает StoredImage с URL оригинала и вариантов; при совпадении хэша загрузка пропускается.
+        """
+        content = read_content(image)
+        filename = filename or getattr(image, "name", "")
+        digest = self.digest(content)
+
+        stored = StoredImage.objects.filter(sha256=digest).first()
+        if stored:
+            return stored
+
+        url = self.backend.save(content, filename, digest)
+        variants = build_variants(content, self._save_content)
+        try:
+            with transaction.atomic():
+                stored = StoredImage.objects.create(
+                    sha256=digest, url=url, backend=self.backend.name, size=len(content), variants=variants
+                )
+        except IntegrityError:  # Ту же картинку параллельно загрузил другой воркер
+            stored = StoredImage.objects.get(sha256=digest)
+        return stored
+
+image_store = ContentAddressedImageStore()
@@ -0,0 +1,106 @@
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from backend.response_cache import bump_version
+
+from .models import Laptop
+from .storage import image_store
+
+logger = logging.getLogger(__name__)
+
+
+def process_image_upload(laptop_id, content, filename):
+    try:
+        stored = image_store.save(content, filename)
+    except Exception:
+        logger.exception("Image upload for laptop %s failed", laptop_id)
+        stored = None
+
+    laptop = Laptop.objects.filter(pk=laptop_id).first()
+    if laptop is None:  # Объявление удалили, пока картинка грузилась
+        return
+    if stored:
+        laptop.image_url = stored.url
+        laptop.image_variants = stored.variants
+        laptop.image_status = Laptop.IMAGE_DONE
+    else:
+        laptop.image_status = Laptop.IMAGE_FAILED
+    # auto_now срабатывает только для полей из update_fields; по updated_at работают ETag и лента изменений
+    laptop.save(update_fields=["image_url", "image_variants", "image_status", "updated_at"])
+
+
+def mark_failed(laptop_id):
+    """
+    IMAGE_FAILED без загрузки объекта: объявления к этому моменту может уже не быть.
+    """
+    # update() не шлёт сигналов и не применяет auto_now — кэш ответов и лента изменений вручную
+    if Laptop.objects.filter(pk=laptop_id).update(image_status=Laptop.IMAGE_FAILED, updated_at=timezone.now()):
+        bump_version(Laptop)
+
+
+class ImageUploadQueue:
+    """
+    Ограниченная очередь загрузок картинок с пулом фоновых потоков.
+    Потоки стартуют лениво и заново после fork (gunicorn --preload).
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=settings.IMAGE_UPLOAD_QUEUE_SIZE)
+            for i in range(settings.IMAGE_UPLOAD_WORKERS):
+                threading.Thread(target=self._worker, name=f"image-upload-{i}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                process_image_upload(*job)
+            except Exception:
+                # Ошибка БД и т.п. не должна убивать поток: иначе очередь со временем встанет
+                logger.exception("Image upload job for laptop %s crashed", job[0])
+                try:
+                    mark_failed(job[0])
+                except Exception:
+                    logger.exception("Could not mark laptop %s as failed", job[0])
+            finally:
+                close_old_connections()
+                self._queue.task_done()
+
+    def is_full(self):
+        if not settings.IMAGE_UPLOAD_ASYNC:
+            return False
+        self._ensure_started()
+        return self._queue.full()
+
+    def submit(self, laptop_id, content, filename):
+        if not settings.IMAGE_UPLOAD_ASYNC:
+            process_image_upload(laptop_id, content, filename)
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((laptop_id, content, filename))
+        except queue.Full:
+            mark_failed(laptop_id)
+
+    def join(self):
+        if self._queue is not None:
+            self._queue.join()
+
+
+upload_queue = ImageUploadQueue()
@@ -1 +1,1263 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, router
+from django.http import HttpResponse, QueryDict
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.db_router import ReplicaRoutingMiddleware
+from backend import images
+from backend.events import broker
+from backend.images import VARIANT_SIZES
+from backend.metrics import registry
+from backend.renderers import FastJSONRenderer
+from backend.response_cache import cached_response
+from backend.throttling import LoadSheddingMiddleware
+from .bulk import LaptopBulkService
+from .changes import encode_token
+from .dedup import duplicate_index, signature, similarity
+from .facets import facets, rebuild as facets_rebuild
+from .filters import LaptopFilter
+from .management.commands.benchmark_endpoints import percentile
+from .management.commands.profile_startup import import_costs
+from .models import Laptop, LaptopFacet, LaptopTombstone
+from .search import memory_index
+from .similar import SimilarityIndex, similar_index
+from .serializers import LaptopRowSerializer, LaptopSerializer
+from .storage import ContentAddressedImageStore, LocalMediaStorage
+from .tasks import ImageUploadQueue, mark_failed, process_image_upload
+from .transfer import FORMATS, LaptopImporter, export_lines
+from .views import LaptopChangesView
+
+
+User = get_user_model()
+
+
+def without_insert_returning():
+    # Как на MySQL: bulk_create не возвращает id новых строк
+    return mock.patch.object(
+        type(connection.features), 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock, return_value=False,
+    )
+
+
+class StubImageHostHandler(BaseHTTPRequestHandler):
+    status_codes = []  # коды ответов по порядку, дальше — 200
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        code = self.status_codes.pop(0) if self.status_codes else 200
+        body = json.dumps({'data': {'link': f'http://stub.local/{self.server.uploads}.png'}}).encode()
+        self.server.uploads += 1
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubImageHost:
+    def __enter__(self):
+        self.server = HTTPServer(('127.0.0.1', 0), StubImageHostHandler)
+        self.server.uploads = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/3/image'
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LaptopTestMixin:
+    def setUp(self):
+        cache.clear()
+        caches['throttle'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='seller', email='seller@example.com', password='pass12345')
+
+    def make_laptop(self, **kwargs):
+        defaults = {
+            'title': 'ThinkPad',
+            'model': 'T480',
+            'price': '500.00',
+            'description': 'Good condition',
+            'owner': self.user,
+        }
+        defaults.update(kwargs)
+        return Laptop.objects.create(**defaults)
+
+
+class LaptopCursorPaginationTests(LaptopTestMixin, TestCase):
+    def test_plain_list_without_cursor_params(self):
+        self.make_laptop()
+        response = self.client.get('/items/items/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+
+    def test_cursor_pages_cover_all_rows_once(self):
+        ids = {self.make_laptop(title=f'Laptop {i}').id for i in range(7)}
+
+        response = self.client.get('/items/items/', {'page_size': 3})
+        seen = [row['id'] for row in response.data['results']]
+        self.assertIsNone(response.data['previous'])
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [row['id'] for row in response.data['results']]
+
+        self.assertEqual(sorted(seen, reverse=True), seen)
+        self.assertEqual(set(seen), ids)
+        self.assertEqual(len(seen), len(ids))
+
+
+class LaptopFilterTests(LaptopTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass12345')
+        self.cheap = self.make_laptop(title='Acer Swift', model='SF314', price='300.00')
+        self.mid = self.make_laptop(title='Asus Zenbook', model='UX425', price='700.00', owner=self.other)
+        self.pricey = self.make_laptop(title='Apple MacBook', model='A2338', price='1500.00')
+
+    def ids(self, params):
+        response = self.client.get('/items/items/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data]
+
+    def test_owner_filter(self):
+        self.assertEqual(set(self.ids({'owner': self.other.id})), {self.mid.id})
+
+    def test_price_range_and_ordering(self):
+        self.assertEqual(self.ids({'min_price': 500, 'ordering': '-price'}), [self.pricey.id, self.mid.id])
+        self.assertEqual(self.ids({'max_price': 800, 'ordering': 'price'}), [self.cheap.id, self.mid.id])
+
+    def test_model_and_title_prefix(self):
+        self.assertEqual(self.ids({'model': 'UX425'}), [self.mid.id])
+        self.assertEqual(set(self.ids({'title': 'as'})), {self.mid.id})
+
+    def test_invalid_params_return_400(self):
+        self.assertEqual(self.client.get('/items/items/', {'min_price': 'abc'}).status_code, 400)
+        for value in ('NaN', 'Infinity', '-inf', 'sNaN'):
+            self.assertEqual(self.client.get('/items/items/', {'max_price': value}).status_code, 400, value)
+        self.assertEqual(self.client.get('/items/items/', {'ordering': 'title'}).status_code, 400)
+        # '²' — isdigit, но не isdecimal: int() на нём падает
+        for value in ('abc', '²'):
+            self.assertEqual(self.client.get('/items/items/', {'owner': value}).status_code, 400, value)
+
+    def test_title_prefix_rejects_ordering(self):
+        response = self.client.get('/items/items/', {'title': 'as', 'ordering': 'price'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filters_use_indexes(self):
+        # Поддерживаемые сочетания фильтра и сортировки; min_price + newest — сортировка диапазона, не в наборе
+        combinations = [
+            ({'owner': self.user.id}, (None, 'price', '-price', 'newest')),
+            ({'model': 'UX425'}, (None, 'price', '-price', 'newest')),
+            ({'min_price': 500}, (None, 'price', '-price')),
+            ({'max_price': 800}, (None, 'price', '-price')),
+            ({'title': 'as'}, (None,)),
+        ]
+        for params, orderings in combinations:
+            for ordering in orderings:
+                query = QueryDict(mutable=True)
+                query.update({name: str(value) for name, value in params.items()})
+                if ordering:
+                    query['ordering'] = ordering
+                with self.subTest(query=query.urlencode()):
+                    queryset = LaptopFilter.filter_queryset(Laptop.objects.all(), query)
+                    if ordering:
+                        queryset = queryset.order_by(*LaptopFilter.get_ordering(query))
+                    plan = queryset.explain().upper()
+                    self.assertIn('INDEX', plan, plan)
+                    self.assertNotIn('SCAN ITEMS_LAPTOP', plan, plan)
+                    self.assertNotIn('TEMP B-TREE', plan, plan)
+
+
+class LaptopSearchTests(LaptopTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        memory_index.clear()
+        self.gaming = self.make_laptop(title='Gaming beast', model='ROG Strix', description='RTX graphics, great for gaming')
+        self.office = self.make_laptop(title='Office laptop', model='Latitude', description='Quiet and light')
+
+    def search(self, query, **params):
+        return self.client.get('/items/search/', {'q': query, **params})
+
+    def test_ranked_results_with_highlight(self):
+        response = self.search('gaming')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.gaming.id])
+        self.assertIn('<mark>Gaming</mark>', response.data['results'][0]['highlight']['title'])
+
+    def test_index_follows_save_and_delete(self):
+        self.search('quiet')
+        self.office.title = 'Gaming office'
+        self.office.save()
+        ids = [row['id'] for row in self.search('gaming').data['results']]
+        self.assertEqual(ids, [self.gaming.id, self.office.id])
+
+        self.gaming.delete()
+        self.assertEqual([row['id'] for row in self.search('gaming').data['results']], [self.office.id])
+
+    def test_pagination_and_missing_query(self):
+        for i in range(3):
+            self.make_laptop(title=f'Gaming {i}')
+        response = self.search('gaming', page_size=2)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(self.client.get('/items/search/').status_code, 400)
+
+
+@override_settings(IMAGE_UPLOAD_ASYNC=False, IMAGE_UPLOAD_BACKOFF=0, IMAGE_PROCESS_WORKERS=0)
+class LaptopImageUploadTests(LaptopTestMixin, TestCase):
+    def post_with_image(self):
+        self.client.force_authenticate(self.user)
+        image = SimpleUploadedFile('photo.png', b'fake-png-bytes', content_type='image/png')
+        return self.client.post('/items/items/', {
+            'title': 'Dell', 'model': 'XPS 13', 'price': '900.00', 'description': 'Like new', 'image': image,
+        }, format='multipart')
+
+    def test_upload_sets_status_and_url(self):
+        with StubImageHost() as host, self.settings(IMAGE_UPLOAD_URL=host.url):
+            response = self.post_with_image()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['image_status'], Laptop.IMAGE_DONE)
+        self.assertEqual(response.data['image_url'], 'http://stub.local/0.png')
+
+    def test_upload_retries_server_errors(self):
+        StubImageHostHandler.status_codes = [503]
+        with StubImageHost() as host, self.settings(IMAGE_UPLOAD_URL=host.url):
+            response = self.post_with_image()
+        self.assertEqual(response.data['image_status'], Laptop.IMAGE_DONE)
+
+    def test_finished_upload_changes_list_etag(self):
+        laptop = self.make_laptop(image_status=Laptop.IMAGE_PENDING)
+        etag = self.client.get('/items/items/')['ETag']
+        stored = mock.Mock(url='http://stub.local/0.png', variants={})
+        with mock.patch('items.tasks.image_store.save', return_value=stored):
+            process_image_upload(laptop.pk, b'fake-png-bytes', 'photo.png')
+        response = self.client.get('/items/items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['image_status'], Laptop.IMAGE_DONE)
+
+    def test_duplicate_image_skips_upload(self):
+        with StubImageHost() as host, self.settings(IMAGE_UPLOAD_URL=host.url):
+            first = self.post_with_image()
+            second = self.post_with_image()
+            uploads = host.server.uploads
+        self.assertEqual(uploads, 1)
+        self.assertEqual(second.data['image_url'], first.data['image_url'])
+        self.assertEqual(second.data['image_status'], Laptop.IMAGE_DONE)
+
+    def test_local_media_backend(self):
+        with tempfile.TemporaryDirectory() as media_root, self.settings(
+            MEDIA_ROOT=media_root, SERVICE_URL='https://example.com'
+        ):
+            store = ContentAddressedImageStore(LocalMediaStorage())
+            url = store.save(b'image-bytes', 'photo.PNG').url
+            digest = store.digest(b'image-bytes')
+            self.assertEqual(url, f'https://example.com/media/images/{digest[:2]}/{digest}.png')
+            self.assertTrue(os.path.exists(os.path.join(media_root, 'images', digest[:2], f'{digest}.png')))
+            self.assertEqual(store.save(b'image-bytes', 'other.png').url, url)
+
+    def test_upload_builds_webp_variants(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(buffer, 'PNG')
+        with StubImageHost() as host, self.settings(IMAGE_UPLOAD_URL=host.url):
+            self.client.force_authenticate(self.user)
+            response = self.client.post('/items/items/', {
+                'title': 'Dell', 'model': 'XPS 13', 'price': '900.00', 'description': 'Like new',
+                'image': SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png'),
+            }, format='multipart')
+            uploads = host.server.uploads
+        self.assertEqual(set(response.data['image_variants']), set(VARIANT_SIZES))
+        self.assertEqual(uploads, 1 + len(VARIANT_SIZES))
+
+    def test_process_pool_created_once_across_threads(self):
+        barrier, executors = threading.Barrier(8), []
+
+        def first_upload():
+            barrier.wait()
+            executors.append(images.get_executor())
+
+        def slow_pool(**kwargs):
+            threading.Event().wait(0.05)  # Пул запускается не мгновенно: окно для гонки
+            return object()
+
+        with self.settings(IMAGE_PROCESS_WORKERS=2), \
+                mock.patch.object(images, '_executor', None), mock.patch.object(images, '_executor_pid', None), \
+                mock.patch.object(images, 'ProcessPoolExecutor', side_effect=slow_pool) as pool:
+            threads = [threading.Thread(target=first_upload) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(pool.call_count, 1)
+        self.assertEqual(len({id(executor) for executor in executors}), 1)
+
+    def test_failed_upload_keeps_listing(self):
+        StubImageHostHandler.status_codes = [400]
+        with StubImageHost() as host, self.settings(IMAGE_UPLOAD_URL=host.url):
+            response = self.post_with_image()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['image_status'], Laptop.IMAGE_FAILED)
+        self.assertTrue(Laptop.objects.filter(pk=response.data['id']).exists())
+
+    @override_settings(IMAGE_UPLOAD_ASYNC=True, IMAGE_UPLOAD_WORKERS=1)
+    def test_worker_survives_crashing_job(self):
+        queue = ImageUploadQueue()
+        with mock.patch('items.tasks.process_image_upload', side_effect=[RuntimeError('db is down'), None]) as process, \
+                mock.patch('items.tasks.mark_failed') as mark_failed:
+            queue.submit(1, b'first', 'a.png')
+            queue.submit(2, b'second', 'b.png')
+            queue.join()
+        self.assertEqual(process.call_count, 2)
+        mark_failed.assert_called_once_with(1)
+
+    def test_mark_failed_tolerates_deleted_listing(self):
+        laptop = self.make_laptop()
+        mark_failed(laptop.pk)
+        laptop.refresh_from_db()
+        self.assertEqual(laptop.image_status, Laptop.IMAGE_FAILED)
+        laptop.delete()
+        mark_failed(laptop.pk)
+
+
+class LaptopResponseCacheTests(LaptopTestMixin, TestCase):
+    def test_list_is_served_from_cache_until_laptop_changes(self):
+        laptop = self.make_laptop()
+        self.assertEqual(self.client.get('/items/items/')['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/items/items/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        laptop.title = 'Renamed'
+        laptop.save()
+        response = self.client.get('/items/items/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data[0]['title'], 'Renamed')
+
+    def test_user_by_id_invalidated_on_user_save(self):
+        self.client.get(f'/auth/users/{self.user.pk}/')
+        self.user.username = 'renamed'
+        self.user.save()
+        response = self.client.get(f'/auth/users/{self.user.pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['username'], 'renamed')
+
+
+class LaptopConditionalGetTests(LaptopTestMixin, TestCase):
+    def test_list_etag_and_304(self):
+        self.make_laptop()
+        response = self.client.get('/items/items/')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get('/items/items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        cache.clear()
+        response = self.client.get('/items/items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.make_laptop(title='New one')
+        response = self.client.get('/items/items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_if_modified_since(self):
+        laptop = self.make_laptop()
+        self.client.force_authenticate(self.user)
+        response = self.client.get(f'/items/items/{laptop.pk}/')
+        response = self.client.get(f'/items/items/{laptop.pk}/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_user_endpoint_has_etag(self):
+        response = self.client.get(f'/auth/users/{self.user.pk}/')
+        response = self.client.get(f'/auth/users/{self.user.pk}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(CHANGES_COMMIT_LAG_SECONDS=0)
+class LaptopChangesTests(LaptopTestMixin, TestCase):
+    def test_feed_returns_upserts_then_deltas_and_tombstones(self):
+        kept = self.make_laptop(title='Kept')
+        removed = self.make_laptop(title='Removed')
+
+        response = self.client.get('/items/changes/')
+        self.assertEqual({row['id'] for row in response.data['upserts']}, {kept.id, removed.id})
+        token = response.data['next']
+
+        response = self.client.get('/items/changes/', {'since': token})
+        self.assertEqual(response.data['upserts'], [])
+        self.assertEqual(response.data['deleted'], [])
+
+        kept.title = 'Kept and edited'
+        kept.save()
+        removed_id = removed.id
+        removed.delete()
+        response = self.client.get('/items/changes/', {'since': token})
+        self.assertEqual([row['title'] for row in response.data['upserts']], ['Kept and edited'])
+        self.assertEqual(response.data['deleted'], [removed_id])
+        self.assertFalse(response.data['has_more'])
+
+    def test_invalid_token(self):
+        self.assertEqual(self.client.get('/items/changes/', {'since': '!!'}).status_code, 400)
+        self.assertEqual(self.client.get('/items/changes/', {'since': encode_token(timezone.now(), 7, 1)}).status_code, 400)
+
+    def test_pages_through_more_events_than_limit_with_one_timestamp(self):
+        laptops = [self.make_laptop(title=f'Laptop {i}') for i in range(5)]
+        moment = timezone.now()
+        Laptop.objects.update(updated_at=moment)
+        Laptop.objects.filter(pk=laptops[0].pk).delete()
+        LaptopTombstone.objects.update(deleted_at=moment)
+
+        seen, deleted, token, rounds = [], [], encode_token(moment - timedelta(seconds=1)), 0
+        with mock.patch.object(LaptopChangesView, 'limit', 2):
+            while True:
+                rounds += 1
+                self.assertLess(rounds, 10)
+                data = self.client.get('/items/changes/', {'since': token}).data
+                seen += [row['id'] for row in data['upserts']]
+                deleted += data['deleted']
+                token = data['next']
+                if not data['has_more']:
+                    break
+        self.assertEqual(seen, [laptop.pk for laptop in laptops[1:]])
+        self.assertEqual(deleted, [laptops[0].pk])
+
+    @override_settings(CHANGES_COMMIT_LAG_SECONDS=10)
+    def test_recent_events_wait_for_commit_lag(self):
+        old = self.make_laptop(title='Old')
+        Laptop.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(seconds=30))
+        fresh = self.make_laptop(title='Fresh')
+        data = self.client.get('/items/changes/').data
+        # Свежая строка могла бы оказаться раньше ещё не закоммиченной — токен её не перескакивает
+        self.assertEqual([row['id'] for row in data['upserts']], [old.id])
+
+        later = timezone.now() + timedelta(seconds=11)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            data = self.client.get('/items/changes/', {'since': data['next']}).data
+        self.assertEqual([row['id'] for row in data['upserts']], [fresh.id])
+
+    def test_expired_token_and_pruning(self):
+        laptop = self.make_laptop()
+        laptop.delete()
+        old = timezone.now() - timedelta(days=settings.CHANGES_RETENTION_DAYS + 1)
+        LaptopTombstone.objects.update(deleted_at=old)
+
+        self.assertEqual(self.client.get('/items/changes/', {'since': encode_token(old)}).status_code, 410)
+        call_command('prune_tombstones', stdout=io.StringIO())
+        self.assertFalse(LaptopTombstone.objects.exists())
+
+
+class LaptopRowSerializerTests(LaptopTestMixin, TestCase):
+    def test_matches_model_serializer_output(self):
+        self.make_laptop(price='1234.50', image_url=None)
+        self.make_laptop(title='Заголовок\u2028', price='0.99', image_url='https://example.com/a.png',
+                         image_variants={'thumb': 'https://example.com/t.webp'})
+        queryset = Laptop.objects.order_by('id')
+
+        expected = LaptopSerializer(queryset, many=True).data
+        rows = LaptopRowSerializer()
+        actual = rows.serialize(rows.values(queryset))
+        self.assertEqual(actual, expected)
+        self.assertEqual(list(actual[0]), list(expected[0]))
+        self.assertEqual(FastJSONRenderer().render(actual), JSONRenderer().render(expected))
+
+
+class LaptopBulkTests(LaptopTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass12345')
+
+    def bulk(self, payload):
+        return self.client.post('/items/items/bulk/', payload, format='json')
+
+    def test_create_update_delete_with_per_item_results(self):
+        mine = self.make_laptop(title='Mine')
+        doomed = self.make_laptop(title='Doomed')
+        foreign = self.make_laptop(title='Foreign', owner=self.other)
+
+        response = self.bulk({
+            'create': [
+                {'title': 'New', 'model': 'X1', 'price': '999.00', 'description': 'Fresh'},
+                {'title': 'Broken', 'model': 'X1', 'price': 'abc', 'description': 'Bad price'},
+            ],
+            'update': [{'id': mine.id, 'price': '450.00'}, {'id': foreign.id, 'price': '1.00'}, {'id': 999999}],
+            'delete': [doomed.id, foreign.id],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['create']], [201, 400])
+        self.assertEqual(response.data['create'][0]['data']['owner'], self.user.id)
+        self.assertEqual([r['status'] for r in response.data['update']], [200, 403, 404])
+        self.assertEqual(response.data['update'][0]['data']['price'], '450.00')
+        self.assertEqual([r['status'] for r in response.data['delete']], [204, 403])
+
+        mine.refresh_from_db()
+        foreign.refresh_from_db()
+        self.assertEqual(str(mine.price), '450.00')
+        self.assertEqual(str(foreign.price), '500.00')
+        self.assertFalse(Laptop.objects.filter(pk=doomed.pk).exists())
+        self.assertTrue(Laptop.objects.filter(title='New', owner=self.user).exists())
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def payload(count):
+            laptops = [self.make_laptop(title=f'L{i}') for i in range(count)]
+            return {
+                'create': [{'title': f'N{i}', 'model': 'M', 'price': '10.00', 'description': 'd'} for i in range(count)],
+                'update': [{'id': laptop.id, 'title': 'Updated'} for laptop in laptops],
+                'delete': [self.make_laptop(title=f'D{i}').id for i in range(count)],
+            }
+
+        self.bulk(payload(1))  # Ячейку сводки фасетов создаёт первая пачка
+        small, large = payload(2), payload(40)
+        with CaptureQueriesContext(connection) as small_queries:
+            self.bulk(small)
+        with CaptureQueriesContext(connection) as large_queries:
+            self.bulk(large)
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    def test_create_without_insert_returning_is_one_insert_with_ids(self):
+        self.bulk({'create': [{'title': 'N', 'model': 'M', 'price': '10.00', 'description': 'd'}]})  # Ячейка фасетов
+
+        def create(count):
+            # Разные заголовки у пачек: иначе вторая нашла бы повторы первой и запросила их
+            items = [{'title': f'Batch{count} item{i}', 'model': 'M', 'price': '10.00', 'description': 'd'} for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.bulk({'create': items})
+            return response, queries
+
+        with without_insert_returning():
+            _, small = create(2)
+            response, large = create(20)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(sum(query['sql'].startswith('INSERT INTO "items_laptop"') for query in large), 1)
+        created = {row['data']['id']: row['data']['title'] for row in response.data['create']}
+        self.assertEqual(created, dict(Laptop.objects.filter(pk__in=created).values_list('id', 'title')))
+        self.assertEqual(len(created), 20)
+
+    def test_non_integer_ids_rejected_per_item(self):
+        mine = self.make_laptop()
+        response = self.bulk({
+            'update': [{'id': [1]}, {'id': {'a': 1}}, {'id': True}, {'id': mine.id, 'title': 'Kept'}],
+            'delete': [{'id': 1}, '1', mine.id],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['update']], [400, 400, 400, 200])
+        self.assertEqual([r['status'] for r in response.data['delete']], [400, 400, 204])
+
+    def test_too_many_items_rejected(self):
+        response = self.bulk({'delete': list(range(LaptopBulkService.MAX_ITEMS + 1))})
+        self.assertEqual(response.status_code, 400)
+
+
+class LaptopTransferTests(LaptopTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        self.client.force_authenticate(self.admin)
+
+    def export(self, fmt):
+        response = self.client.get('/items/export/', {'fmt': fmt})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_round_trip_ndjson_and_csv(self):
+        for i in range(5):
+            self.make_laptop(title=f'Laptop {i}', description='Line one\nline "two"')
+        originals = list(Laptop.objects.order_by('id').values('title', 'price', 'description', 'owner_id'))
+
+        for fmt in FORMATS:
+            dump = self.export(fmt)
+            Laptop.objects.all().delete()
+            upload = SimpleUploadedFile(f'laptops.{fmt}', dump.encode())
+            response = self.client.post('/items/import/', {'file': upload}, format='multipart')
+            self.assertEqual(response.data['imported'], 5, response.data)
+            restored = list(Laptop.objects.order_by('id').values('title', 'price', 'description', 'owner_id'))
+            self.assertEqual(restored, originals)
+
+    def test_import_resumes_and_skips_existing(self):
+        laptops = [self.make_laptop(title=f'Laptop {i}') for i in range(4)]
+        dump = ''.join(export_lines('ndjson', chunk_size=3))
+        Laptop.objects.filter(pk__in=[laptop.pk for laptop in laptops[2:]]).delete()
+
+        checkpoints = []
+        importer = LaptopImporter(batch_size=1, on_batch=checkpoints.append)
+        summary = importer.run(io.StringIO(dump), 'ndjson', after=1)
+        self.assertEqual((summary['imported'], summary['skipped']), (2, 1))
+        self.assertEqual(checkpoints, [2, 3, 4])
+
+    def test_invalid_rows_reported_per_line(self):
+        dump = '{"title": "Ok", "model": "M", "price": "1.00", "description": "d", "owner": %d}\n' % self.user.pk
+        dump += '{"title": "Bad", "model": "M", "price": "x", "description": "d", "owner": %d}\n' % self.user.pk
+        dump += '{"title": "Nobody", "model": "M", "price": "1.00", "description": "d", "owner": 999999}\n'
+        summary = LaptopImporter().run(io.StringIO(dump), 'ndjson')
+        self.assertEqual(summary['imported'], 1)
+        self.assertEqual([error['line'] for error in summary['errors']], [2, 3])
+
+    def test_repeated_id_in_batch_reported_per_line(self):
+        row = '{"id": 500, "title": "%s", "model": "M", "price": "1.00", "description": "d", "owner": %d}\n'
+        dump = row % ('First copy', self.user.pk) + row % ('Second copy', self.user.pk)
+        summary = LaptopImporter().run(io.StringIO(dump), 'ndjson')
+        self.assertEqual(summary['imported'], 1)
+        self.assertEqual([error['line'] for error in summary['errors']], [2])
+        self.assertEqual(Laptop.objects.get(pk=500).title, 'First copy')
+
+    def test_non_ascii_digits_do_not_crash_import(self):
+        dump = '{"id": "²", "title": "Sup id", "model": "M", "price": "1.00", "description": "d", "owner": %d}\n' % self.user.pk
+        dump += '{"title": "Sup owner", "model": "M", "price": "1.00", "description": "d", "owner": "²"}\n'
+        summary = LaptopImporter().run(io.StringIO(dump), 'ndjson')
+        self.assertEqual(summary['imported'], 1)
+        self.assertEqual([error['line'] for error in summary['errors']], [2])
+
+        upload = SimpleUploadedFile('laptops.ndjson', dump.encode())
+        response = self.client.post('/items/import/', {'file': upload, 'after': '²'}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rows_without_id_reach_facets_and_indexes_without_insert_returning(self):
+        facets(QueryDict())  # Сводка собрана до импорта, дальше ведётся дельтами
+        dump = ''.join(
+            json.dumps({'title': f'Imported {i}', 'model': 'M', 'price': '10.00', 'description': 'd', 'owner': self.user.pk}) + '\n'
+            for i in range(3)
+        )
+        with without_insert_returning():
+            summary = LaptopImporter().run(io.StringIO(dump), 'ndjson')
+        self.assertEqual(summary['imported'], 3)
+        self.assertEqual(facets(QueryDict())['total'], 3)
+        self.assertEqual(facets_rebuild(), 0)
+        laptop = Laptop.objects.get(title='Imported 0')
+        self.assertIn(laptop.id, memory_index.search('imported')[0])
+
+    def test_export_requires_admin(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/items/export/').status_code, 403)
+
+
+class BenchmarkToolingTests(TestCase):
+    def test_generate_data(self):
+        call_command('generate_data', users=3, laptops=25, batch_size=10, stdout=io.StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='seller').count(), 3)
+        self.assertEqual(Laptop.objects.count(), 25)
+        self.assertTrue(all(50 <= laptop.price <= 10000 for laptop in Laptop.objects.all()))
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_import_costs_by_package(self):
+        log = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:      1500 |       1500 |     django.utils\n'
+            'import time:       500 |       2000 |   django\n'
+            'import time:      3000 |       3000 | numpy\n'
+        )
+        self.assertEqual(import_costs(log), [('numpy', 3.0), ('django', 2.0)])
+
+
+class PerformanceMetricsTests(LaptopTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    @override_settings(PERFORMANCE_LOG=True)
+    def test_server_timing_log_line_and_metrics(self):
+        self.make_laptop()
+        ops = User.objects.create_user(username='ops', email='ops@example.com', password='x', is_staff=True)
+        # /metrics тоже пишет строку в лог — оба запроса внутри assertLogs, чтобы она не шла в вывод тестов
+        with self.assertLogs('backend.performance', level='INFO') as logs:
+            response = self.client.get('/items/items/')
+            self.client.force_login(ops)
+            metrics = self.client.get('/metrics').content.decode()
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['view'], line['status']), ('laptop-list-create', 200))
+        self.assertGreater(line['db_queries'], 0)
+
+        self.assertIn('http_request_duration_seconds_count{view="laptop-list-create",method="GET"} 1', metrics)
+        self.assertIn('http_request_duration_seconds_bucket{view="laptop-list-create",method="GET",le="+Inf"} 1', metrics)
+        self.assertIn('response_cache_requests_total{result="miss"}', metrics)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_without_token_are_staff_only(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user(username='ops', email='ops@example.com', password='x', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(LaptopTestMixin, TestCase):
+    def route(self, method, status=200, **headers):
+        seen = {}
+
+        def view(request):
+            seen['read'] = router.db_for_read(Laptop)
+            seen['write'] = router.db_for_write(Laptop)
+            return HttpResponse(status=status)
+
+        request = getattr(RequestFactory(), method.lower())('/items/items/', **headers)
+        ReplicaRoutingMiddleware(view)(request)
+        return seen['read'], seen['write']
+
+    def test_reads_go_to_replica_only_inside_safe_requests(self):
+        self.assertEqual(self.route('GET'), ('replica1', 'default'))
+        self.assertEqual(self.route('POST', status=400), ('default', 'default'))
+        self.assertEqual(router.db_for_read(Laptop), 'default')
+
+    def test_client_sticks_to_primary_after_write(self):
+        token = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        self.route('POST', status=201, HTTP_AUTHORIZATION=token)
+        self.assertEqual(self.route('GET', HTTP_AUTHORIZATION=token), ('default', 'default'))
+        self.assertEqual(self.route('GET'), ('replica1', 'default'))
+
+        caches['throttle'].delete(f'db-pin:user:{self.user.pk}')
+        self.assertEqual(self.route('GET', HTTP_AUTHORIZATION=token), ('replica1', 'default'))
+
+    def test_anonymous_pin_uses_client_ip_behind_proxy(self):
+        proxy = {'REMOTE_ADDR': '10.0.0.1'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            self.route('POST', status=201, HTTP_X_FORWARDED_FOR='203.0.113.5', **proxy)
+            self.assertEqual(self.route('GET', HTTP_X_FORWARDED_FOR='203.0.113.5', **proxy), ('default', 'default'))
+            self.assertEqual(self.route('GET', HTTP_X_FORWARDED_FOR='198.51.100.7', **proxy), ('replica1', 'default'))
+
+    def test_response_cache_bypassed_when_pinned_and_short_for_replica_reads(self):
+        builds = []
+
+        def view(request):
+            return cached_response(request, [Laptop], lambda: builds.append(1) or Response({'ok': True}))
+
+        token = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            ReplicaRoutingMiddleware(view)(RequestFactory().get('/items/items/'))
+        self.assertEqual(cache_set.call_args.kwargs['timeout'], 10)
+
+        self.route('POST', status=201, HTTP_AUTHORIZATION=token)
+        ReplicaRoutingMiddleware(view)(RequestFactory().get('/items/items/', HTTP_AUTHORIZATION=token))
+        self.assertEqual(len(builds), 2)  # Закреплённый клиент не получает чужой HIT
+
+
+class LaptopExpandOwnerTests(LaptopTestMixin, TestCase):
+    def make_sellers(self, count):
+        for i in range(count):
+            seller = User.objects.create_user(username=f'exp{count}_{i}', email=f'exp{count}_{i}@example.com', password='x')
+            self.make_laptop(title=f'Expand {i}', owner=seller)
+
+    def test_list_embeds_sellers_with_a_single_query(self):
+        self.make_sellers(2)
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get('/items/items/', {'expand': 'owner', 'title': 'Expand'})
+        self.make_sellers(8)
+        cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/items/items/', {'expand': 'owner', 'title': 'Expand'})
+
+        self.assertEqual(len(small), 1)
+        self.assertEqual(len(large), 1)
+        owner = response.data[0]['owner']
+        self.assertEqual(set(owner), {'id', 'username', 'avatar', 'avatar_variants'})
+        self.assertTrue(owner['username'].startswith('exp2_'))
+
+    def test_detail_and_unknown_expand(self):
+        laptop = self.make_laptop()
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/items/items/{laptop.id}/', {'expand': 'owner'})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['owner']['username'], 'seller')
+        self.assertEqual(self.client.get('/items/items/', {'expand': 'price'}).status_code, 400)
+
+
+class ThrottlingTests(LaptopTestMixin, TestCase):
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login_ip': '3/min'}})
+    def test_login_is_limited_before_password_check(self):
+        payload = {'username': 'seller', 'password': 'wrong'}
+        statuses = [self.client.post('/auth/login/', payload).status_code for _ in range(3)]
+        self.assertEqual(statuses, [401, 401, 401])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/auth/login/', payload)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(len(queries), 0)
+
+        other_ip = self.client.post('/auth/login/', payload, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other_ip.status_code, 401)
+
+    @override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'listing_write_user': '2/min', 'listing_write_ip': '100/min'},
+    })
+    def test_listing_writes_limited_per_user_reads_are_not(self):
+        self.client.force_authenticate(self.user)
+        data = {'title': 'T', 'model': 'M', 'price': '10.00', 'description': 'd'}
+        statuses = [self.client.post('/items/items/', data).status_code for _ in range(3)]
+        self.assertEqual(statuses, [201, 201, 429])
+        self.assertEqual(self.client.get('/items/items/').status_code, 200)
+
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass12345')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.post('/items/items/', data).status_code, 201)
+
+
+    @override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login_ip': '100/min', 'login_username': '2/min'},
+    })
+    def test_login_is_limited_per_username_across_ips(self):
+        statuses = [
+            self.client.post('/auth/login/', {'username': 'Seller', 'password': 'wrong'}, REMOTE_ADDR=f'10.0.0.{i}').status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [401, 401, 429])
+        other = self.client.post('/auth/login/', {'username': 'someone', 'password': 'wrong'}, REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(other.status_code, 401)
+
+    @override_settings(MAX_IN_FLIGHT_REQUESTS=1)
+    def test_load_shedding_over_in_flight_limit(self):
+        middleware = LoadSheddingMiddleware(lambda request: inner(request))
+        request = RequestFactory().get('/items/items/')
+        inner = lambda request: middleware(request)  # Вложенный запрос, пока первый ещё обрабатывается
+        response = middleware(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(middleware.in_flight, 0)
+
+        inner = lambda request: HttpResponse('ok')
+        self.assertEqual(middleware(request).status_code, 200)
+        self.assertEqual(middleware(RequestFactory().get('/metrics')).status_code, 200)
+
+
+class LaptopEventsTests(LaptopTestMixin, TestCase):
+    def subscribe(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        subscription = broker.subscribe(loop)
+        self.addCleanup(subscription.close)
+        return loop, subscription
+
+    def test_model_changes_are_published_after_commit(self):
+        loop, subscription = self.subscribe()
+        with self.captureOnCommitCallbacks(execute=True):
+            laptop = self.make_laptop()
+            laptop_id = laptop.id
+            laptop.delete()
+
+        events = [json.loads(loop.run_until_complete(subscription.get(timeout=1))) for _ in range(2)]
+        self.assertEqual([event['type'] for event in events], ['laptop.created', 'laptop.deleted'])
+        self.assertEqual(events[0]['data']['title'], 'ThinkPad')
+        self.assertEqual(events[1]['id'], laptop_id)
+
+    @override_settings(EVENTS_QUEUE_SIZE=2)
+    def test_slow_subscriber_is_dropped(self):
+        loop, subscription = self.subscribe()
+        for i in range(3):
+            broker.publish({'type': 'laptop.updated', 'id': i})
+        self.assertIsNone(loop.run_until_complete(subscription.get(timeout=1)))
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_sse_stream_over_asgi(self):
+        from backend.asgi import application
+
+        async def scenario():
+            sent, disconnect = [], asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'http', 'path': '/items/events/', 'method': 'GET', 'headers': []}
+            task = asyncio.ensure_future(application(scope, receive, send))
+            while not broker.subscriber_count():
+                await asyncio.sleep(0.01)
+            await asyncio.get_running_loop().run_in_executor(None, broker.publish, {'type': 'laptop.updated', 'id': 7})
+            while not any(b'laptop.updated' in message.get('body', b'') for message in sent):
+                await asyncio.sleep(0.01)
+            disconnect.set()
+            await asyncio.wait_for(task, 1)
+            return sent
+
+        sent = asyncio.run(scenario())
+        self.assertIn((b'content-type', b'text/event-stream; charset=utf-8'), sent[0]['headers'])
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        self.assertIn(b'event: laptop.updated\ndata: {"type": "laptop.updated", "id": 7}\n\n', body)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+
+class LaptopSimilarTests(LaptopTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        similar_index.clear()
+        self.t480 = self.make_laptop(title='ThinkPad T480', model='T480', price='500.00', description='Business laptop, i5')
+        self.t490 = self.make_laptop(title='ThinkPad T490', model='T490', price='550.00', description='Business laptop, i7')
+        self.x1 = self.make_laptop(title='ThinkPad X1', model='X1', price='1500.00', description='Business ultrabook')
+        self.mac = self.make_laptop(title='MacBook Air', model='M1', price='900.00', description='Apple silicon')
+
+    def similar_ids(self, laptop, **params):
+        cache.clear()
+        response = self.client.get(f'/items/items/{laptop.id}/similar/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data]
+
+    def test_ranked_by_text_and_price_with_one_query(self):
+        self.assertEqual(self.similar_ids(self.t480), [self.t490.id, self.x1.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.similar_ids(self.t480, limit=1)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.client.get('/items/items/999999/similar/').status_code, 404)
+        for limit in ('0', '51', 'x', '²'):
+            self.assertEqual(self.client.get(f'/items/items/{self.t480.id}/similar/', {'limit': limit}).status_code, 400, limit)
+
+    def test_incremental_updates_and_fold(self):
+        self.similar_ids(self.t480)  # Загружает индекс
+        with mock.patch.object(similar_index, 'FOLD_SIZE', 1):
+            twin = self.make_laptop(title='ThinkPad T480', model='T480', price='510.00', description='Business laptop, i5')
+            self.mac.title, self.mac.description = 'ThinkPad T480s', 'Business laptop'
+            self.mac.save()
+        self.assertEqual(self.similar_ids(self.t480)[0], twin.id)
+        self.assertIn(self.mac.id, self.similar_ids(self.t480))
+
+        twin.delete()
+        self.assertNotIn(twin.id, self.similar_ids(self.t480))
+
+    def test_rebuild_command_writes_loadable_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'similar.npz')
+            call_command('rebuild_similar', output=path, stdout=io.StringIO())
+            with self.settings(SIMILAR_INDEX_PATH=path):
+                loaded = SimilarityIndex()
+                with self.assertNumQueries(2):  # Только догрузка правок после сборки файла
+                    ranked = loaded.similar(self.t480.id)
+        self.assertEqual([laptop_id for laptop_id, _ in ranked], [self.t490.id, self.x1.id])
+
+    def test_reloaded_file_keeps_edits_made_after_it_was_built(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'similar.npz')
+            call_command('rebuild_similar', output=path, stdout=io.StringIO())
+            with self.settings(SIMILAR_INDEX_PATH=path, SIMILAR_RELOAD_SECONDS=0):
+                self.similar_ids(self.t480)
+                twin = self.make_laptop(title='ThinkPad T480', model='T480', price='510.00', description='Business laptop, i5')
+                os.utime(path, (0, 0))  # Новый файл от rebuild_similar без правки выше
+                self.assertEqual(self.similar_ids(self.t480)[0], twin.id)
+
+    @override_settings(SIMILAR_RELOAD_SECONDS=0)
+    def test_worker_without_file_picks_up_other_workers_changes(self):
+        other_worker = SimilarityIndex()
+        self.assertEqual([pk for pk, _ in other_worker.similar(self.t480.id)], [self.t490.id, self.x1.id])
+
+        twin = self.make_laptop(title='ThinkPad T480', model='T480', price='510.00', description='Business laptop, i5')
+        self.t490.delete()
+        ranked = [pk for pk, _ in other_worker.similar(self.t480.id)]
+        self.assertEqual(ranked[0], twin.id)
+        self.assertNotIn(self.t490.id, ranked)
+
+
+class LaptopFacetsTests(LaptopTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass12345')
+        self.make_laptop(model='T480', price='150.00')
+        self.make_laptop(model='T480', price='199.99')
+        self.make_laptop(model='X1', price='950.00', owner=self.other)
+
+    def test_counts_and_sidebar_shape(self):
+        response = self.client.get('/items/items/facets/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(
+            response.data['price']['buckets'],
+            [{'min': 100, 'max': 200, 'count': 2}, {'min': 900, 'max': 1000, 'count': 1}],
+        )
+        self.assertEqual(response.data['models'], [{'model': 'T480', 'count': 2}, {'model': 'X1', 'count': 1}])
+        self.assertEqual(response.data['owners'][0], {'owner': self.user.id, 'count': 2, 'total_price': '349.99'})
+
+        filtered = self.client.get('/items/items/facets/', {'owner': self.other.id})
+        self.assertEqual(filtered.data['models'], [{'model': 'X1', 'count': 1}])
+        by_price = self.client.get('/items/items/facets/', {'min_price': '190'})
+        self.assertEqual(by_price.data['total'], 2)
+
+    def test_incremental_updates_match_full_rebuild(self):
+        laptop = Laptop.objects.get(price='150.00')
+        laptop.price = '1500.00'
+        laptop.save()
+        Laptop.objects.get(model='X1').delete()
+        self.client.force_authenticate(self.user)
+        self.client.post('/items/items/bulk/', {
+            'create': [{'title': 'New', 'model': 'E14', 'price': '300.00', 'description': 'd'}],
+            'update': [{'id': laptop.id, 'model': 'T14'}],
+        }, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            data = facets(QueryDict())
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(facets_rebuild(), 0)
+        self.assertFalse(LaptopFacet.objects.filter(model='X1').exists())
+
+    def test_reconcile_command_repairs_drift(self):
+        LaptopFacet.objects.all().delete()
+        out = io.StringIO()
+        call_command('reconcile_facets', stdout=out)
+        self.assertIn('2 cells fixed', out.getvalue())
+        self.assertEqual(facets(QueryDict())['total'], 3)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, MEDIA_OFFLOAD=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.digest = 'ab' * 32
+        os.makedirs(os.path.join(media_root.name, 'images'))
+        self.root = media_root.name
+        with open(os.path.join(media_root.name, 'images', f'{self.digest}.png'), 'wb') as image:
+            image.write(bytes(range(256)) * 4)
+        with open(os.path.join(media_root.name, 'plain.svg'), 'wb') as svg:
+            svg.write(b'<svg/>' * 100)
+
+    def get(self, path, **headers):
+        response = self.client.get(f'/media/{path}', **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_hashed_file_is_immutable_and_conditional(self):
+        response, body = self.get(f'images/{self.digest}.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(body), 1024)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response, _ = self.get(f'images/{self.digest}.png', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('immutable', self.get('plain.svg')[0]['Cache-Control'])
+
+    async def test_asgi_streams_file_without_buffering(self):
+        response = await AsyncClient().get(f'/media/images/{self.digest}.png', headers={'Range': 'bytes=1000-'})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)  # Иначе Django под ASGI собрал бы файл в память целиком
+        self.assertEqual(b''.join([part async for part in response]), (bytes(range(256)) * 4)[1000:])
+
+    def test_range_requests(self):
+        response, body = self.get(f'images/{self.digest}.png', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(body, bytes(range(10, 20)))
+
+        response, body = self.get(f'images/{self.digest}.png', HTTP_RANGE='bytes=-4')
+        self.assertEqual(body, bytes(range(252, 256)))
+        self.assertEqual(self.get(f'images/{self.digest}.png', HTTP_RANGE='bytes=5000-')[0].status_code, 416)
+
+    def test_precompressed_variant(self):
+        with open(os.path.join(self.root, 'plain.svg.gz'), 'wb') as compressed:
+            compressed.write(gzip.compress(b'<svg/>' * 100))
+        response, body = self.get('plain.svg', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), b'<svg/>' * 100)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertNotIn('Content-Encoding', self.get('plain.svg')[0])
+
+    def test_offload_and_traversal(self):
+        with self.settings(MEDIA_OFFLOAD='x-accel-redirect'):
+            response, body = self.get(f'images/{self.digest}.png')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/images/{self.digest}.png')
+        self.assertEqual(body, b'')
+        self.assertEqual(self.get('../settings.py')[0].status_code, 400)
+
+
+class LaptopDuplicateTests(LaptopTestMixin, TestCase):
+    LISTING = {
+        'title': 'ThinkPad T480 business laptop',
+        'model': 'T480',
+        'price': '500.00',
+        'description': 'Intel i5, 16 GB RAM, 256 GB SSD, battery holds six hours, charger included',
+    }
+
+    def setUp(self):
+        super().setUp()
+        duplicate_index.clear()
+        self.client.force_authenticate(self.user)
+        self.original = self.client.post('/items/items/', self.LISTING, format='json').data
+        # Повтор с мелкой правкой текста
+        self.repost = dict(self.LISTING, description=self.LISTING['description'].replace('six', 'seven'), price='480.00')
+
+    def test_signature_survives_small_edits(self):
+        self.assertGreaterEqual(similarity(signature(self.LISTING), signature(self.repost)), 0.5)
+        other = {'title': 'MacBook Air', 'model': 'M1', 'description': 'Apple silicon, like new'}
+        self.assertLess(similarity(signature(self.LISTING), signature(other)), 0.2)
+
+    @override_settings(DUPLICATE_THRESHOLD=0.5)
+    def test_flag_policy_links_to_original(self):
+        response = self.client.post('/items/items/', self.repost, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['duplicate_of'], self.original['id'])
+        self.assertNotIn('minhash', response.data)
+
+        unrelated = self.client.post('/items/items/', dict(self.LISTING, title='MacBook Air', model='M1', description='Apple silicon'), format='json')
+        self.assertIsNone(unrelated.data['duplicate_of'])
+
+    @override_settings(DUPLICATE_THRESHOLD=0.5, DUPLICATE_POLICY='reject')
+    def test_reject_policy(self):
+        response = self.client.post('/items/items/', self.repost, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['duplicate_of'], self.original['id'])
+        self.assertEqual(Laptop.objects.count(), 1)
+
+    @override_settings(DUPLICATE_THRESHOLD=0.5, DUPLICATE_POLICY='merge')
+    def test_merge_policy_updates_own_listing_only(self):
+        response = self.client.post('/items/items/', self.repost, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.original['id'])
+        self.assertEqual(Laptop.objects.get().price, Decimal('480.00'))
+
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass12345')
+        self.client.force_authenticate(other)
+        response = self.client.post('/items/items/', self.repost, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['duplicate_of'], self.original['id'])
+
+    def test_text_without_words_is_not_compared(self):
+        self.assertIsNone(signature({'title': '!!!', 'model': '--', 'description': ''}))
+        first = self.client.post('/items/items/', dict(self.LISTING, title='!!!', model='--', description='...'), format='json')
+        second = self.client.post('/items/items/', dict(self.LISTING, title='???', model='..', description='***'), format='json')
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertIsNone(second.data['duplicate_of'])
+
+    @override_settings(DUPLICATE_THRESHOLD=0.5)
+    def test_bulk_create_applies_policy(self):
+        payload = {'create': [self.repost, dict(self.LISTING, title='MacBook Air', model='M1', description='Apple silicon')]}
+        response = self.client.post('/items/items/bulk/', payload, format='json')
+        self.assertEqual([r['data']['duplicate_of'] for r in response.data['create']], [self.original['id'], None])
+
+        with self.settings(DUPLICATE_POLICY='reject'):
+            response = self.client.post('/items/items/bulk/', {'create': [self.repost]}, format='json')
+        self.assertEqual(response.data['create'][0]['status'], 409)
+
+        with self.settings(DUPLICATE_POLICY='merge'):
+            response = self.client.post('/items/items/bulk/', {'create': [dict(self.LISTING, price='470.00')]}, format='json')
+        result = response.data['create'][0]
+        self.assertEqual((result['index'], result['status']), (0, 200))
+        self.assertEqual(result['data']['price'], '470.00')
+        self.assertEqual(Laptop.objects.count(), 3)
+
+    @override_settings(DUPLICATE_THRESHOLD=0.5)
+    def test_import_applies_policy(self):
+        rows = [dict(self.repost, owner=self.user.id), dict(self.repost, owner=self.user.id, price='470.00')]
+        dump = ''.join(json.dumps(row) + '\n' for row in rows)
+        with self.settings(DUPLICATE_POLICY='reject'):
+            summary = LaptopImporter().run(io.StringIO(dump), 'ndjson')
+        self.assertEqual((summary['imported'], [error['line'] for error in summary['errors']]), (0, [1, 2]))
+
+        with self.settings(DUPLICATE_POLICY='merge'):
+            summary = LaptopImporter().run(io.StringIO(dump), 'ndjson')
+        self.assertEqual((summary['imported'], summary['merged']), (0, 2))
+        self.assertEqual(Laptop.objects.get().price, Decimal('470.00'))
+
+        summary = LaptopImporter().run(io.StringIO(dump), 'ndjson')
+        self.assertEqual(summary['imported'], 2)
+        self.assertEqual(set(Laptop.objects.exclude(pk=self.original['id']).values_list('duplicate_of', flat=True)), {self.original['id']})
+
+    @override_settings(DUPLICATE_THRESHOLD=0.5)
+    def test_backfill_command_and_index_refresh(self):
+        legacy = self.make_laptop(**dict(self.repost, price='450.00'))
+        self.assertIsNone(legacy.minhash)
+        call_command('backfill_minhash', stdout=io.StringIO())
+        legacy.refresh_from_db()
+        self.assertEqual(bytes(legacy.minhash), signature(self.repost))
+
+        duplicate_index.clear()  # Как после перезапуска воркера: индекс читается из БД
+        Laptop.objects.filter(pk=self.original['id']).delete()
+        response = self.client.post('/items/items/', self.LISTING, format='json')
+        self.assertEqual(response.data['duplicate_of'], legacy.id)
+
+
+class LaptopAdminTests(LaptopTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        self.client.force_login(self.admin)
+        self.laptops = [self.make_laptop(title=f'ThinkPad {i}', price=f'{100 + i}.00') for i in range(5)]
+
+    def changelist(self, **params):
+        return self.client.get('/admin/items/laptop/', params)
+
+    def test_keyset_pages_without_offset(self):
+        with mock.patch('items.admin.LaptopAdmin.list_per_page', 2):
+            first = self.changelist()
+            self.assertEqual([laptop.id for laptop in first.context['cl'].result_list], [self.laptops[4].id, self.laptops[3].id])
+            with CaptureQueriesContext(connection) as queries:
+                second = self.changelist(after=first.context['cl'].next_cursor)
+            self.assertEqual([laptop.id for laptop in second.context['cl'].result_list], [self.laptops[2].id, self.laptops[1].id])
+            self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+            # Владелец приходит JOIN'ом, а не запросом на строку; единственный запрос — request.user
+            self.assertEqual(sum(query['sql'].startswith('SELECT "users_customuser"') for query in queries), 1)
+            last = self.changelist(after=second.context['cl'].next_cursor)
+            self.assertEqual([laptop.id for laptop in last.context['cl'].result_list], [self.laptops[0].id])
+            self.assertIsNone(last.context['cl'].next_cursor)
+        self.assertEqual(first.context['cl'].result_count, 5)
+
+    def test_counts_are_estimated_or_capped(self):
+        with mock.patch('backend.admin.estimated_row_count', return_value=2_000_000):
+            response = self.changelist()
+        self.assertEqual(response.context['cl'].result_count, 2_000_000)
+        self.assertContains(response, '~2000000')
+        with self.settings(ADMIN_EXACT_COUNT_LIMIT=3):
+            response = self.changelist(q='ThinkPad')
+        self.assertEqual(response.context['cl'].result_count, 4)
+        self.assertEqual(self.changelist(q=str(self.laptops[0].id)).context['cl'].result_count, 1)
+
+    def test_delete_action_is_one_delete_and_keeps_summaries(self):
+        self.laptops[1].duplicate_of = self.laptops[0]
+        self.laptops[1].save()
+        linked_at = self.laptops[1].updated_at
+        ids = [self.laptops[0].id, self.laptops[2].id]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/admin/items/laptop/', {'action': 'delete_laptops', '_selected_action': ids})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sum(query['sql'].startswith('DELETE FROM "items_laptop"') for query in queries), 1)
+        self.assertFalse(Laptop.objects.filter(id__in=ids).exists())
+        self.laptops[1].refresh_from_db()
+        self.assertIsNone(self.laptops[1].duplicate_of_id)
+        self.assertGreater(self.laptops[1].updated_at, linked_at)  # Попадает в ленту изменений
+        self.assertEqual(LaptopTombstone.objects.count(), 2)
+        self.assertEqual(facets(QueryDict())['total'], 3)
+        self.assertEqual(facets_rebuild(), 0)
+        with self.settings(CHANGES_COMMIT_LAG_SECONDS=0):
+            self.assertEqual(sorted(self.client.get('/items/changes/').data['deleted']), ids)
@@ -0,0 +1,198 @@
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import LaptopBulkItemSerializer
+from .dedup import DUPLICATE_DETAIL, duplicate_actions
+from .models import Laptop
+from .signals import bulk_insert, laptops_saved
+
+EXPORT_FIELDS = ('id', 'title', 'model', 'price', 'description', 'image_url', 'owner_id', 'owner__username')
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def iter_rows(queryset=None, chunk_size=2000):
+    """
+    Keyset-чанки по id: память постоянна при любом размере таблицы и любом драйвере
+    (mysqlclient буферизует весь результат даже у .iterator()).
+    """
+    queryset = (queryset if queryset is not None else Laptop.objects.all()).order_by('id')
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id).values(*EXPORT_FIELDS)[:chunk_size])
+        if not chunk:
+            return
+        for row in chunk:
+            row['owner'] = row.pop('owner_id')
+            row['owner_username'] = row.pop('owner__username')
+            row['price'] = str(row['price'])
+            yield row
+        last_id = chunk[-1]['id']
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def iter_csv(rows):
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_lines(fmt, queryset=None, chunk_size=2000):
+    rows = iter_rows(queryset, chunk_size)
+    return iter_csv(rows) if fmt == 'csv' else iter_ndjson(rows)
+
+
+def parse_int(value):
+    """
+    Неотрицательное целое из поля файла или None. isdecimal, а не isdigit: isdigit
+    пропускает '²', на котором int() падает.
+    """
+    text = str(value)
+    return int(text) if text.isdecimal() else None
+
+
+def parse_lines(lines, fmt):
+    """
+    Текстовые строки файла -> (номер строки данных, dict). Нумерация с 1, заголовок CSV не считается.
+    """
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row
+        return
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, e
+
+
+class LaptopImporter:
+    """
+    Пачечный импорт: валидация, bulk_create пачками в отдельных транзакциях.
+    Строки с уже существующим id пропускаются, поэтому повторный запуск безопасен;
+    after — номер последней уже импортированной строки для продолжения с места остановки.
+    Новые строки проходят DUPLICATE_POLICY: reject — ошибка строки, merge — обновление
+    похожего объявления того же продавца (merged в сводке), flag — duplicate_of.
+    """
+    MAX_ERRORS = 100
+
+    def __init__(self, batch_size=1000, on_batch=None):
+        self.batch_size = batch_size
+        self.on_batch = on_batch  # callback(номер последней строки пачки) — чекпоинт
+        self.imported = 0
+        self.skipped = 0
+        self.merged = 0
+        self.errors = []
+        self.last_line = 0
+
+    def run(self, lines, fmt, after=0):
+        batch = []
+        for number, row in parse_lines(lines, fmt):
+            if number <= after:
+                continue
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+        if batch:
+            self._import_batch(batch)
+        return self.summary()
+
+    def summary(self):
+        return {
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'merged': self.merged,
+            'failed': len(self.errors),
+            'last_line': self.last_line,
+            'errors': self.errors[:self.MAX_ERRORS],
+        }
+
+    def _error(self, number, errors):
+        self.errors.append({'line': number, 'errors': errors})
+
+    def _import_batch(self, batch):
+        owner_ids = {row.get('owner') for _, row in batch if isinstance(row, dict)}
+        existing_owners = set(
+            get_user_model().objects.filter(pk__in=[pk for pk in map(parse_int, owner_ids) if pk is not None])
+            .values_list('pk', flat=True)
+        )
+
+        laptops = []
+        for number, row in batch:
+            if not isinstance(row, dict):
+                self._error(number, {'detail': f'Invalid row: {row}'})
+                continue
+            serializer = LaptopBulkItemSerializer(data=row)
+            owner = parse_int(row.get('owner', ''))
+            if owner not in existing_owners:
+                self._error(number, {'owner': 'Unknown owner.'})
+            elif not serializer.is_valid():
+                self._error(number, serializer.errors)
+            else:
+                laptop_id = parse_int(row.get('id', ''))
+                data = serializer.validated_data
+                laptops.append((number, Laptop(id=laptop_id, owner_id=owner, **data), data))
+
+        with transaction.atomic():
+            existing = set(
+                Laptop.objects.filter(pk__in=[laptop.id for _, laptop, _ in laptops if laptop.id])
+                .values_list('pk', flat=True)
+            )
+            candidates, seen = [], set()
+            for entry in laptops:
+                laptop_id = entry[1].id
+                if laptop_id in existing:
+                    continue
+                # Повтор id внутри пачки: вторая строка иначе уронила бы bulk_create на IntegrityError
+                if laptop_id is not None and laptop_id in seen:
+                    self._error(entry[0], {'id': f'Duplicate id {laptop_id} in file.'})
+                    continue
+                seen.add(laptop_id)
+                candidates.append(entry)
+            new_laptops, merged, merged_rows, fields = [], {}, 0, {'updated_at'}
+            actions = duplicate_actions([(laptop.minhash, laptop.owner_id) for _, laptop, _ in candidates])
+            for (number, laptop, data), (action, duplicate) in zip(candidates, actions):
+                if action == 'reject':
+                    self._error(number, {'detail': DUPLICATE_DETAIL, 'duplicate_of': duplicate.pk})
+                elif action == 'merge':
+                    for name, value in data.items():
+                        setattr(duplicate, name, value)
+                        fields.add(name)
+                    duplicate.updated_at = timezone.now()  # bulk_update не применяет auto_now
+                    merged[duplicate.pk] = duplicate
+                    merged_rows += 1
+                else:
+                    laptop.duplicate_of = duplicate
+                    new_laptops.append(laptop)
+            bulk_insert(new_laptops, self.batch_size)
+            if merged:
+                Laptop.objects.bulk_update(list(merged.values()), sorted(fields), batch_size=self.batch_size)
+                laptops_saved(list(merged.values()))
+
+        self.imported += len(new_laptops)
+        self.merged += merged_rows
+        self.skipped += sum(laptop.id in existing for _, laptop, _ in laptops)
+        self.last_line = batch[-1][0]
+        if self.on_batch:
+            self.on_batch(self.last_line)
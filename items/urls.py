@@ -3,5 +3,12 @@ from . import views
 
 urlpatterns = [
     path('items/', views.LaptopListCreateView.as_view(), name='laptop-list-create'),
+    path('items/facets/', views.LaptopFacetsView.as_view(), name='laptop-facets'),
+    path('items/bulk/', views.LaptopBulkView.as_view(), name='laptop-bulk'),
     path('items/<int:pk>/', views.LaptopRetrieveUpdateDeleteView.as_view(), name='laptop-detail'),
+    path('items/<int:pk>/similar/', views.LaptopSimilarView.as_view(), name='laptop-similar'),
+    path('export/', views.LaptopExportView.as_view(), name='laptop-export'),
+    path('import/', views.LaptopImportView.as_view(), name='laptop-import'),
+    path('changes/', views.LaptopChangesView.as_view(), name='laptop-changes'),
+    path('search/', views.LaptopSearchView.as_view(), name='laptop-search'),
 ]
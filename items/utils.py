@@ -1,14 +1,60 @@
-import requests
+import threading
+
+from django.conf import settings
+
+from backend.metrics import track
 
 IMGUR_UPLOAD_URL = "https://api.imgur.com/3/image"
 IMGUR_CLIENT_ID = "cae9fdb8403f3a4"  # Вставьте сюда свой Client ID
 
+_local = threading.local()
+
+
+class ImageUploadError(Exception):
+    pass
+
+
+def get_http_session():
+    """
+    Keep-alive сессия на поток: соединение с хостингом переиспользуется,
+    а 429/5xx повторяются с экспоненциальной задержкой.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        # HTTP-клиент нужен только воркеру, который загружает картинки: импорт при первой загрузке
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=settings.IMAGE_UPLOAD_RETRIES,
+            backoff_factor=settings.IMAGE_UPLOAD_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=None,  # POST на хостинг идемпотентен для нас: худший случай — лишняя копия
+            raise_on_status=False,
+        )
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(max_retries=retry, pool_maxsize=settings.IMAGE_UPLOAD_WORKERS))
+        session.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=settings.IMAGE_UPLOAD_WORKERS))
+        _local.session = session
+    return session
+
+
 def upload_image_to_imgur(image_file):
+    import requests
+
     headers = {"Authorization": f"Client-ID {IMGUR_CLIENT_ID}"}
-    response = requests.post(IMGUR_UPLOAD_URL, headers=headers, files={"image": image_file})
+    url = getattr(settings, "IMAGE_UPLOAD_URL", None) or IMGUR_UPLOAD_URL
+    try:
+        with track("http"):
+            response = get_http_session().post(
+                url, headers=headers, files={"image": image_file}, timeout=settings.IMAGE_UPLOAD_TIMEOUT
+            )
+    except requests.RequestException as e:
+        raise ImageUploadError(f"Imgur upload failed: {e}") from e
 
     if response.status_code == 200:
         data = response.json()
         return data["data"]["link"]  # Возвращаем URL загруженного изображения
     else:
-        raise Exception(f"Imgur upload failed: {response.status_code}, {response.text}")
+        raise ImageUploadError(f"Imgur upload failed: {response.status_code}, {response.text}")
@@ -1,20 +1,48 @@
+import io
+
 from rest_framework import status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
+from backend.conditional import conditional_response
+from backend.response_cache import cached_response
+from backend.streaming import for_server
+from backend.throttling import IPRateThrottle, UserRateThrottle
+
+from .bulk import LaptopBulkService
+from .changes import changes_since, decode_token, last_modified
+from .dedup import DUPLICATE_DETAIL, duplicate_actions
+from .facets import facets
+from .filters import LaptopFilter
 from .models import Laptop
-from .serializers import LaptopSerializer
-from .utils import upload_image_to_imgur
+from .pagination import LaptopCursorPagination, LaptopSearchPagination
+from .search import MySQLFullTextBackend, highlight, memory_index, tokenize, uses_fulltext
+from .serializers import LaptopExpandedSerializer, LaptopRowSerializer, LaptopSerializer, parse_expand
+from .similar import similar_index
+from .storage import image_store, read_content
+from .tasks import upload_queue
+from .transfer import CONTENT_TYPES, FORMATS, LaptopImporter, export_lines, parse_int
+
+User = get_user_model()
 
 
 class LaptopService:
     @staticmethod
-    def upload_image(image_file):
-        if image_file:
-            return upload_image_to_imgur(image_file)
-        return None
+    def schedule_image_upload(laptop, image_file):
+        content = read_content(image_file)
+        # Уже загруженная картинка: URL известен сразу, очередь не нужна
+        stored = image_store.lookup(content)
+        if stored:
+            laptop.image_url = stored.url
+            laptop.image_variants = stored.variants
+            laptop.image_status = Laptop.IMAGE_DONE
+            laptop.save(update_fields=["image_url", "image_variants", "image_status", "updated_at"])
+            return
+        upload_queue.submit(laptop.pk, content, image_file.name)
 
     @staticmethod
     def check_owner(laptop, user):
@@ -23,43 +51,114 @@ class LaptopService:
 
 class LaptopListCreateView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    # Запись с картинкой упирается в загрузку на хостинг — лимитируем до разбора multipart
+    throttle_classes = [UserRateThrottle, IPRateThrottle]
+    throttle_scope = 'listing_write'
+    throttle_methods = ('POST',)
 
     def get(self, request):
-        laptops = Laptop.objects.all()
-        serializer = LaptopSerializer(laptops, many=True)
-        return Response(serializer.data)
+        if parse_expand(request.query_params):
+            # Продавец меняется независимо от объявлений: Last-Modified по ноутбукам тут не годится
+            return cached_response(request, [Laptop, User], lambda: self.list(request))
+        return cached_response(
+            request, [Laptop], lambda: conditional_response(request, last_modified(), lambda: self.list(request))
+        )
+
+    def list(self, request):
+        laptops = LaptopFilter.filter_queryset(Laptop.objects.all(), request.query_params)
+        ordering = LaptopFilter.get_ordering(request.query_params)
+
+        rows = LaptopRowSerializer(parse_expand(request.query_params), context={"request": request})
+
+        # Пагинация включается только по ?cursor= / ?page_size=, чтобы старые клиенты получали список
+        if LaptopCursorPagination.is_requested(request):
+            paginator = LaptopCursorPagination()
+            paginator.ordering = ordering or LaptopFilter.DEFAULT_ORDERING
+            page = paginator.paginate_queryset(rows.values(laptops), request, view=self)
+            return paginator.get_paginated_response(rows.serialize(page))
+
+        if ordering:
+            laptops = laptops.order_by(*ordering)
+        return Response(rows.serialize(rows.values(laptops)))
 
     def post(self, request):
         data = request.data.copy()
         data["owner"] = request.user.pk
 
         image_file = request.FILES.get("image")
-        if image_file:
-            try:
-                image_url = LaptopService.upload_image(image_file)
-                if image_url:
-                    data["image_url"] = image_url
-            except Exception as e:
-                return Response({"detail": f"Image upload failed: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        if image_file and upload_queue.is_full():
+            return Response({"detail": "Image upload queue is full, try again later."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         serializer = LaptopSerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            [(action, duplicate)] = duplicate_actions([(serializer.validated_data['minhash'], request.user.pk)])
+            if action == 'reject':
+                return Response(
+                    {"detail": DUPLICATE_DETAIL, "duplicate_of": duplicate.pk}, status=status.HTTP_409_CONFLICT,
+                )
+            if action == 'merge':
+                return self.merge(duplicate, data, image_file)
+
+            # Объявление создаётся сразу, картинка догружается в фоне (см. image_status)
+            laptop = serializer.save(
+                image_status=Laptop.IMAGE_PENDING if image_file else '', duplicate_of=duplicate,
+            )
+            if image_file:
+                LaptopService.schedule_image_upload(laptop, image_file)
+                laptop.refresh_from_db()
+            return Response(LaptopSerializer(laptop).data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def merge(self, laptop, data, image_file):
+        # Повтор своего же объявления обновляет существующее вместо создания копии
+        serializer = LaptopSerializer(laptop, data=data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        laptop = serializer.save(image_status=Laptop.IMAGE_PENDING if image_file else laptop.image_status)
+        if image_file:
+            LaptopService.schedule_image_upload(laptop, image_file)
+            laptop.refresh_from_db()
+        return Response(LaptopSerializer(laptop).data, status=status.HTTP_200_OK)
+
+
+class LaptopFacetsView(APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request):
+        return cached_response(request, [Laptop], lambda: Response(facets(request.query_params)))
+
+
+class LaptopBulkView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [UserRateThrottle, IPRateThrottle]
+    throttle_scope = 'listing_write'
+
+    def post(self, request):
+        results = LaptopBulkService(request.user).execute(request.data)
+        return Response(results)
+
 
 class LaptopRetrieveUpdateDeleteView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [UserRateThrottle, IPRateThrottle]
+    throttle_scope = 'listing_write'
+    throttle_methods = ('PUT',)
 
     def get_object(self, pk):
         return get_object_or_404(Laptop, pk=pk)
 
     def get(self, request, pk):
-        laptop = self.get_object(pk)
-        serializer = LaptopSerializer(laptop)
-        return Response(serializer.data)
+        if parse_expand(request.query_params):
+            return cached_response(request, [Laptop, User], lambda: self.retrieve_expanded(request, pk))
+        return cached_response(request, [Laptop], lambda: self.retrieve(request, pk))
+
+    def retrieve_expanded(self, request, pk):
+        laptop = get_object_or_404(Laptop.objects.select_related("owner"), pk=pk)
+        return Response(LaptopExpandedSerializer(laptop, context={"request": request}).data)
+
+    def retrieve(self, request, pk):
+        updated_at = get_object_or_404(Laptop.objects.values_list("updated_at", flat=True), pk=pk)
+        return conditional_response(request, updated_at, lambda: Response(LaptopSerializer(self.get_object(pk)).data))
 
     def put(self, request, pk):
         laptop = self.get_object(pk)
@@ -69,18 +168,18 @@ class LaptopRetrieveUpdateDeleteView(APIView):
 
         data = request.data.copy()
         image_file = request.FILES.get("image")
-        if image_file:
-            try:
-                image_url = LaptopService.upload_image(image_file)
-                if image_url:
-                    data["image_url"] = image_url
-            except Exception as e:
-                return Response({"detail": f"Image upload failed: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        if image_file and upload_queue.is_full():
+            return Response({"detail": "Image upload queue is full, try again later."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         serializer = LaptopSerializer(laptop, data=data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            if image_file:
+                laptop = serializer.save(image_status=Laptop.IMAGE_PENDING)
+                LaptopService.schedule_image_upload(laptop, image_file)
+                laptop.refresh_from_db()
+            else:
+                laptop = serializer.save()
+            return Response(LaptopSerializer(laptop).data)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -92,4 +191,122 @@ class LaptopRetrieveUpdateDeleteView(APIView):
 
         laptop.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
-#
\ No newline at end of file
+
+
+class LaptopSimilarView(APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    default_limit = 6
+    max_limit = 50
+
+    def get(self, request, pk):
+        return cached_response(request, [Laptop], lambda: self.similar(request, pk))
+
+    def similar(self, request, pk):
+        limit = request.query_params.get("limit", str(self.default_limit))
+        if not limit.isdecimal() or not 0 < int(limit) <= self.max_limit:
+            return Response({"detail": f"'limit' must be between 1 and {self.max_limit}."}, status=status.HTTP_400_BAD_REQUEST)
+        expand = parse_expand(request.query_params)
+
+        # Соседи считаются в памяти (items.similar); из БД читаются только итоговые строки
+        ranked = similar_index.similar(pk, int(limit))
+        if ranked is None:
+            ranked = similar_index.similar_to(get_object_or_404(Laptop, pk=pk), int(limit))
+
+        laptops = (Laptop.objects.select_related("owner") if expand else Laptop.objects.all()).in_bulk(
+            [laptop_id for laptop_id, _ in ranked]
+        )
+        serializer_class = LaptopExpandedSerializer if expand else LaptopSerializer
+        results = []
+        for laptop_id, score in ranked:
+            if laptop_id in laptops:
+                row = serializer_class(laptops[laptop_id], context={"request": request}).data
+                row["score"] = round(score, 4)
+                results.append(row)
+        return Response(results)
+
+
+class LaptopSearchView(APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"detail": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        expand = parse_expand(request.query_params)
+        serializer_class = LaptopExpandedSerializer if expand else LaptopSerializer
+        laptops = Laptop.objects.select_related("owner") if expand else Laptop.objects.all()
+
+        paginator = LaptopSearchPagination()
+        if uses_fulltext():
+            page = paginator.paginate_queryset(MySQLFullTextBackend().search_queryset(query, laptops), request, view=self)
+            scores = {laptop.pk: laptop.score for laptop in page}
+        else:
+            ranked_ids, scores = memory_index.search(query)
+            page_ids = paginator.paginate_queryset(ranked_ids, request, view=self)
+            laptops = laptops.in_bulk(page_ids)
+            page = [laptops[pk] for pk in page_ids if pk in laptops]
+
+        terms = tokenize(query)
+        results = []
+        for laptop in page:
+            row = serializer_class(laptop, context={"request": request}).data
+            row["score"] = round(float(scores[laptop.pk]), 4)
+            row["highlight"] = {
+                "title": highlight(laptop.title, terms),
+                "description": highlight(laptop.description, terms),
+            }
+            results.append(row)
+
+        return paginator.get_paginated_response(results)
+
+
+class LaptopChangesView(APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    limit = 500
+
+    def get(self, request):
+        since = request.query_params.get("since")
+        since = decode_token(since) if since else None
+
+        upserts, deleted, token, has_more = changes_since(since, self.limit)
+        return Response({
+            "upserts": LaptopSerializer(upserts, many=True).data,
+            "deleted": deleted,
+            "next": token,
+            "has_more": has_more,
+        })
+
+
+class LaptopExportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        # ?fmt=, а не ?format= — format DRF использует для выбора рендерера
+        fmt = request.query_params.get("fmt", "ndjson")
+        if fmt not in FORMATS:
+            return Response({"detail": f"Allowed formats: {', '.join(FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(export_lines(fmt), content_type=CONTENT_TYPES[fmt])
+        response["Content-Disposition"] = f'attachment; filename="laptops.{fmt}"'
+        return for_server(request, response)
+
+
+class LaptopImportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if not upload:
+            return Response({"detail": "File is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.data.get("fmt") or ("csv" if upload.name.endswith(".csv") else "ndjson")
+        if fmt not in FORMATS:
+            return Response({"detail": f"Allowed formats: {', '.join(FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        after = parse_int(request.data.get("after", "0"))
+        if after is None:
+            return Response({"detail": "'after' must be a line number."}, status=status.HTTP_400_BAD_REQUEST)
+
+        lines = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+        summary = LaptopImporter().run(lines, fmt, after=after)
+        return Response(summary)
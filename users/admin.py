@@ -1,8 +1,40 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.db.models import F
+
+from backend.admin import LargeTableAdmin
+from backend.response_cache import bump_version
+
+from .authentication import user_cache
 from .models import CustomUser
 
-class CustomUserAdmin(admin.ModelAdmin):
-    list_display = ('username', 'email', 'avatar')  
-    search_fields = ('username', 'email')
+
+class CustomUserAdmin(LargeTableAdmin):
+    list_display = ('id', 'username', 'email', 'is_active', 'avatar')
+    # Префикс и точное совпадение идут по уникальным индексам, '%term%' — полный проход таблицы
+    search_fields = ('^username', '=email')
+    search_help_text = 'Username prefix, exact email or user id.'
+    list_filter = ('is_active', 'is_staff')
+    actions = ('deactivate_users', 'logout_everywhere')
+    # user_cache — память процесса: очищается только в воркере, обработавшем действие
+    OTHER_WORKERS_NOTE = (
+        f' Other server workers may accept these users from their cache for up to {settings.AUTH_USER_CACHE_TTL} s.'
+    )
+
+    @admin.action(permissions=['change'], description='Deactivate selected users')
+    def deactivate_users(self, request, queryset):
+        updated = queryset.update(is_active=False)
+        # update() не шлёт сигналов, которые сбрасывают кэши
+        user_cache.clear()
+        bump_version(CustomUser)
+        self.message_user(request, f'Deactivated {updated} users.{self.OTHER_WORKERS_NOTE}', messages.SUCCESS)
+
+    @admin.action(permissions=['change'], description='Log out selected users everywhere')
+    def logout_everywhere(self, request, queryset):
+        # Как auth/logout/all/: токены со старым token_version больше не принимаются
+        updated = queryset.update(token_version=F('token_version') + 1)
+        user_cache.clear()
+        self.message_user(request, f'Logged out {updated} users.{self.OTHER_WORKERS_NOTE}', messages.SUCCESS)
+
 
 admin.site.register(CustomUser, CustomUserAdmin)
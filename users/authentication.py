@@ -0,0 +1,101 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .revocation import check_token
+
+
+class UserCache:
+    """
+    LRU-кэш пользователей в памяти процесса с TTL. Сбрасывается сигналами CustomUser,
+    TTL ограничивает устаревание в других воркерах.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+
+
+def cached_user(user_id):
+    """
+    Пользователь из user_cache, при промахе — из БД; None, если его нет.
+    """
+    user = user_cache.get(user_id)
+    if user is None:
+        user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None:
+            user_cache.set(user_id, user)
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication без запроса в БД на каждый запрос: пользователь берётся из user_cache.
+    Время аутентификации пишется в request.auth_timing (см. AuthTimingMiddleware).
+    """
+
+    def authenticate(self, request):
+        started = time.perf_counter()
+        self.cache_status = 'none'
+        try:
+            return super().authenticate(request)
+        finally:
+            request._request.auth_timing = ((time.perf_counter() - started) * 1000, self.cache_status)
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = user_cache.get(user_id) if user_id is not None else None
+        if user is None:
+            self.cache_status = 'miss'
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+        else:
+            self.cache_status = 'hit'
+            if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        if not check_token(validated_token, user):
+            raise AuthenticationFailed("Token has been revoked.", code="token_revoked")
+        # Копия: изменения request.user в одном запросе не должны протекать в другие
+        return copy.copy(user)
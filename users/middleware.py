@@ -0,0 +1,17 @@
+class AuthTimingMiddleware:
+    """
+    Добавляет Server-Timing: auth;dur=<мс>;desc="hit|miss" для запросов с JWT.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        timing = getattr(request, 'auth_timing', None)
+        if timing is not None:
+            duration, status = timing
+            entry = f'auth;dur={duration:.2f};desc="{status}"'
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = f'{existing}, {entry}' if existing else entry
+        return response
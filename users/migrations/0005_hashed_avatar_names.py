@@ -0,0 +1,19 @@
+# Generated by Django 4.2.18 on 2026-10-18 19:49
+
+from django.db import migrations, models
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_customuser_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, upload_to=users.models.avatar_upload_to),
+        ),
+    ]
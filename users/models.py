@@ -1,10 +1,61 @@
+import hashlib
+import os
+
 from django.contrib.auth.models import AbstractUser
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.db import models
 
+from backend.images import build_variants
+
+
+def avatar_upload_to(instance, filename):
+    """
+    avatars/<sha256>.<ext>: имя меняется вместе с содержимым, поэтому файл можно кэшировать навсегда.
+    """
+    digest = hashlib.sha256()
+    for chunk in instance.avatar.chunks():
+        digest.update(chunk)
+    extension = os.path.splitext(filename)[1].lower()[:10]
+    return f'avatars/{digest.hexdigest()}{extension}'
+
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
-    avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    avatar = models.ImageField(upload_to=avatar_upload_to, null=True, blank=True)
+    avatar_variants = models.JSONField(default=dict, blank=True)  # {'thumb': путь в MEDIA_ROOT, ...}
+    token_version = models.PositiveIntegerField(default=0)  # +1 — все выданные токены недействительны
 
     def __str__(self):
         return self.username
+
+    def refresh_avatar_variants(self):
+        """
+        Пересобирает уменьшенные WebP-копии аватара в MEDIA_ROOT/avatars/variants/.
+        """
+        variants = {}
+        if self.avatar:
+            stem = os.path.splitext(os.path.basename(self.avatar.name))[0]
+            with self.avatar.open('rb') as avatar_file:
+                content = avatar_file.read()
+
+            def save(data, filename):
+                return default_storage.save(f'avatars/variants/{stem}_{filename}', ContentFile(data))
+
+            variants = build_variants(content, save)
+        self.avatar_variants = variants
+        self.save(update_fields=['avatar_variants'])
+
+
+class RevokedToken(models.Model):
+    """
+    Отозванный JWT (logout); проверяется через Bloom-фильтр users.revocation.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='revoked_tokens')
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
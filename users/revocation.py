@@ -0,0 +1,157 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+TOKEN_VERSION_CLAIM = 'tv'
+# Запас при дочитывании: запись, закоммиченная чуть позже своего revoked_at, не потеряется
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class BloomFilter:
+    """
+    Битовый массив на m бит и k хэшей (двойное хэширование по одному blake2b):
+    "нет" — точно, "да" — с вероятностью ложного срабатывания error_rate.
+    """
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def estimated_error_rate(self):
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class RevocationList:
+    """
+    Отозванные JTI хранятся в RevokedToken, а проверяются по Bloom-фильтру в памяти процесса:
+    не отозванный токен (почти все запросы) не стоит ни одного запроса в БД, в БД идут только
+    срабатывания фильтра. Фильтр дочитывает новые отзывы раз в REVOCATION_REFRESH_SECONDS
+    (столько отзыв из другого воркера может быть не виден) и пересобирается целиком раз
+    в REVOCATION_REBUILD_SECONDS, выбрасывая истёкшие токены.
+    """
+
+    def __init__(self):
+        self._filter = None
+        self._loaded_until = None
+        self._refreshed_at = 0.0
+        self._rebuilt_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'checks': 0, 'filter_hits': 0, 'revoked': 0, 'false_positives': 0}
+
+    def _record(self, *names):
+        with self._lock:
+            for name in names:
+                self._stats[name] += 1
+
+    def _rebuild(self, now):
+        started = timezone.now()
+        RevokedToken.objects.filter(expires_at__lte=started).delete()  # Истёкшие токены отзывать уже не нужно
+        jtis = list(RevokedToken.objects.filter(expires_at__gt=started).values_list('jti', flat=True))
+        bloom = BloomFilter(max(len(jtis) * 2, settings.REVOCATION_BLOOM_CAPACITY), settings.REVOCATION_BLOOM_ERROR_RATE)
+        for jti in jtis:
+            bloom.add(jti)
+        self._filter, self._loaded_until = bloom, started
+        self._refreshed_at = self._rebuilt_at = now
+
+    def _refresh(self, now):
+        started = timezone.now()
+        since = self._loaded_until - REFRESH_OVERLAP
+        for jti in RevokedToken.objects.filter(revoked_at__gte=since).values_list('jti', flat=True):
+            if jti not in self._filter:
+                self._filter.add(jti)
+        self._loaded_until = started
+        self._refreshed_at = now
+
+    def _current_filter(self):
+        now = time.monotonic()
+        if (
+            self._filter is not None
+            and now - self._refreshed_at < settings.REVOCATION_REFRESH_SECONDS
+        ):
+            return self._filter
+        with self._lock:
+            if self._filter is None or now - self._rebuilt_at >= settings.REVOCATION_REBUILD_SECONDS:
+                self._rebuild(now)
+            elif now - self._refreshed_at >= settings.REVOCATION_REFRESH_SECONDS:
+                self._refresh(now)
+            return self._filter
+
+    def is_revoked(self, jti):
+        if jti is None:
+            return False
+        if jti not in self._current_filter():
+            self._record('checks')
+            return False
+
+        revoked = RevokedToken.objects.filter(jti=jti).exists()
+        self._record('checks', 'filter_hits', 'revoked' if revoked else 'false_positives')
+        return revoked
+
+    def revoke(self, token, user):
+        """
+        Отзывает токен (refresh или access) по его JTI до истечения его exp.
+        """
+        jti = token.get(api_settings.JTI_CLAIM)
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, user=user, expires_at=expires_at)
+        except IntegrityError:  # Уже отозван
+            pass
+        with self._lock:
+            if self._filter is not None and jti not in self._filter:
+                self._filter.add(jti)
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+            self._stats = dict.fromkeys(self._stats, 0)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            bloom = self._filter
+        stats['entries'] = bloom.count if bloom else 0
+        stats['bits'] = bloom.size if bloom else 0
+        negatives = stats['checks'] - stats['revoked']
+        stats['false_positive_rate'] = round(stats['false_positives'] / negatives, 6) if negatives else 0.0
+        stats['estimated_false_positive_rate'] = round(bloom.estimated_error_rate(), 6) if bloom else 0.0
+        return stats
+
+
+revocation_list = RevocationList()
+
+
+def check_token(token, user):
+    """
+    Общая проверка refresh и access токенов: JTI не отозван и токен выпущен
+    после последнего "выйти со всех устройств" (CustomUser.token_version).
+    """
+    if token.get(TOKEN_VERSION_CLAIM, 0) != user.token_version:
+        return False
+    return not revocation_list.is_revoked(token.get(api_settings.JTI_CLAIM))
@@ -1,14 +1,48 @@
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from backend.metrics import track
+
+from .authentication import cached_user
+from .revocation import TOKEN_VERSION_CLAIM, check_token, revocation_list
 
 
 class BaseUserSerializer(serializers.ModelSerializer):
+    avatar_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = get_user_model()
-        fields = ('id', 'username', 'email', 'avatar')
+        fields = ('id', 'username', 'email', 'avatar', 'avatar_variants')
         read_only_fields = ('id',)
 
+    def get_avatar_variants(self, user):
+        request = self.context.get('request')
+        variants = {}
+        for name, path in user.avatar_variants.items():
+            url = default_storage.url(path)
+            variants[name] = request.build_absolute_uri(url) if request else url
+        return variants
+
+    def update(self, instance, validated_data):
+        user = super().update(instance, validated_data)
+        if 'avatar' in validated_data:
+            user.refresh_avatar_variants()
+        return user
+
+
+class SellerSerializer(BaseUserSerializer):
+    """
+    Публичные данные продавца: ?expand=owner у объявлений и профиль продавца.
+    """
+    class Meta(BaseUserSerializer.Meta):
+        fields = ('id', 'username', 'avatar', 'avatar_variants')
+        read_only_fields = fields
+
 
 class CustomUserSerializer(BaseUserSerializer):
     password = serializers.CharField(write_only=True)
@@ -23,8 +57,11 @@ class CustomUserSerializer(BaseUserSerializer):
             email=validated_data.get('email', ''),
             avatar=validated_data.get('avatar')
         )
-        user.set_password(validated_data['password'])
+        with track('password_hash'):
+            user.set_password(validated_data['password'])
         user.save()
+        if user.avatar:
+            user.refresh_avatar_variants()
         return user
 
 
@@ -33,8 +70,42 @@ class CustomUserUpdateSerializer(BaseUserSerializer):
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version  # Копируется и в access-токен
+        return token
+
     def validate(self, attrs):
-        data = super().validate(attrs)
+        with track('password_hash'):  # authenticate() внутри проверяет пароль (PBKDF2)
+            data = super().validate(attrs)
         data['username'] = self.user.username
         data['is_admin'] = self.user.is_staff
         return data
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh с проверкой отзыва: пользователь из user_cache, JTI — по Bloom-фильтру,
+    поэтому для неотозванного токена обычно не нужно ни одного запроса в БД.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user = cached_user(refresh.payload.get(api_settings.USER_ID_CLAIM))
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        if not check_token(refresh, user):
+            raise InvalidToken('Token has been revoked.')
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                revocation_list.revoke(refresh, user)
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
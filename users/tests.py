@@ -1 +1,210 @@
-from django.test import TestCase
+import io
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.images import VARIANT_SIZES
+from items.models import Laptop
+
+from .authentication import user_cache
+from .revocation import BloomFilter, revocation_list
+
+
+User = get_user_model()
+
+
+def make_png(size=(800, 800)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'blue').save(buffer, 'PNG')
+    return SimpleUploadedFile('avatar.png', buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(IMAGE_PROCESS_WORKERS=0)
+class AvatarVariantTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_avatar_update_builds_variants(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        response = self.client.patch(f'/auth/auth/users/{user.pk}/', {'avatar': make_png()}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['avatar_variants']), set(VARIANT_SIZES))
+
+        user.refresh_from_db()
+        with user.avatar.storage.open(user.avatar_variants['thumb']) as thumb:
+            self.assertEqual(max(Image.open(thumb).size), VARIANT_SIZES['thumb'])
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        revocation_list.reset()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_user_is_resolved_from_cache(self):
+        response = self.client.get('/auth/user/')
+        self.assertIn('auth;dur=', response['Server-Timing'])
+        self.assertIn('"miss"', response['Server-Timing'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/auth/user/')
+        self.assertEqual(response.data['username'], 'buyer')
+        self.assertIn('"hit"', response['Server-Timing'])
+
+    def test_cache_invalidated_on_user_save(self):
+        self.client.get('/auth/user/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/auth/user/').status_code, 401)
+
+    def test_update_of_other_user_forbidden(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass12345')
+        response = self.client.patch(f'/auth/auth/users/{other.pk}/', {'username': 'hijacked'})
+        self.assertEqual(response.status_code, 403)
+
+
+class SellerProfileTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller', email='seller@example.com', password='pass12345')
+
+    def add_laptops(self, count):
+        Laptop.objects.bulk_create([
+            Laptop(title=f'Laptop {i}', model='T480', price='100.00', description='d', owner=self.seller)
+            for i in range(count)
+        ])
+
+    def test_profile_query_count_is_fixed(self):
+        self.add_laptops(3)
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(f'/auth/users/{self.seller.id}/profile/')
+        self.add_laptops(30)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(f'/auth/users/{self.seller.id}/profile/', {'page': 2})
+
+        self.assertEqual(len(small), 2)
+        self.assertEqual(len(large), 2)
+        self.assertEqual(response.data['username'], 'seller')
+        self.assertNotIn('email', response.data)
+        self.assertEqual(response.data['laptops']['count'], 3)
+        self.assertIsNone(response.data['laptops']['next'])
+
+    def test_pagination(self):
+        self.add_laptops(8)
+        response = self.client.get(f'/auth/users/{self.seller.id}/profile/', {'page_size': 5})
+        self.assertEqual(len(response.data['laptops']['results']), 5)
+        response = self.client.get(response.data['laptops']['next'])
+        self.assertEqual(len(response.data['laptops']['results']), 3)
+        self.assertIsNotNone(response.data['laptops']['previous'])
+        self.assertEqual(self.client.get(f'/auth/users/{self.seller.id}/profile/', {'page': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/auth/users/999999/profile/').status_code, 404)
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        revocation_list.reset()
+        caches['throttle'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+
+    def login(self):
+        response = self.client.post('/auth/login/', {'username': 'buyer', 'password': 'pass12345'})
+        return response.data['access'], response.data['refresh']
+
+    def refresh(self, token):
+        return self.client.post('/auth/token/refresh/', {'refresh': token})
+
+    def test_refresh_of_live_token_needs_no_queries(self):
+        _, refresh = self.login()
+        self.assertEqual(self.refresh(refresh).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refresh(refresh).status_code, 200)
+
+    def test_logout_revokes_refresh_and_access(self):
+        access, refresh = self.login()
+        _, other_refresh = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.post('/auth/logout/', {'refresh': refresh}).status_code, 204)
+
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+        self.assertEqual(self.client.get('/auth/user/').status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.refresh(other_refresh).status_code, 200)
+        self.assertEqual(revocation_list.stats()['revoked'], 2)
+
+    def test_logout_all_revokes_every_session(self):
+        access, first = self.login()
+        _, second = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.post('/auth/logout/all/').status_code, 204)
+
+        self.assertEqual(self.client.get('/auth/user/').status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.refresh(first).status_code, 401)
+        self.assertEqual(self.refresh(second).status_code, 401)
+        access, _ = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get('/auth/user/').status_code, 200)
+
+    def test_bloom_filter_error_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'revoked-{i}')
+        self.assertTrue(all(f'revoked-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'live-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives / 10000, 0.02)
+        self.assertAlmostEqual(bloom.estimated_error_rate(), 0.01, delta=0.005)
+
+
+class CustomUserAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        self.user = User.objects.create_user(username='seller', email='seller@example.com', password='pass12345')
+        self.client.force_login(self.admin)
+
+    def test_search_uses_prefix_and_exact_lookups(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/users/customuser/', {'q': 'sell'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.user])
+        self.assertFalse(any("'%sell%'" in query['sql'] or "%sell%" in query['sql'] for query in queries))
+        response = self.client.get('/admin/users/customuser/', {'q': 'seller@example.com'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.user])
+        response = self.client.get('/admin/users/customuser/', {'q': 'example.com'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+        response = self.client.get('/admin/users/customuser/', {'q': '²'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_actions_are_single_updates(self):
+        refresh = RefreshToken.for_user(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/admin/users/customuser/', {'action': 'logout_everywhere', '_selected_action': [self.user.id]})
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "users_customuser"') for query in queries), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+        response = APIClient().post('/auth/token/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.post(
+            '/admin/users/customuser/', {'action': 'deactivate_users', '_selected_action': [self.user.id]}, follow=True
+        )
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        # Кэш пользователей очищен только в этом процессе — действие об этом предупреждает
+        self.assertContains(response, 'Other server workers may accept these users')
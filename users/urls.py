@@ -5,7 +5,10 @@ urlpatterns = [
     path('register/', views.RegisterUserView.as_view(), name='register'),  # Регистрация
     path('login/', views.MyTokenObtainPairView.as_view(), name='login'),  # Логин
     path('token/refresh/', views.MyTokenRefreshView.as_view(), name='token_refresh'),  # Обновление токена
+    path('logout/', views.LogoutView.as_view(), name='logout'),  # Отзыв текущего токена
+    path('logout/all/', views.LogoutAllView.as_view(), name='logout-all'),  # Выход со всех устройств
     path('auth/users/<int:pk>/', views.UserUpdateView.as_view(), name='user-update'),  # Обновление пользователя
     path('user/', views.UserDetailView.as_view(), name='user-detail'),  # Текущий пользователь
     path('users/<int:pk>/', views.UserByIdDetailView.as_view(), name='user-by-id'),  # Пользователь по ID
+    path('users/<int:pk>/profile/', views.SellerProfileView.as_view(), name='seller-profile'),  # Продавец и его объявления
 ]
@@ -4,14 +4,27 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.generics import RetrieveAPIView, CreateAPIView, UpdateAPIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Prefetch
+from django.shortcuts import get_object_or_404
+
+from backend.response_cache import cached_response
+from backend.throttling import IPRateThrottle, UsernameRateThrottle
+from items.models import Laptop
+from items.serializers import LaptopSerializer
 
 from .serializers import (
     CustomUserSerializer,
     CustomTokenObtainPairSerializer,
+    CustomTokenRefreshSerializer,
     CustomUserUpdateSerializer,
+    SellerSerializer,
 )
+from .revocation import revocation_list
 
 
 User = get_user_model()
@@ -21,17 +34,16 @@ User = get_user_model()
 
 class UserService:
     @staticmethod
-    def validate_update_permission(token: str, user_id_to_edit: int) -> None:
+    def validate_update_permission(token, user_id_to_edit: int) -> None:
         """
         Перевіряє, чи користувач має право редагувати дані.
+        token — вже перевірений токен з request.auth, повторно не декодується.
         """
         if not token:
             raise PermissionError("Токен не знайдено.")
 
         try:
-            
-            access_token = AccessToken(token.split()[1])
-            user_id = access_token['user_id']
+            user_id = token[api_settings.USER_ID_CLAIM]
             if user_id != int(user_id_to_edit):
                 raise PermissionError("Немає прав для редагування даних іншого користувача.")
         except Exception as e:
@@ -43,16 +55,59 @@ class UserService:
 class RegisterUserView(CreateAPIView):
     serializer_class = CustomUserSerializer
     queryset = User.objects.all()
+    throttle_classes = [IPRateThrottle]
+    throttle_scope = 'register'
 
 
 
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    # Лимиты проверяются до PBKDF2: лишние попытки стоят пару операций в кэше.
+    # На имя — против перебора пароля одного аккаунта с разных IP
+    throttle_classes = [IPRateThrottle, UsernameRateThrottle]
+    throttle_scope = 'login'
 
 
 class MyTokenRefreshView(TokenRefreshView):
-    pass
+    serializer_class = CustomTokenRefreshSerializer
+
+
+
+
+class LogoutView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Вихід з поточного пристрою: відкликає переданий refresh-токен і поточний access-токен.
+        """
+        try:
+            refresh = RefreshToken(request.data.get("refresh", ""))
+        except TokenError:
+            return Response({"detail": "Потрібен дійсний refresh-токен."}, status=status.HTTP_400_BAD_REQUEST)
+        if refresh.get(api_settings.USER_ID_CLAIM) != request.user.pk:
+            return Response({"detail": "Токен належить іншому користувачу."}, status=status.HTTP_403_FORBIDDEN)
+
+        revocation_list.revoke(refresh, request.user)
+        if request.auth is not None:
+            revocation_list.revoke(request.auth, request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+
+
+class LogoutAllView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Вихід з усіх пристроїв: усі раніше видані токени стають недійсними.
+        """
+        user = User.objects.get(pk=request.user.pk)
+        user.token_version += 1
+        user.save(update_fields=["token_version"])  # Сигнал скидає user_cache
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 
@@ -83,7 +138,7 @@ class UserUpdateView(UpdateAPIView):
     lookup_field = 'pk'
 
     def patch(self, request, *args, **kwargs):
-        token = request.headers.get('Authorization', None)
+        token = request.auth
         user_id_to_edit = kwargs.get('pk')
 
         try:
@@ -100,3 +155,61 @@ class UserByIdDetailView(RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(request, [User], lambda: super(UserByIdDetailView, self).retrieve(request, *args, **kwargs))
+
+
+
+
+class SellerProfileView(APIView):
+    """
+    Профіль продавця зі сторінкою його оголошень: рівно два запити
+    (користувач з кількістю оголошень + prefetch зрізу user.laptops).
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    page_size = 6
+    max_page_size = 100
+
+    def get(self, request, pk):
+        return cached_response(request, [User, Laptop], lambda: self.retrieve(request, pk))
+
+    def _positive_int(self, name, default):
+        value = str(self.request.query_params.get(name, default))
+        if not value.isdigit() or int(value) < 1:
+            raise ValueError(name)
+        return int(value)
+
+    def retrieve(self, request, pk):
+        try:
+            page = self._positive_int('page', 1)
+            page_size = min(self._positive_int('page_size', self.page_size), self.max_page_size)
+        except ValueError as e:
+            return Response({"detail": f"Параметр '{e}' має бути додатним числом."}, status=status.HTTP_400_BAD_REQUEST)
+
+        start = (page - 1) * page_size
+        listings = Laptop.objects.order_by('-id')[start:start + page_size]
+        user = get_object_or_404(
+            User.objects.annotate(listing_count=Count('laptops')).prefetch_related(
+                Prefetch('laptops', queryset=listings, to_attr='listing_page')
+            ),
+            pk=pk,
+        )
+
+        url = request.build_absolute_uri()
+        has_next = start + page_size < user.listing_count
+        if page == 1:
+            previous = None
+        elif page == 2:
+            previous = remove_query_param(url, 'page')
+        else:
+            previous = replace_query_param(url, 'page', page - 1)
+
+        data = SellerSerializer(user, context={'request': request}).data
+        data['laptops'] = {
+            "count": user.listing_count,
+            "next": replace_query_param(url, 'page', page + 1) if has_next else None,
+            "previous": previous,
+            "results": LaptopSerializer(user.listing_page, many=True).data,
+        }
+        return Response(data)